@@ -1,15 +1,118 @@
-import random
-from datetime import datetime, timedelta
-from agent.models import PowerReport
+import threading
+import time
+from collections import OrderedDict
 
-# Full list of Nigerian state capitals + major cities
-NIGERIAN_CITIES = [
-    "Abakaliki", "Abeokuta", "Abuja", "Ado Ekiti", "Akure", "Asaba", "Awka", "Bauchi", "Benin City",
-    "Birnin Kebbi", "Calabar", "Damaturu", "Lagos", "Enugu", "Gombe", "Gusau", "Ibadan", "Ilorin",
-    "Jalingo", "Jos", "Kaduna", "Kano", "Katsina", "Lafia", "Lokoja", "Maiduguri", "Makurdi",
-    "Minna", "Oshogbo", "Ondo", "Owerri", "Port Harcourt", "Sokoto", "Umuahia", "Uyo", "Yenagoa",
-    "Yola", "Aba", "Onitsha", "Warri"
-]
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from agent.cities import registry
+from agent.forecast import forecast, model_cache
+from agent.heatmap import aget_heatmap, get_heatmap, get_heatmaps
+from agent.metrics import count_cache, stage
+from agent.models import CityPowerState, PowerReport
+from agent.spatial import nearby_cities, neighbor_inference
+
+
+class PredictionCache:
+    """
+    Bounded per-city prediction cache with a TTL.
+
+    By default entries live in an in-process LRU. Set ``ALIAS`` in
+    ``LIGHTPADI_PREDICTION_CACHE`` to store them in a Django cache instead
+    (e.g. a file-based cache shared by every gunicorn worker).
+    Entries are dropped as soon as a new report is saved for the city.
+    """
+
+    def __init__(self, max_entries=256, ttl=60, alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # city -> (expires_at, prediction)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_PREDICTION_CACHE", {})
+        return cls(
+            max_entries=config.get("MAX_ENTRIES", 256),
+            ttl=config.get("TTL", 60),
+            alias=config.get("ALIAS"),
+        )
+
+    def _key(self, city):
+        return f"lightpadi:prediction:{city}"
+
+    def get(self, city):
+        if self.alias:
+            return self._counted(caches[self.alias].get(self._key(city)))
+        with self._lock:
+            entry = self._entries.get(city)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(city)
+                prediction = entry[1]
+            else:
+                self._entries.pop(city, None)
+                prediction = None
+        return self._counted(prediction)
+
+    async def aget(self, city):
+        """get() for the async views, which mustn't block on a shared cache's disk or network I/O."""
+        if self.alias:
+            return self._counted(await caches[self.alias].aget(self._key(city)))
+        return self.get(city)
+
+    def _counted(self, prediction):
+        with self._lock:
+            if prediction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count_cache(prediction is not None)
+        return dict(prediction) if prediction is not None else None
+
+    def set(self, city, prediction):
+        if self.alias:
+            caches[self.alias].set(self._key(city), prediction, timeout=self.ttl)
+            return
+        self._set_local(city, prediction)
+
+    async def aset(self, city, prediction):
+        if self.alias:
+            await caches[self.alias].aset(self._key(city), prediction, timeout=self.ttl)
+            return
+        self._set_local(city, prediction)
+
+    def _set_local(self, city, prediction):
+        with self._lock:
+            self._entries[city] = (time.monotonic() + self.ttl, dict(prediction))
+            self._entries.move_to_end(city)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, city):
+        if self.alias:
+            caches[self.alias].delete(self._key(city))
+            return
+        with self._lock:
+            self._entries.pop(city, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.alias or "local",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+
+prediction_cache = PredictionCache.from_settings()
 
 
 def predict_light_status(location: str):
@@ -21,22 +124,109 @@ def predict_light_status(location: str):
     - Always returns structured JSON for Telex A2A
     """
 
-    location = location.strip().title()
+    # Step 1: Check if the city is supported (any case, spacing or alias)
+    city = registry.canonical(location)
+    if city is None:
+        return _unsupported(location)
+    location = city
 
-    # Step 1: Check if the city is supported
-    if location not in NIGERIAN_CITIES:
-        return {
-            "location": location,
-            "prediction": "unsupported",
-            "confidence": 0.0,
-            "message": "Sorry, LightPadi currently supports only major Nigerian cities 🇳🇬."
-        }
+    cached = prediction_cache.get(location)
+    if cached is not None:
+        return cached
+
+    prediction = _predict_from_state(location)
+    prediction_cache.set(location, prediction)
+    return prediction
 
-    # Step 2: Fetch recent reports for the city
-    reports = PowerReport.objects.filter(location__iexact=location).order_by('-timestamp')[:5]
 
-    if not reports.exists():
-        # No data yet for this city
+async def apredict_light_status(location: str):
+    """
+    Async predict_light_status for the ASGI views. Cache hits on the in-process
+    cache never leave the event loop; misses read the city's state with the async
+    ORM and only hop to a thread when a model has to be fitted.
+    """
+    city = registry.canonical(location)
+    if city is None:
+        return _unsupported(location)
+    location = city
+
+    cached = await prediction_cache.aget(location)
+    if cached is not None:
+        return cached
+
+    with stage("db_read"):
+        state = await CityPowerState.objects.filter(pk=location).afirst()
+        heatmap = await aget_heatmap(location) if state is not None and state.report_count else None
+    if neighbor_inference.needs_refresh():
+        await sync_to_async(neighbor_inference.refresh)()
+    model = await sync_to_async(model_cache.get)(location) if state is not None and state.report_count else None
+    prediction = _predict(location, state, model, heatmap)
+    await prediction_cache.aset(location, prediction)
+    return prediction
+
+
+def predict_many(locations=None):
+    """
+    Predicts several cities at once (every supported city when `locations` is None).
+    Cache misses are answered from one CityPowerState query and one heatmap
+    query, and cities missing from the trained artifact are fitted together in one more.
+    Returns {location: prediction} in the order requested.
+    """
+    if locations is None:
+        locations = registry.names
+
+    predictions = {}
+    missing = []
+    for requested in locations:
+        location = registry.canonical(requested)
+        if location is None:
+            predictions[requested.strip()] = _unsupported(requested)
+            continue
+        if location in predictions:
+            continue
+        predictions[location] = prediction_cache.get(location)
+        if predictions[location] is None:
+            missing.append(location)
+
+    if missing:
+        with stage("db_read"):
+            states = CityPowerState.objects.in_bulk(missing)
+            reported = [location for location, state in states.items() if state.report_count]
+            heatmaps = get_heatmaps(reported)
+        models = model_cache.get_many(reported)
+        for location in missing:
+            prediction = _predict(location, states.get(location), models.get(location), heatmaps.get(location))
+            prediction_cache.set(location, prediction)
+            predictions[location] = prediction
+
+    return predictions
+
+
+def _unsupported(location):
+    return {
+        "location": location.strip(),
+        "prediction": "unsupported",
+        "confidence": 0.0,
+        "message": "Sorry, LightPadi currently supports only major Nigerian cities 🇳🇬."
+    }
+
+
+def _predict_from_state(location):
+    # Step 2: Read the city's rolling state (one primary-key lookup)
+    with stage("db_read"):
+        state = CityPowerState.objects.filter(pk=location).first()
+        heatmap = get_heatmap(location) if state is not None and state.report_count else None
+    model = model_cache.get(location) if state is not None and state.report_count else None
+    return _predict(location, state, model, heatmap)
+
+
+def _predict(location, state, model, heatmap=None):
+    now = timezone.now()
+    if state is None or not state.report_count or model is None:
+        # No data yet for this city: borrow it from nearby cities
+        inference = neighbor_inference.infer(location, now)
+        if inference is not None:
+            return _neighbor_prediction(location, inference)
         return {
             "location": location,
             "prediction": "unknown",
@@ -44,40 +234,54 @@ def predict_light_status(location: str):
             "message": f"No data for {location} yet. Help me learn — tell me if there’s light 💡."
         }
 
-    # Analyze on/off pattern
-    on_count = sum(r.status.lower() == "on" for r in reports)
-    off_count = sum(r.status.lower() == "off" for r in reports)
+    # Step 3: Forecast from the city's fitted run lengths and its outage heatmap
+    outlook = forecast(model, state.last_status, state.last_changed_at, state.last_reported_at, now, heatmap)
+    if neighbor_inference.is_stale(state.last_reported_at, now):
+        # Hours without a report: fresher news from the neighbours may say more
+        inference = neighbor_inference.infer(location, now)
+        if inference is not None and inference.confidence > outlook.confidence:
+            return _neighbor_prediction(location, inference)
 
-    # Dynamic confidence and timing
-    confidence = round(random.uniform(0.6, 0.95), 2)
-    hours_ahead = random.choice([1, 2, 3, 4])
-    next_change_time = (datetime.now() + timedelta(hours=hours_ahead)).strftime("%Y-%m-%d %H:%M:%S")
+    next_change_time = (
+        timezone.localtime(outlook.next_change).strftime("%Y-%m-%d %H:%M:%S") if outlook.next_change else None
+    )
 
-    # Step 3: Predict CURRENT status and future event
-    if on_count >= off_count:
-        # Light is likely ON now
+    if outlook.status == PowerReport.Status.ON:
         prediction = "on"
-        message_templates = [
-            f"Light is currently ON in {location}. Based on recent patterns, NEPA might take it around {next_change_time}.",
-            f"{location} currently has light ⚡. You might want to charge up — possible outage around {next_change_time}.",
-            f"Power seems steady in {location} right now, but it might go off near {next_change_time}."
-        ]
+        if next_change_time:
+            message = f"Light is currently ON in {location}. Based on past outages, NEPA might take it around {next_change_time}."
+        else:
+            message = f"Light is currently ON in {location}. I don’t have enough history yet to tell when it may go off."
     else:
-        # Light is likely OFF now
         prediction = "off"
-        message_templates = [
-            f"Power is currently OFF in {location}. Based on trends, it may return around {next_change_time}.",
-            f"No light in {location} at the moment 😞. Looks like NEPA may bring it back by {next_change_time}.",
-            f"{location} is currently in darkness, but restoration might happen around {next_change_time} ⚡."
-        ]
-
-    message = random.choice(message_templates)
+        if next_change_time:
+            message = f"Power is currently OFF in {location}. Based on past outages, it may return around {next_change_time}."
+        else:
+            message = f"Power is currently OFF in {location}. I don’t have enough history yet to tell when it may return."
 
     # Step 4: Return structured, safe response
     return {
         "location": location,
         "prediction": prediction,  # Reflects current status, not the next change
-        "confidence": confidence,
+        "confidence": outlook.confidence,
         "next_change": next_change_time,
         "message": message
     }
+
+
+def _neighbor_prediction(location, inference):
+    nearby = nearby_cities(inference.sources)
+    if inference.status == PowerReport.Status.ON:
+        prediction = "on"
+        message = f"No recent reports from {location}, but reports from {nearby} say light is ON, so it’s likely on there too."
+    else:
+        prediction = "off"
+        message = f"No recent reports from {location}, but reports from {nearby} say power is OFF, so it’s likely out there too."
+    return {
+        "location": location,
+        "prediction": prediction,
+        "confidence": inference.confidence,
+        "next_change": None,
+        "based_on": inference.sources,
+        "message": message
+    }
@@ -0,0 +1,277 @@
+"""
+Push alerts: Telex users subscribe to a city and are told when its power switches.
+
+A switch is a new OutageInterval replacing the city's open one, so alerts follow
+the same debounced ON/OFF state as /outages rather than every contrary report.
+save_reports() hands switches to the dispatcher once their transaction commits;
+the request that caused one never waits on a webhook.
+
+The dispatcher is an in-process queue drained by one background thread. It takes
+up to BATCH_SIZE switches at a time, keeps the latest per city, loads every
+affected city's subscriptions in one query and groups the alerts by webhook, so
+an endpoint serving many subscribers gets one POST per batch. POSTs go out on a
+pool of WORKERS threads. Each thread has its own requests.Session, which keeps
+connections open across batches and retries connection errors, 429 and 5xx
+responses up to RETRIES times with exponential backoff. Webhooks answering 404
+or 410 are gone, and their subscriptions are dropped. Like the report write
+buffer, queued alerts live in memory: a hard crash loses the ones not yet sent.
+
+Webhook URLs arrive in unauthenticated Telex payloads, so the server only posts
+to hosts on LIGHTPADI_ALERTS["ALLOWED_HOSTS"] that resolve to public addresses.
+Both are checked when a user subscribes and again before every POST, in case
+DNS changed since, and redirects are never followed.
+
+`manage.py alert_receiver` runs a local stub webhook that prints what it gets.
+"""
+
+import ipaddress
+import logging
+import queue
+import socket
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import close_old_connections
+from django.http.request import validate_host
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .db import retry_on_lock
+from .metrics import count_alerts
+from .models import AlertSubscription, PowerReport
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+FAILED = "failed"
+GONE = "gone"
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+GONE_STATUSES = (404, 410)
+
+_validate_url = URLValidator(schemes=["http", "https"])
+
+
+def _config():
+    return getattr(settings, "LIGHTPADI_ALERTS", {})
+
+
+def check_webhook(url):
+    """
+    Raises ValidationError unless `url` is an http(s) URL on one of ALLOWED_HOSTS
+    whose every address is public (any address with ALLOW_PRIVATE_NETWORKS).
+    """
+    _validate_url(url)
+    config = _config()
+    parts = urlsplit(url)
+    host = parts.hostname
+    if not validate_host(host, config.get("ALLOWED_HOSTS", ())):
+        raise ValidationError(f"Webhook host {host} isn't allowed.", code="host")
+    if config.get("ALLOW_PRIVATE_NETWORKS"):
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (OSError, UnicodeError):
+        raise ValidationError(f"Webhook host {host} doesn't resolve.", code="dns")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])  # drop an IPv6 zone
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise ValidationError(f"Webhook host {host} resolves to a non-public address.", code="address")
+
+
+# ---------------------- 🔔 SUBSCRIPTIONS ----------------------
+
+def subscribe(subscriber, location, url, token=""):
+    """
+    Subscribes a Telex user to a city, or points an existing subscription at a new
+    webhook. Returns True when the subscription is new. Raises ValidationError for
+    a webhook check_webhook() refuses.
+    """
+    check_webhook(url)
+    _, created = AlertSubscription.objects.update_or_create(
+        subscriber=subscriber, location=location, defaults={"url": url, "token": token or ""},
+    )
+    return created
+
+
+def unsubscribe(subscriber, location=None):
+    """Drops a user's subscription to one city, or to every city. Returns how many were dropped."""
+    subscriptions = AlertSubscription.objects.filter(subscriber=subscriber)
+    if location:
+        subscriptions = subscriptions.filter(location=location)
+    return subscriptions.delete()[0]
+
+
+def alert_text(city, power_status, since):
+    at = timezone.localtime(since).strftime("%H:%M")
+    if power_status == PowerReport.Status.ON:
+        return f"💡 LightPadi alert: Power is back ON in {city} (since {at})."
+    return f"⚡ LightPadi alert: Power went OFF in {city} at {at}."
+
+
+def push_payload(alerts):
+    """One A2A agent message carrying every alert for a webhook, one text part each."""
+    return {
+        "kind": "message",
+        "role": "agent",
+        "parts": [{"kind": "text", "text": alert["text"]} for alert in alerts],
+        "metadata": {"alerts": alerts},
+    }
+
+
+# ---------------------- 📣 DISPATCHER ----------------------
+
+class AlertDispatcher:
+    def __init__(self, enabled=True, batch_size=100, workers=4, timeout=5.0, retries=3, backoff=0.5):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pool = None
+        self._local = threading.local()  # each pool thread's requests.Session
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_ALERTS", {})
+        return cls(
+            enabled=config.get("ENABLED", True),
+            batch_size=config.get("BATCH_SIZE", 100),
+            workers=config.get("WORKERS", 4),
+            timeout=config.get("TIMEOUT", 5.0),
+            retries=config.get("RETRIES", 3),
+            backoff=config.get("BACKOFF", 0.5),
+        )
+
+    def enqueue(self, intervals):
+        """Queues the switched intervals OutageInterval.record_many() returned. Call after the commit."""
+        if not self.enabled or not intervals:
+            return
+        for interval in intervals:
+            self._queue.put((interval.location, interval.status, interval.started_at))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lightpadi-alerts", daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """Blocks until every queued switch has been dispatched."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            switches = [self._queue.get()]
+            while len(switches) < self.batch_size:
+                try:
+                    switches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.dispatch(switches)
+            except Exception:
+                logger.exception("alerts.dispatch_failed")
+            finally:
+                close_old_connections()
+                for _ in switches:
+                    self._queue.task_done()
+
+    def dispatch(self, switches):
+        """
+        Fans (city, status, since) switches out to their subscribers, one POST per
+        webhook. Returns {"sent", "failed", "gone"} counts of alerts.
+        """
+        latest = {}
+        for location, power_status, since in switches:
+            if location not in latest or since >= latest[location][1]:
+                latest[location] = (power_status, since)
+
+        deliveries = defaultdict(list)  # (url, token) -> [alert]
+        subscriptions = AlertSubscription.objects.filter(location__in=list(latest)).values_list(
+            "subscriber", "location", "url", "token"
+        )
+        for subscriber, location, url, token in subscriptions.iterator():
+            power_status, since = latest[location]
+            deliveries[(url, token)].append({
+                "subscriber": subscriber,
+                "city": location,
+                "status": PowerReport.Status(power_status).label,
+                "since": since.isoformat(),
+                "text": alert_text(location, power_status, since),
+            })
+
+        counts = {SENT: 0, FAILED: 0, GONE: 0}
+        if not deliveries:
+            return counts
+        outcomes = self._executor().map(lambda item: self.send(*item[0], item[1]), deliveries.items())
+        gone = []
+        for ((url, _), alerts), outcome in zip(deliveries.items(), outcomes):
+            counts[outcome] += len(alerts)
+            count_alerts(outcome, len(alerts))
+            if outcome == GONE:
+                gone.append(url)
+        if gone:
+            retry_on_lock(lambda: AlertSubscription.objects.filter(url__in=gone).delete())
+            logger.info("alerts.webhooks_gone", extra={"webhooks": len(gone)})
+        logger.info("alerts.dispatched", extra={"switches": len(latest), "webhooks": len(deliveries), **counts})
+        return counts
+
+    def send(self, url, token, alerts):
+        """POSTs one webhook's alerts, retrying per the session's adapter. Returns SENT, FAILED or GONE."""
+        try:
+            check_webhook(url)
+        except ValidationError as e:
+            logger.warning("alerts.webhook_refused", extra={"url": url, "error": e.messages[0]})
+            return FAILED
+        headers = {"X-A2A-Notification-Token": token} if token else {}
+        try:
+            response = self._session().post(
+                url, json=push_payload(alerts), headers=headers, timeout=self.timeout, allow_redirects=False,
+            )
+        except requests.RequestException as e:
+            logger.warning("alerts.send_failed", extra={"url": url, "error": str(e)})
+            return FAILED
+        if response.status_code in GONE_STATUSES:
+            return GONE
+        if not response.ok or response.is_redirect:  # redirects could point anywhere
+            logger.warning("alerts.send_failed", extra={"url": url, "status": response.status_code})
+            return FAILED
+        return SENT
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lightpadi-alert-send")
+            return self._pool
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            retry = Retry(
+                total=self.retries,
+                backoff_factor=self.backoff,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=None,  # POSTs too: a repeated alert beats a lost one
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "LightPadi-Alerts/1.0"
+            self._local.session = session
+        return session
+
+
+alert_dispatcher = AlertDispatcher.from_settings()
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class AgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent'
+
+    def ready(self):
+        # Map the trained forecasting artifact once per worker, before the first request.
+        from .forecast import model_cache
+        model_cache.load_artifact()
+
+        from django.db.backends.signals import connection_created
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid="lightpadi_configure_sqlite")
+
+        # Count every query (any thread) against the request that triggered it.
+        connection_created.connect(_count_queries_on, dispatch_uid="lightpadi_count_queries")
+
+
+def _count_queries_on(sender, connection, **kwargs):
+    from .metrics import count_queries
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
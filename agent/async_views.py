@@ -0,0 +1,221 @@
+"""
+Async versions of the Telex A2A endpoints, served when LIGHTPADI_ASYNC_VIEWS is on
+(the default under lightpadi_project.asgi, e.g. `uvicorn lightpadi_project.asgi:application`).
+
+They answer with the same JSON as the DRF views in views.py. Predictions read the
+database through the async ORM, so one worker process can hold many Telex
+conversations open at once. Saving a report stays one transaction (report rows plus
+CityPowerState), which the async ORM can't express, so it runs on Django's shared
+sync thread; that also keeps SQLite writes from the event loop one at a time.
+Shared caches (the prediction cache's or the ingest guard's ALIAS) are likewise
+only touched off the event loop.
+"""
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+
+from .ai_engine import apredict_light_status, prediction_cache
+from .guard import LIMITED, report_guard
+from .ingest import report_buffer
+from .live import status_hub
+from .log import log_payload
+from .metrics import stage
+from .utils import canonical_city_name, parse_telex_payload
+from .views import (
+    alert_reply, file_report, history_reply, predict_problem, prediction_text, report_limited_text,
+    report_problem, report_saved_text, telex_reply,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    # Match DRF's JSONRenderer, which keeps emoji unescaped.
+    with stage("render"):
+        return JsonResponse(data, status=status_code, json_dumps_params={"ensure_ascii": False})
+
+
+def parse_json_body(request):
+    """Returns (data, error_response), answering bad JSON the way DRF's JSONParser does."""
+    try:
+        return json.loads(request.body or b"{}"), None
+    except ValueError as e:
+        return None, json_response({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+
+
+# ---------------------- 🩵 PING ----------------------
+class AsyncPingView(View):
+    """Health check endpoint for uptime monitoring. Allows both GET and POST."""
+
+    async def get(self, request):
+        return json_response({
+            "status": "ok",
+            "app": "LightPadi running live on PythonAnywhere",
+            "version": "v2.0.0",
+            "prediction_cache": prediction_cache.stats(),
+            "live_streams": status_hub.stats(),
+        })
+
+    async def post(self, request):
+        return await self.get(request)
+
+
+# ---------------------- 🧭 ROUTER ----------------------
+class AsyncRouterView(View):
+    """Routes Telex messages to the async report or predict handler."""
+
+    async def get(self, request):
+        return json_response(telex_reply("👋 LightPadi is online and ready to process your messages."))
+
+    async def post(self, request):
+        data, error = parse_json_body(request)
+        if error:
+            return error
+        log_payload(logger, "telex.payload", data)
+        try:
+            parsed = parse_telex_payload(data)
+
+            logger.debug("telex.routed", extra={"intent": parsed.intent, "city": parsed.city})
+            if parsed.intent == "report":
+                return await AsyncReportStatusView().handle(parsed)
+            elif parsed.intent in ("subscribe", "unsubscribe"):
+                return await AsyncAlertSubscriptionView().handle(parsed)
+            elif parsed.intent == "history":
+                return json_response(telex_reply(await sync_to_async(history_reply)(parsed)))
+            else:
+                return await AsyncPredictView().handle(parsed)
+
+        except Exception as e:
+            logger.exception("router.failed")
+            return json_response(
+                telex_reply(f"⚠️ LightPadi router error: {str(e)}"), status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+# ---------------------- 💡 REPORT STATUS ----------------------
+class AsyncReportStatusView(View):
+    """Saves reports like “No light in Enugu” without blocking the event loop."""
+
+    async def get(self, request):
+        return json_response(telex_reply("💡 Use POST to report electricity status in a Nigerian city."))
+
+    async def post(self, request):
+        data, error = parse_json_body(request)
+        if error:
+            return error
+        return await self.handle(parse_telex_payload(data))
+
+    async def handle(self, parsed):
+        try:
+            problem = report_problem(parsed)
+            if problem:
+                return json_response(telex_reply(problem))
+
+            if report_buffer.enabled and not report_guard.alias:
+                # The guard's dicts and the buffer's queue are in memory: nothing to block on.
+                verdict = file_report(parsed)
+            else:
+                verdict = await sync_to_async(file_report)(parsed)
+            if verdict == LIMITED:
+                return json_response(
+                    telex_reply(report_limited_text(parsed.city)), status.HTTP_429_TOO_MANY_REQUESTS
+                )
+            return json_response(telex_reply(report_saved_text(parsed.city, parsed.status)))
+
+        except Exception as e:
+            logger.exception("report.failed", extra={"city": parsed.city})
+            return json_response(
+                telex_reply(f"⚠️ LightPadi ran into an error while saving your report: {str(e)}"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+# ---------------------- 🔔 ALERTS ----------------------
+class AsyncAlertSubscriptionView(View):
+    """Subscribes Telex users to power alerts for a city, or stops them."""
+
+    async def get(self, request):
+        return json_response(telex_reply(
+            "🔔 Send a POST like 'Alert me about light in Lagos' to get a message whenever power goes OFF "
+            "or comes back."
+        ))
+
+    async def post(self, request):
+        data, error = parse_json_body(request)
+        if error:
+            return error
+        return await self.handle(parse_telex_payload(data))
+
+    async def handle(self, parsed):
+        try:
+            return json_response(telex_reply(await sync_to_async(alert_reply)(parsed)))
+        except Exception as e:
+            logger.exception("alerts.subscription_failed", extra={"city": parsed.city})
+            return json_response(
+                telex_reply(f"⚠️ LightPadi couldn’t update your alerts: {str(e)}"),
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+# ---------------------- ⚡ PREDICT STATUS ----------------------
+class AsyncPredictView(View):
+    """Predicts the current electricity status for a Nigerian city."""
+
+    async def get(self, request):
+        return json_response(telex_reply("⚡ Send a POST request like: 'Predict light in Lagos' to get a forecast."))
+
+    async def post(self, request):
+        data, error = parse_json_body(request)
+        if error:
+            return error
+        return await self.handle(parse_telex_payload(data))
+
+    async def handle(self, parsed):
+        try:
+            problem = predict_problem(parsed)
+            if problem:
+                return json_response(telex_reply(problem))
+
+            prediction_data = await apredict_light_status(parsed.city)
+            return json_response(telex_reply(prediction_text(parsed.city, prediction_data)))
+
+        except Exception as e:
+            logger.exception("predict.failed", extra={"city": parsed.city})
+            return json_response(
+                telex_reply(f"⚠️ LightPadi encountered an error: {str(e)}"), status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+# ---------------------- 📺 LIVE STATUS ----------------------
+class AsyncStatusStreamView(View):
+    """
+    Server-Sent Events with every city's status as it changes:
+    GET /status/stream?city=Lagos&city=Enugu, or no ?city= for all of them.
+    Opens with each followed city's latest status; see agent/live.py.
+    """
+
+    async def get(self, request):
+        cities = []
+        for value in request.GET.getlist("city"):
+            city = canonical_city_name(value)
+            if city is None:
+                return json_response({"error": f"'{value}' isn’t a supported city."}, status.HTTP_400_BAD_REQUEST)
+            cities.append(city)
+        if not status_hub.enabled:
+            return json_response({"error": "Live status is turned off."}, status.HTTP_404_NOT_FOUND)
+        if status_hub.full:
+            return json_response(
+                {"error": "Too many live streams open. Retry shortly."}, status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        if not status_hub.loaded:
+            await sync_to_async(status_hub.load)()
+
+        response = StreamingHttpResponse(status_hub.stream(cities), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx would otherwise hold events back
+        return response
@@ -0,0 +1,111 @@
+"""
+Micro-benchmarks for LightPadi's hot paths.
+
+Each suite is a module in this package exposing ``run(options)``, which returns
+a list of result rows. Run them with ``python manage.py benchmark <suite>``;
+``--save-baseline`` and ``--compare`` turn a run into a regression check (see
+baseline.py).
+"""
+
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+
+SUITES = {
+    "api": "agent.benchmarks.api",
+    "cities": "agent.benchmarks.cities",
+    "extraction": "agent.benchmarks.extraction",
+    "ingest": "agent.benchmarks.ingest",
+    "prediction": "agent.benchmarks.prediction",
+    "stack": "agent.benchmarks.stack",
+    "transfer": "agent.benchmarks.transfer",
+    "writers": "agent.benchmarks.writers",
+}
+
+DEFAULT_ROWS = "10000,100000,1000000"
+
+
+def measure(name, fn, number=1000, repeat=5):
+    """
+    Calls fn() `number` times, `repeat` times over, timing every call. Returns a
+    result row with ops/sec and the per-call time in microseconds from the best
+    round, p50/p99 latency over every call, and the SQL queries each call ran.
+    """
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    clock = time.perf_counter
+    best, samples = None, []
+    with connection.execute_wrapper(count_queries):
+        for _ in range(repeat):
+            timings = []
+            for _ in range(number):
+                start = clock()
+                fn()
+                timings.append(clock() - start)
+            elapsed = sum(timings)
+            best = elapsed if best is None else min(best, elapsed)
+            samples.extend(timings)
+
+    per_call = best / number
+    p50, p99 = np.percentile(samples, [50, 99]) * 1e6
+    return {
+        "name": name,
+        "ops_per_sec": round(1 / per_call, 1) if per_call else float("inf"),
+        "usec_per_op": round(per_call * 1e6, 3),
+        "p50_usec": round(float(p50), 3),
+        "p99_usec": round(float(p99), 3),
+        "queries_per_op": round(queries / (number * repeat), 2),
+    }
+
+
+def per_item(row, count):
+    """Rescales a measure() row timing batches of `count` items to per-item values, every column alike."""
+    row = dict(row)
+    row["ops_per_sec"] = round(row["ops_per_sec"] * count, 1)
+    for column in ("usec_per_op", "p50_usec", "p99_usec"):
+        row[column] = round(row[column] / count, 3)
+    row["queries_per_op"] = round(row["queries_per_op"] / count, 2)
+    return row
+
+
+def parse_row_counts(value):
+    """Turns "10000,1e6" into [10000, 1000000]."""
+    return sorted(int(float(count)) for count in str(value).split(",") if count.strip())
+
+
+def seed_reports(total, batch_size=20000, seed=0):
+    """
+    Tops the PowerReport table up to `total` rows of random city reports,
+    spread over the last 90 days, and rebuilds every city's CityPowerState to match.
+    Only ever called against the throwaway benchmark database.
+    """
+    from django.utils import timezone
+
+    from agent.models import CityPowerState, PowerReport
+    from agent.utils import NIGERIAN_CITIES
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    missing = total - PowerReport.objects.count()
+    while missing > 0:
+        batch = min(batch_size, missing)
+        PowerReport.objects.bulk_create(
+            PowerReport(
+                location=rng.choice(NIGERIAN_CITIES),
+                status=rng.randint(0, 1),
+                timestamp=now - timedelta(seconds=rng.uniform(0, 90 * 86400)),
+            )
+            for _ in range(batch)
+        )
+        missing -= batch
+
+    for city in NIGERIAN_CITIES:
+        CityPowerState.rebuild(city)
@@ -0,0 +1,80 @@
+"""
+The Telex API end to end, as the PowerReport table grows: generated Telex
+payloads (see payloads.py) go through Django's test client, every middleware and
+the router, /report and /predict views (the async ones when LIGHTPADI_ASYNC_VIEWS
+is on), and predict_light_status() is timed on its own. Rows carry p50/p99 and
+queries per request, so a baseline (see baseline.py) catches an extra query as
+surely as a slowdown.
+
+Defaults to 10k, 1M and 10M reports, which takes a while to seed; pass e.g.
+`--rows 1e4` for a quick run. The ingest guard and alert dispatcher are switched
+off while reports are posted. Every generated sender is new, so the guard would
+only add its own few microseconds (timed in the ingest suite), and the
+dispatcher works off the request path.
+"""
+
+import json
+from contextlib import contextmanager
+from itertools import cycle
+
+from django.test import Client
+
+from agent.ai_engine import predict_light_status
+from agent.alerts import alert_dispatcher
+from agent.benchmarks import measure, parse_row_counts, seed_reports
+from agent.benchmarks.payloads import TelexPayloads
+from agent.guard import report_guard
+
+USES_DATABASE = True
+
+API_ROWS = "10000,1000000,10000000"
+SAMPLES = 500
+
+
+@contextmanager
+def switched_off(*components):
+    states = [component.enabled for component in components]
+    for component in components:
+        component.enabled = False
+    try:
+        yield
+    finally:
+        for component, enabled in zip(components, states):
+            component.enabled = enabled
+
+
+def poster(client, path, bodies):
+    feed = cycle(bodies)
+
+    def post():
+        response = client.post(path, next(feed), content_type="application/json")
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} answered {response.status_code}: {response.content[:200]!r}")
+    return post
+
+
+def run(options):
+    number = options.get("number", 2000)
+    generator = TelexPayloads(seed=0)
+    bodies = {
+        intent: [json.dumps(sample.payload) for sample in generator.samples(SAMPLES, intent)]
+        for intent in ("report", "predict")
+    }
+    mixed = [json.dumps(sample.payload) for sample in generator.samples(SAMPLES) if sample.intent != "subscribe"]
+    cities = cycle(sample.city for sample in generator.samples(SAMPLES, "predict"))
+    client = Client(SERVER_NAME="localhost")
+
+    results = []
+    for rows in parse_row_counts(options.get("rows") or API_ROWS):
+        seed_reports(rows)
+        results.append(measure(
+            f"predict_light_status @ {rows:,} rows", lambda: predict_light_status(next(cities)), number=number,
+        ))
+        results.append(measure(f"POST /predict @ {rows:,} rows", poster(client, "/predict", bodies["predict"]),
+                               number=number))
+        with switched_off(report_guard, alert_dispatcher):
+            results.append(measure(f"POST /report @ {rows:,} rows", poster(client, "/report", bodies["report"]),
+                                   number=number))
+            results.append(measure(f"POST /router (mixed) @ {rows:,} rows", poster(client, "/router", mixed),
+                                   number=number))
+    return results
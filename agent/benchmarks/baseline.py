@@ -0,0 +1,83 @@
+"""
+Benchmark baselines for CI regression checks.
+
+`manage.py benchmark --save-baseline benchmarks.json` stores every timed row of a
+run, keyed by suite and row name. `manage.py benchmark --compare benchmarks.json`
+runs the same suites again and exits non-zero when a row found in both:
+
+- lost more than `tolerance` of its throughput (ops/sec),
+- grew its p99 latency by more than twice `tolerance` (tail latency is the
+  noisiest number on shared CI runners), or
+- runs more SQL queries per call. That check is exact, since query counts don't
+  depend on the machine.
+
+Rows without timings (notes, query plans) are ignored, as are rows missing on
+either side, so adding a benchmark never fails the check. Timings only compare
+on like hardware: save the baseline on the runner class CI compares on.
+"""
+
+import json
+import platform
+from datetime import datetime, timezone as dt_timezone
+
+import django
+
+METRICS = ("ops_per_sec", "usec_per_op", "p50_usec", "p99_usec", "queries_per_op")
+
+
+def save_baseline(path, results):
+    """Writes {suite: [result row, ...]} from a run to `path` as JSON."""
+    data = {
+        "created_at": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "platform": platform.platform(),
+        "suites": {
+            suite: {
+                row["name"]: {key: row[key] for key in METRICS if key in row} for row in rows if "ops_per_sec" in row
+            }
+            for suite, rows in results.items()
+        },
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return sum(len(rows) for rows in data["suites"].values())
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Checks a run's {suite: [result row, ...]} against a saved baseline.
+    Returns (rows compared, [regression message, ...]).
+    """
+    compared, regressions = 0, []
+    for suite, rows in results.items():
+        saved = baseline.get("suites", {}).get(suite, {})
+        for row in rows:
+            before = saved.get(row["name"])
+            if before is None or "ops_per_sec" not in row:
+                continue
+            compared += 1
+            label = f"{suite}: {row['name']}"
+
+            if row["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance):
+                change = row["ops_per_sec"] / before["ops_per_sec"] - 1
+                regressions.append(
+                    f"{label}: {before['ops_per_sec']:,.1f} → {row['ops_per_sec']:,.1f} ops/s ({change:+.0%})"
+                )
+            p99_limit = before.get("p99_usec", float("inf")) * (1 + 2 * tolerance)
+            if row.get("p99_usec", 0) > p99_limit:
+                change = row["p99_usec"] / before["p99_usec"] - 1
+                regressions.append(
+                    f"{label}: p99 {before['p99_usec']:,.1f} → {row['p99_usec']:,.1f} µs ({change:+.0%})"
+                )
+            if "queries_per_op" in row and row["queries_per_op"] > before.get("queries_per_op", row["queries_per_op"]):
+                regressions.append(
+                    f"{label}: {before['queries_per_op']} → {row['queries_per_op']} queries per call"
+                )
+    return compared, regressions
@@ -0,0 +1,94 @@
+"""
+City registry lookups vs the old title-case-and-scan-the-list check, and the
+city matcher benchmark: the compiled gazetteer vs the old per-city regex loop,
+plus per-message resolution of aliases and typos ("PH", "lagoss"), which fall
+back to the typo index when the gazetteer finds nothing.
+"""
+
+import re
+
+from agent.benchmarks import measure, per_item
+from agent.cities import registry
+from agent.utils import NIGERIAN_CITIES, find_cities_in_text, fuzzy_city
+
+MESSAGES = [
+    "there is light in lagos",
+    "no light for port harcourt since morning o",
+    "predict light in ado ekiti",
+    "check power status, location yenagoa",
+    "nepa take light for warri, abeg when e go come back?",
+    "light dey for abuja but no light in kaduna",
+    "hello lightpadi",
+]
+
+ALIAS_MESSAGES = [
+    "no light for ph since morning",
+    "abj light dey",
+    "lasgidi blackout again",
+    "nepa take light for benin",
+]
+
+TYPO_MESSAGES = [
+    "no light in lagoss",
+    "light don go for port harcot",
+    "nepa take light for enugwu",
+    "predict ibadn",
+]
+
+
+def legacy_extract_city_from_text(text):
+    """The original implementation: one fresh regex search per city."""
+    if not text:
+        return None
+    text_clean = re.sub(r"[^\w\s]", "", text)
+    for city in NIGERIAN_CITIES:
+        pattern = rf"\b{re.escape(city.lower())}\b"
+        if re.search(pattern, text_clean.lower()):
+            return city
+    return None
+
+
+def compiled_extract_city_from_text(text):
+    matches = find_cities_in_text(text)
+    return matches[0].city if matches else None
+
+
+def run(options):
+    number = options.get("number", 2000)
+    results = []
+    for label, fn in [
+        ("legacy per-city loop", legacy_extract_city_from_text),
+        ("compiled gazetteer", compiled_extract_city_from_text),
+    ]:
+        results.append(measure(
+            label,
+            lambda fn=fn: [fn(message) for message in MESSAGES],
+            number=number,
+        ))
+
+    names = ["lagos", "port  harcourt", "warri", "Atlantis"]
+    legacy_cities = list(NIGERIAN_CITIES)
+    results.append(measure(
+        "legacy .title() + list scan x4",
+        lambda: [name.strip().title() in legacy_cities for name in names],
+        number=number * 10,
+    ))
+    results.append(measure(
+        "registry.canonical x4",
+        lambda: [registry.canonical(name) for name in names],
+        number=number * 10,
+    ))
+
+    for label, messages, clear_cache in [
+        ("aliases, per message", ALIAS_MESSAGES, False),
+        ("typos, per message (warm)", TYPO_MESSAGES, False),
+        ("typos, per message (cold)", TYPO_MESSAGES, True),
+    ]:
+        def resolve(messages=messages, clear_cache=clear_cache):
+            for message in messages:
+                if clear_cache:
+                    fuzzy_city.cache_clear()
+                compiled_extract_city_from_text(message)
+        # Reported per message rather than per batch of messages.
+        results.append(per_item(measure(label, resolve, number=number), len(messages)))
+    return results
@@ -0,0 +1,41 @@
+"""
+Telex message parsing on generated payloads (see payloads.py): pulling the text
+out of multi-part, HTML-wrapped messages, finding the city and status, and the
+whole single-pass parse_telex_payload(). Also reports how many payloads were
+routed to the intent and city they were written for, so a faster matcher can't
+quietly become a worse one.
+"""
+
+from itertools import cycle
+
+from agent.benchmarks import measure
+from agent.benchmarks.payloads import TelexPayloads
+from agent.utils import (
+    extract_latest_message_text, extract_power_status_from_text, find_cities_in_text, parse_telex_payload,
+)
+
+SAMPLES = 2000
+
+
+def run(options):
+    number = options.get("number", 2000)
+    samples = TelexPayloads(seed=0).samples(SAMPLES)
+    messages = [sample.payload["message"] for sample in samples]
+    texts = [extract_latest_message_text(message) for message in messages]
+
+    results = []
+    for name, fn, inputs in [
+        ("extract_latest_message_text", extract_latest_message_text, messages),
+        ("find_cities_in_text", find_cities_in_text, texts),
+        ("extract_power_status_from_text", extract_power_status_from_text, texts),
+        ("parse_telex_payload", parse_telex_payload, [sample.payload for sample in samples]),
+    ]:
+        feed = cycle(inputs)
+        results.append(measure(name, lambda: fn(next(feed)), number=number))
+
+    routed = sum(
+        (parsed.intent, parsed.city) == (sample.intent, sample.city)
+        for parsed, sample in ((parse_telex_payload(sample.payload), sample) for sample in samples)
+    )
+    results.append({"name": f"routing accuracy: {routed / len(samples):.1%} of {len(samples):,} generated payloads"})
+    return results
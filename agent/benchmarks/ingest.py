@@ -0,0 +1,77 @@
+"""
+Report ingestion throughput: one transaction per report vs batched bulk inserts.
+
+Each round saves the same number of reports; rows are reported as reports/sec.
+The ingest guard check that runs before a single report is saved is timed too:
+it has to stay far cheaper than the per-row transaction it can skip.
+"""
+
+import random
+import time
+
+from django.db import transaction
+
+from agent.benchmarks import measure
+from agent.guard import ReportGuard
+from agent.ingest import record_report, save_reports
+from agent.models import CityPowerState, PowerReport
+from agent.utils import NIGERIAN_CITIES
+
+USES_DATABASE = True
+
+BATCH_SIZES = [50, 500]
+
+
+def _records(count, rng):
+    return [(rng.choice(NIGERIAN_CITIES), rng.randint(0, 1), None) for _ in range(count)]
+
+
+def _throughput(name, fn, records, repeat=3):
+    """Best of `repeat` runs of fn(records), as reports per second."""
+    best = None
+    for _ in range(repeat):
+        with transaction.atomic():
+            PowerReport.objects.all().delete()
+            CityPowerState.objects.all().delete()
+        start = time.perf_counter()
+        fn(records)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    per_report = best / len(records)
+    return {
+        "name": name,
+        "ops_per_sec": round(1 / per_report, 1) if per_report else float("inf"),
+        "usec_per_op": round(per_report * 1e6, 3),
+    }
+
+
+def per_row(records):
+    for city, power_status, observed_at in records:
+        record_report(city, power_status, observed_at)
+
+
+def batched(batch_size):
+    def save(records):
+        for start in range(0, len(records), batch_size):
+            save_reports(records[start:start + batch_size])
+    return save
+
+
+def run(options):
+    count = options.get("number", 2000)
+    records = _records(count, random.Random(0))
+    results = [_throughput(f"per-row create x{count}", per_row, records)]
+    for batch_size in BATCH_SIZES:
+        results.append(_throughput(f"bulk_create batches of {batch_size}", batched(batch_size), records))
+
+    guard = ReportGuard()
+    senders = [f"telex-user-{index}" for index in range(1000)]
+    checks = iter(range(10 ** 9))
+    results.append(measure(
+        "guard check (1k senders)",
+        lambda: guard.check(senders[next(checks) % 1000], "Lagos", "off"),
+        number=count,
+    ))
+    results.append(measure("guard check (duplicate)", lambda: guard.check("telex-user-0", "Lagos", "off"), number=count))
+    return results
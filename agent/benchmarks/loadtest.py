@@ -0,0 +1,134 @@
+"""
+HTTP load test: the Telex endpoints under gunicorn (WSGI) vs uvicorn (ASGI).
+
+Each server runs as a subprocess against a throwaway SQLite database, and a pool
+of client threads sends keep-alive requests to it. Run it with
+``python manage.py loadtest``.
+"""
+
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+MESSAGES = {
+    "ping": None,
+    "predict": "predict light in lagos",
+    "report": "no light in lagos",
+    "router": "check power status, location abuja",
+}
+
+SERVERS = {
+    "wsgi": ["gunicorn", "lightpadi_project.wsgi:application", "--workers", "{workers}", "--bind", "127.0.0.1:{port}"],
+    "asgi": ["uvicorn", "lightpadi_project.asgi:application", "--workers", "{workers}", "--port", "{port}",
+             "--log-level", "warning"],
+}
+
+
+def telex_body(text):
+    return json.dumps({"message": {"parts": [{"kind": "text", "text": text}]}}).encode()
+
+
+@contextmanager
+def running_server(kind, port, workers):
+    """Starts a migrated, empty LightPadi on 127.0.0.1:port and stops it afterwards.
+    Its database and /metrics files live in a temporary directory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            LIGHTPADI_DB_PATH=os.path.join(tmp, "loadtest.sqlite3"),
+            LIGHTPADI_METRICS_DIR=os.path.join(tmp, "metrics"),
+        )
+        env.pop("LIGHTPADI_ASYNC_VIEWS", None)  # let asgi.py pick the async views
+        manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+        subprocess.run(manage + ["migrate", "--verbosity", "0"], env=env, check=True, cwd=settings.BASE_DIR)
+
+        command = [arg.format(port=port, workers=workers) for arg in SERVERS[kind]]
+        server = subprocess.Popen(command, env=env, cwd=settings.BASE_DIR,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            yield
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def wait_until_up(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/ping")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not come up within {timeout}s")
+
+
+def run_load(host, port, endpoint, total, concurrency):
+    """
+    Sends `total` requests from `concurrency` threads. Returns a result row with
+    requests/sec and latency percentiles in milliseconds.
+    """
+    text = MESSAGES[endpoint]
+    body = telex_body(text) if text else None
+    method = "POST" if body else "GET"
+    headers = {"Content-Type": "application/json"}
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        mine = []
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                connection.request(method, f"/{endpoint}", body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+            except OSError as e:
+                errors.append(str(e))
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            mine.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 2) if latencies else None
+
+    return {
+        "name": f"{endpoint} x{total} @ {concurrency} clients",
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "errors": len(errors),
+    }
@@ -0,0 +1,97 @@
+"""
+Realistic Telex A2A payloads for benchmarks and load tests.
+
+Telex sends the new message as a text part and the conversation so far as a
+"data" part of text items, oldest first, ending with the new message again.
+Texts arrive wrapped in HTML (<p>, <strong>, <br />). Messages mix English and
+Pidgin, and name cities by canonical name, alias ("PH", "lasgidi"), in odd
+casing or with the odd typo. Every generated payload records the intent and
+city it was written for, so a benchmark can check routing as well as time it.
+"""
+
+import random
+from typing import NamedTuple
+
+from agent.cities import registry
+
+TEMPLATES = {
+    "report": (
+        "No light in {city} since morning",
+        "NEPA take light for {city} again 😩",
+        "light don go for {city} o",
+        "Blackout for {city} right now",
+        "There is light in {city} now!!",
+        "power restored in {city}, thank God",
+        "light dey for {city} since 6pm",
+    ),
+    "predict": (
+        "Will there be light in {city} tonight?",
+        "predict light in {city}",
+        "check power status, location {city}",
+        "Any update on power for {city}?",
+        "How far with light for {city}",
+    ),
+    "subscribe": (
+        "Alert me when light comes back in {city}",
+        "notify me about power in {city}",
+    ),
+}
+CHATTER = ("hi", "hello LightPadi", "good morning", "ok thanks", "👋")
+WRAPPERS = ("<p>{}</p>", "<p><strong>{}</strong></p>", "<p>{}<br /></p>", "{}")
+MIX = {"report": 0.45, "predict": 0.45, "subscribe": 0.10}
+
+
+class Sample(NamedTuple):
+    payload: dict
+    intent: str
+    city: str  # canonical name
+
+
+class TelexPayloads:
+    """Seeded generator: the same seed always yields the same payloads."""
+
+    def __init__(self, seed=0, alias_rate=0.15, typo_rate=0.05, max_history=4, senders=100000):
+        self.rng = random.Random(seed)
+        self.alias_rate = alias_rate
+        self.typo_rate = typo_rate
+        self.max_history = max_history
+        self.senders = senders
+        self._typo_cities = frozenset(city for city in registry if " " not in city.name and len(city.name) >= 6)
+
+    def mention(self, city):
+        """How a user might write the city: an alias, a typo or the name in some casing."""
+        roll = self.rng.random()
+        if roll < self.alias_rate and city.aliases:
+            return self.rng.choice(city.aliases)
+        if roll < self.alias_rate + self.typo_rate and city in self._typo_cities:
+            name, position = city.name.lower(), self.rng.randrange(1, len(city.name) - 1)
+            return name[:position] + name[position + 1:]  # one letter dropped
+        return self.rng.choice((city.name, city.name.lower(), city.name.upper()))
+
+    def sample(self, intent=None, city=None):
+        intent = intent or self.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        city = registry.get(city) if city else self.rng.choice(registry.cities)
+        text = self.rng.choice(TEMPLATES[intent]).format(city=self.mention(city))
+        html = self.rng.choice(WRAPPERS).format(text)
+
+        history = [self.rng.choice(WRAPPERS).format(self.rng.choice(CHATTER))
+                   for _ in range(self.rng.randint(0, self.max_history))]
+        message = {
+            "kind": "message",
+            "role": "user",
+            "parts": [
+                {"kind": "text", "text": html},
+                {"kind": "data", "data": [{"kind": "text", "text": item} for item in (*history, html)]},
+            ],
+            "messageId": f"{self.rng.getrandbits(64):016x}",
+            "metadata": {"telex_user_id": f"user-{self.rng.randrange(self.senders)}"},
+        }
+        payload = {"message": message, "contextId": f"{self.rng.getrandbits(64):016x}"}
+        if intent == "subscribe":
+            payload["configuration"] = {"pushNotificationConfig": {
+                "url": "http://127.0.0.1:8765/a2a/webhook", "token": f"{self.rng.getrandbits(64):016x}",
+            }}
+        return Sample(payload, intent, city.name)
+
+    def samples(self, count, intent=None):
+        return [self.sample(intent) for _ in range(count)]
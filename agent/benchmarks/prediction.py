@@ -0,0 +1,64 @@
+"""
+Prediction latency as the PowerReport table grows.
+
+Predictions read one CityPowerState row by primary key plus a cached forecasting
+model, so the per-call cost should stay flat from 10k to 1M reports; the query
+plan is printed to confirm it. Fitting a model scans the city's whole history
+and is timed separately, as is the neighbour vote that stands in for cities
+without recent reports (one k-NN table row and a weighted sum, no extra queries).
+Outage heatmaps are timed as a full vectorized rebuild from a city's intervals and
+as the /history read, one primary-key row however long the history.
+"""
+
+from django.db import connection
+
+from agent.ai_engine import _predict_from_state, predict_light_status, predict_many, prediction_cache
+from agent.benchmarks import DEFAULT_ROWS, measure, parse_row_counts, seed_reports
+from agent.forecast import fit_city, model_cache
+from agent.heatmap import get_heatmap, history, rebuild_heatmaps
+from agent.models import CityPowerState, OutageInterval
+from agent.spatial import neighbor_inference
+from agent.utils import NIGERIAN_CITIES
+
+USES_DATABASE = True
+
+
+def run(options):
+    number = options.get("number", 2000)
+    results = []
+    for rows in parse_row_counts(options.get("rows") or DEFAULT_ROWS):
+        seed_reports(rows)
+        results.append(measure(f"forecast fit @ {rows:,} rows", lambda: fit_city("Lagos"), number=1, repeat=3))
+        model_cache.invalidate()
+        results.append(measure(
+            f"uncached prediction @ {rows:,} rows",
+            lambda: _predict_from_state("Lagos"),
+            number=number,
+        ))
+        prediction_cache.invalidate("Lagos")
+        results.append(measure(
+            f"cached prediction @ {rows:,} rows",
+            lambda: predict_light_status("Lagos"),
+            number=number,
+        ))
+        results.append(measure(
+            f"uncached all-cities snapshot @ {rows:,} rows",
+            lambda: [prediction_cache.invalidate(city) for city in NIGERIAN_CITIES] and predict_many(),
+            number=max(number // 40, 1),
+        ))
+        OutageInterval.rebuild("Lagos")  # seeded reports skip the interval fold
+        results.append(measure(
+            f"heatmap rebuild (Lagos) @ {rows:,} rows", lambda: rebuild_heatmaps(["Lagos"]), number=1, repeat=3,
+        ))
+        results.append(measure(f"history read @ {rows:,} rows", lambda: history(get_heatmap("Lagos")), number=number))
+    neighbor_inference.refresh()
+    results.append(measure("neighbour inference", lambda: neighbor_inference.infer("Oshogbo"), number=number))
+    results.append({"name": f"cache: {prediction_cache.stats()}"})
+
+    query = CityPowerState.objects.filter(pk="Lagos")
+    sql, params = query.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}" if connection.vendor == "sqlite" else f"EXPLAIN {sql}", params)
+        plan = " | ".join(str(row[-1]) for row in cursor.fetchall())
+    results.append({"name": f"plan: {plan}"})
+    return results
@@ -0,0 +1,76 @@
+"""
+Middleware/app stack overhead: the default settings vs the lean "api" profile.
+
+Each profile runs in a fresh interpreter, which reports its cold start (django.setup()
+plus loading the URL conf) and the per-request cost of a database-free /ping GET and
+/router POST through the full handler and middleware chain.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+
+PROFILES = {
+    "default": "lightpadi_project.settings",
+    "api": "lightpadi_project.settings_api",
+}
+
+SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+cold_start = time.perf_counter() - start
+
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+body = json.dumps({"message": {"parts": [{"kind": "text", "text": "hello lightpadi"}]}})
+number = int(sys.argv[1])
+results = {"cold_start": cold_start}
+for name, call in [
+    ("ping", lambda: client.get("/ping")),
+    ("router", lambda: client.post("/router", body, content_type="application/json")),
+]:
+    assert call().status_code == 200
+    best = None
+    for _ in range(5):
+        t = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    results[name] = best / number
+print(json.dumps(results))
+"""
+
+
+def measure_profile(settings_module, number):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, LIGHTPADI_METRICS_DIR=tmp)
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT, str(number)],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(options):
+    number = options.get("number", 2000)
+    results = []
+    for profile, settings_module in PROFILES.items():
+        timings = measure_profile(settings_module, number)
+        results.append({"name": f"{profile}: cold start {timings['cold_start'] * 1000:.1f} ms"})
+        for endpoint in ("ping", "router"):
+            per_call = timings[endpoint]
+            results.append({
+                "name": f"{profile}: {endpoint} request",
+                "ops_per_sec": round(1 / per_call, 1),
+                "usec_per_op": round(per_call * 1e6, 3),
+            })
+    return results
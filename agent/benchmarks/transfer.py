@@ -0,0 +1,68 @@
+"""
+Export and import throughput as the PowerReport table grows, e.g.
+`python manage.py benchmark transfer --rows 1e6,1e7`.
+
+Exports stream into a null sink; the peak Python memory of the CSV export is
+traced separately to confirm it stays flat with table size. Each import loads
+the CSV export back into an emptied table, with deduplication on. Rows are
+reported as rows/sec.
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.db import transaction
+
+from agent.benchmarks import DEFAULT_ROWS, parse_row_counts, seed_reports
+from agent.models import CityPowerState, PowerReport
+from agent.transfer import export_reports, import_reports, pa, read_rows, report_rows
+
+USES_DATABASE = True
+
+
+def _rate(name, rows, elapsed):
+    return {
+        "name": name,
+        "ops_per_sec": round(rows / elapsed, 1) if elapsed else float("inf"),
+        "usec_per_op": round(elapsed / rows * 1e6, 3),
+    }
+
+
+def _export(fmt, sink):
+    start = time.perf_counter()
+    for chunk in export_reports(fmt, report_rows()):
+        sink.write(chunk)
+    return time.perf_counter() - start
+
+
+def run(options):
+    formats = ["csv", "ndjson"] + (["parquet"] if pa is not None else [])
+    results = []
+    for rows in parse_row_counts(options.get("rows") or DEFAULT_ROWS):
+        seed_reports(rows)
+        with open(os.devnull, "wb") as sink:
+            for fmt in formats:
+                results.append(_rate(f"{fmt} export @ {rows:,} rows", rows, _export(fmt, sink)))
+            tracemalloc.start()
+            _export("csv", sink)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append({"name": f"csv export peak Python memory @ {rows:,} rows: {peak / 1e6:.1f} MB"})
+
+        with tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False) as dump:
+            _export("csv", dump)
+        try:
+            with transaction.atomic():
+                PowerReport.objects.all().delete()
+                CityPowerState.objects.all().delete()
+            with open(dump.name, newline="") as source:
+                start = time.perf_counter()
+                imported = import_reports(read_rows("csv", source))["imported"]
+                results.append(_rate(f"csv import @ {imported:,} rows", imported, time.perf_counter() - start))
+        finally:
+            os.unlink(dump.name)
+    if pa is None:
+        results.append({"name": "parquet skipped: pyarrow is not installed"})
+    return results
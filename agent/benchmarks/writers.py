@@ -0,0 +1,91 @@
+"""
+Concurrent-writer stress test: Django's SQLite defaults vs LIGHTPADI_SQLITE tuning.
+
+For each mode, a fresh database is migrated, then writer processes (standing in for
+gunicorn workers) save single reports through record_report() while reader processes
+scan recent reports, as predictions and history pages do. Rows report saved
+reports/sec across all writers and the share of writes and reads that failed.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+
+WRITERS = 8
+READERS = 4
+
+SCRIPT = r"""
+import json, sys, time
+import django
+django.setup()
+from django.db import OperationalError
+from agent.ingest import record_report
+from agent.models import PowerReport
+from agent.utils import NIGERIAN_CITIES
+
+role, count, seed = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+done = errors = 0
+for i in range(count):
+    city = NIGERIAN_CITIES[(seed + i) % len(NIGERIAN_CITIES)]
+    try:
+        if role == "writer":
+            record_report(city, i % 2)
+        else:
+            list(PowerReport.objects.filter(location=city).values_list("status", "timestamp")[:500])
+        done += 1
+    except OperationalError:
+        errors += 1
+print(json.dumps({"role": role, "done": done, "errors": errors}))
+"""
+
+
+def stress(tuned, writers, readers, per_process):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            LIGHTPADI_DB_PATH=os.path.join(tmp, "writers.sqlite3"),
+            LIGHTPADI_METRICS_DIR=os.path.join(tmp, "metrics"),
+            LIGHTPADI_SQLITE_TUNING="true" if tuned else "false",
+        )
+        env.pop("LIGHTPADI_ASYNC_VIEWS", None)
+        subprocess.run([sys.executable, str(settings.BASE_DIR / "manage.py"), "migrate", "--verbosity", "0"],
+                       env=env, cwd=settings.BASE_DIR, check=True)
+
+        start = time.perf_counter()
+        roles = ["writer"] * writers + ["reader"] * readers
+        processes = [
+            subprocess.Popen([sys.executable, "-c", SCRIPT, role, str(per_process), str(seed)],
+                             env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True)
+            for seed, role in enumerate(roles)
+        ]
+        outputs = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in processes]
+        elapsed = time.perf_counter() - start
+
+    totals = {role: {"done": 0, "errors": 0} for role in ("writer", "reader")}
+    for output in outputs:
+        totals[output["role"]]["done"] += output["done"]
+        totals[output["role"]]["errors"] += output["errors"]
+    return totals, elapsed
+
+
+def run(options):
+    per_process = max(options.get("number", 2000) // 10, 1)
+    results = []
+    for label, tuned in [("django defaults", False), ("tuned (WAL + retry)", True)]:
+        totals, elapsed = stress(tuned, WRITERS, READERS, per_process)
+        saved = totals["writer"]["done"]
+        results.append({
+            "name": f"{label}: {WRITERS} writers + {READERS} readers",
+            "ops_per_sec": round(saved / elapsed, 1),
+            "usec_per_op": round(elapsed / max(saved, 1) * 1e6, 3),
+        })
+        for role, counts in totals.items():
+            attempts = counts["done"] + counts["errors"]
+            results.append({"name": f"{label}: {counts['errors']} of {attempts} {role} calls failed "
+                                    f"({counts['errors'] / max(attempts, 1):.1%})"})
+    return results
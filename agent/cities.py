@@ -0,0 +1,128 @@
+"""
+The city registry: every city LightPadi supports, defined once.
+
+Each City is a frozen record with a stable id, its canonical name, state,
+electricity distribution company (DisCo), coordinates and the aliases people
+use for it. The registry is built once at import and indexes every name, alias
+and id in one dict, so resolving "port  harcourt", "PH" or "port-harcourt" to
+the same City is a single hash lookup. The message matcher, the prediction
+engine, the views and the bulk endpoints all resolve cities through it; stored
+rows (PowerReport.location and friends) hold the canonical name.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class City:
+    id: str  # stable slug, e.g. "port-harcourt"
+    name: str  # canonical display name, as stored in PowerReport.location
+    state: str
+    disco: str  # distribution company serving the city
+    latitude: float
+    longitude: float
+    aliases: tuple = ()  # lowercase nicknames and spellings, matched exactly
+
+    def __str__(self):
+        return self.name
+
+
+def _city(name, state, disco, latitude, longitude, aliases=()):
+    return City("-".join(name.lower().split()), name, state, disco, latitude, longitude, aliases)
+
+
+# State capitals and major cities.
+CITIES = (
+    _city("Abakaliki", "Ebonyi", "Enugu", 6.3249, 8.1137),
+    _city("Abeokuta", "Ogun", "Ibadan", 7.1475, 3.3619),
+    _city("Abuja", "FCT", "Abuja", 9.0765, 7.3986, aliases=("abj", "fct")),
+    _city("Ado Ekiti", "Ekiti", "Benin", 7.6211, 5.2214, aliases=("adoekiti",)),
+    _city("Akure", "Ondo", "Benin", 7.2571, 5.2058),
+    _city("Asaba", "Delta", "Benin", 6.1980, 6.7319),
+    _city("Awka", "Anambra", "Enugu", 6.2105, 7.0741),
+    _city("Bauchi", "Bauchi", "Jos", 10.3158, 9.8442),
+    _city("Benin City", "Edo", "Benin", 6.3350, 5.6037, aliases=("benin",)),
+    _city("Birnin Kebbi", "Kebbi", "Kaduna", 12.4539, 4.1975, aliases=("kebbi",)),
+    _city("Calabar", "Cross River", "Port Harcourt", 4.9757, 8.3417),
+    _city("Damaturu", "Yobe", "Yola", 11.7470, 11.9608),
+    _city("Lagos", "Lagos", "Eko/Ikeja", 6.5244, 3.3792, aliases=("lasgidi", "eko")),
+    _city("Enugu", "Enugu", "Enugu", 6.4584, 7.5464, aliases=("coal city",)),
+    _city("Gombe", "Gombe", "Jos", 10.2897, 11.1673),
+    _city("Gusau", "Zamfara", "Kaduna", 12.1628, 6.6614),
+    _city("Ibadan", "Oyo", "Ibadan", 7.3775, 3.9470),
+    _city("Ilorin", "Kwara", "Ibadan", 8.4966, 4.5421),
+    _city("Jalingo", "Taraba", "Yola", 8.8937, 11.3596),
+    _city("Jos", "Plateau", "Jos", 9.8965, 8.8583, aliases=("jtown",)),
+    _city("Kaduna", "Kaduna", "Kaduna", 10.5105, 7.4165),
+    _city("Kano", "Kano", "Kano", 12.0022, 8.5920),
+    _city("Katsina", "Katsina", "Kano", 12.9908, 7.6018),
+    _city("Lafia", "Nasarawa", "Abuja", 8.4939, 8.5153),
+    _city("Lokoja", "Kogi", "Abuja", 7.8023, 6.7333),
+    _city("Maiduguri", "Borno", "Yola", 11.8311, 13.1510),
+    _city("Makurdi", "Benue", "Jos", 7.7322, 8.5391),
+    _city("Minna", "Niger", "Abuja", 9.5836, 6.5463),
+    _city("Oshogbo", "Osun", "Ibadan", 7.7827, 4.5418, aliases=("osogbo",)),
+    _city("Ondo", "Ondo", "Benin", 7.0932, 4.8353),
+    _city("Owerri", "Imo", "Enugu", 5.4840, 7.0351),
+    _city("Port Harcourt", "Rivers", "Port Harcourt", 4.8156, 7.0498,
+          aliases=("ph", "phc", "portharcourt", "pitakwa")),
+    _city("Sokoto", "Sokoto", "Kaduna", 13.0059, 5.2476),
+    _city("Umuahia", "Abia", "Enugu", 5.5250, 7.4922),
+    _city("Uyo", "Akwa Ibom", "Port Harcourt", 5.0377, 7.9128),
+    _city("Yenagoa", "Bayelsa", "Port Harcourt", 4.9267, 6.2676),
+    _city("Yola", "Adamawa", "Yola", 9.2035, 12.4954),
+    _city("Aba", "Abia", "Enugu", 5.1066, 7.3667),
+    _city("Onitsha", "Anambra", "Enugu", 6.1413, 6.8029),
+    _city("Warri", "Delta", "Benin", 5.5167, 5.7500),
+)
+
+
+def normalize(name):
+    """Lowercase, with hyphens and any run of whitespace collapsed to one space."""
+    return " ".join(name.replace("-", " ").lower().split())
+
+
+class CityRegistry:
+    """Read-only, hash-indexed view of CITIES. Use the module-level `registry`."""
+
+    def __init__(self, cities):
+        self.cities = tuple(cities)
+        self.names = tuple(city.name for city in self.cities)
+        self._by_key = {}
+        for city in self.cities:
+            for key in (city.name, city.id, *city.aliases):
+                existing = self._by_key.setdefault(normalize(key), city)
+                if existing is not city:
+                    raise ValueError(f"'{key}' names both {existing.name} and {city.name}")
+        self._index = {city.name: index for index, city in enumerate(self.cities)}
+
+    def __iter__(self):
+        return iter(self.cities)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def get(self, name):
+        """The City for a name, alias or id in any case or spacing, or None."""
+        if not isinstance(name, str):
+            return None
+        return self._by_key.get(normalize(name))
+
+    def canonical(self, name):
+        """The canonical name for a name, alias or id, or None if unsupported."""
+        city = self.get(name)
+        return city.name if city else None
+
+    def index(self, name):
+        """Position of a canonical name in `cities`, for per-city arrays."""
+        return self._index[name]
+
+    def lookup_keys(self):
+        """{normalized name or alias: canonical name}, for building matchers."""
+        return {key: city.name for key, city in self._by_key.items()}
+
+
+registry = CityRegistry(CITIES)
@@ -0,0 +1,59 @@
+"""
+SQLite production tuning.
+
+configure_sqlite() runs on every new SQLite connection (wired up in
+AgentConfig.ready()). It applies the PRAGMAs in LIGHTPADI_SQLITE: WAL so
+readers never block the writer, synchronous=NORMAL, a busy timeout, and a
+larger page cache and mmap window. retry_on_lock() retries a whole write
+transaction with exponential backoff when another worker still holds the
+write lock after the busy timeout.
+"""
+
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _config():
+    return getattr(settings, "LIGHTPADI_SQLITE", {})
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver: applies LIGHTPADI_SQLITE["PRAGMAS"] to SQLite connections."""
+    config = _config()
+    if connection.vendor != "sqlite" or not config.get("TUNED"):
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in config.get("PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def is_lock_error(error):
+    return "database is locked" in str(error) or "database table is locked" in str(error)
+
+
+def retry_on_lock(func, *args, **kwargs):
+    """
+    Calls func(*args, **kwargs), which must run its own transaction, retrying
+    up to LIGHTPADI_SQLITE["WRITE_RETRIES"] times while SQLite reports a lock.
+    Inside an outer atomic block the error is raised as-is, since only the
+    outermost transaction can be retried.
+    """
+    config = _config()
+    retries = config.get("WRITE_RETRIES", 0) if config.get("TUNED") else 0
+    backoff = config.get("RETRY_BACKOFF", 0.05)
+
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if attempt == retries or not is_lock_error(e) or transaction.get_connection().in_atomic_block:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("db.write_locked", extra={"attempt": attempt + 1, "retry_in": round(delay, 3)})
+            time.sleep(delay)
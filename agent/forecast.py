@@ -0,0 +1,360 @@
+"""
+Per-city power forecasting from the PowerReport history.
+
+A city's recent history is run-length encoded into alternating ON/OFF runs. Each run
+lasts from its first report to the first report of the next run, so the
+completed runs give empirical on-duration and outage-duration distributions,
+summarised as fixed quantiles. Hour-of-day and day-of-week histograms give the
+chance of an outage at a given time. Fitting is one vectorized NumPy pass over
+the history and is cached per city; forecasting is arithmetic on the fit.
+
+`manage.py train_lightpadi` fits every city offline and writes the models to a
+single .npy artifact. Workers memory-map it and reload it when it changes, so
+request-time fitting is only a fallback for cities missing from the artifact.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import stage
+from .models import PowerReport
+from .storage import get_storage
+
+QUANTILES = np.linspace(0.0, 1.0, 21)  # duration quantile levels kept per status
+PRIOR_STRENGTH = 5  # completed runs needed before run lengths outweigh the time-of-day prior
+FRESH_REPORT = 3600  # seconds a report outweighs the prior for, in cities without completed runs
+
+OFF = int(PowerReport.Status.OFF)
+ON = int(PowerReport.Status.ON)
+
+
+@dataclass
+class CityModel:
+    """Fitted parameters for one city. Durations are in seconds."""
+    off_durations: np.ndarray  # outage-duration quantiles at QUANTILES
+    on_durations: np.ndarray  # on-duration quantiles at QUANTILES
+    off_runs: int  # completed outages behind off_durations
+    on_runs: int  # completed on-runs behind on_durations
+    hourly_off: np.ndarray  # P(off) for each local hour of day, Laplace-smoothed
+    weekday_off: np.ndarray  # P(off) for each local weekday (Monday=0), Laplace-smoothed
+    report_count: int
+
+    def durations(self, status):
+        if status == OFF:
+            return self.off_durations, self.off_runs
+        return self.on_durations, self.on_runs
+
+
+def utc_offset():
+    """Seconds east of UTC for the project time zone (Africa/Lagos has no DST)."""
+    return int(timezone.localtime().utcoffset().total_seconds())
+
+
+def fit(timestamps, statuses):
+    """
+    Fits a CityModel from report epoch seconds and statuses, both sorted by time.
+    """
+    t = np.asarray(timestamps, dtype=np.float64)
+    s = np.asarray(statuses, dtype=np.int8)
+
+    # Run-length encode: a run starts at every report whose status differs from the previous one.
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+    run_status = s[starts]
+    run_lengths = np.diff(t[starts])  # the last run is still open, so it has no length yet
+    completed = run_status[:-1]
+
+    def quantiles(lengths):
+        return np.quantile(lengths, QUANTILES) if lengths.size else np.zeros_like(QUANTILES)
+
+    off_lengths = run_lengths[completed == OFF]
+    on_lengths = run_lengths[completed == ON]
+
+    local = t + utc_offset()
+    hours = (local // 3600 % 24).astype(np.intp)
+    weekdays = ((local // 86400 + 3) % 7).astype(np.intp)  # 1970-01-01 was a Thursday
+    is_off = (s == OFF).astype(np.float64)
+
+    def off_share(bins, size):
+        off = np.bincount(bins, weights=is_off, minlength=size)
+        total = np.bincount(bins, minlength=size)
+        return (off + 1) / (total + 2)
+
+    return CityModel(
+        off_durations=quantiles(off_lengths),
+        on_durations=quantiles(on_lengths),
+        off_runs=int(off_lengths.size),
+        on_runs=int(on_lengths.size),
+        hourly_off=off_share(hours, 24),
+        weekday_off=off_share(weekdays, 7),
+        report_count=int(s.size),
+    )
+
+
+def fit_city(location):
+    """
+    Fits a city's model from its reports in the hot window (LIGHTPADI_STORAGE
+    HOT_DAYS). Returns None for cities without recent reports.
+    """
+    rows = get_storage().hot_reports(location).order_by("timestamp").values_list("timestamp", "status")
+    history = np.array([(timestamp.timestamp(), report_status) for timestamp, report_status in rows.iterator()])
+    if not history.size:
+        return None
+    return fit(history[:, 0], history[:, 1])
+
+
+def fit_all(chunk_size=2000, locations=None):
+    """
+    Yields (city, CityModel) for every city with reports in the hot window (or
+    just `locations`), streaming them in (location, timestamp) order so only one
+    city's history is held at a time.
+    """
+    rows = get_storage().hot_reports()
+    if locations is not None:
+        rows = rows.filter(location__in=locations)
+    rows = rows.order_by("location", "timestamp").values_list("location", "timestamp", "status")
+    city, times, statuses = None, [], []
+    for location, timestamp, report_status in rows.iterator(chunk_size=chunk_size):
+        if location != city:
+            if times:
+                yield city, fit(times, statuses)
+            city, times, statuses = location, [], []
+        times.append(timestamp.timestamp())
+        statuses.append(report_status)
+    if times:
+        yield city, fit(times, statuses)
+
+
+# One fixed-size record per city, so the artifact can be memory-mapped as-is.
+ARTIFACT_DTYPE = np.dtype([
+    ("city", "U64"),
+    ("off_durations", "f8", QUANTILES.size),
+    ("on_durations", "f8", QUANTILES.size),
+    ("off_runs", "i8"),
+    ("on_runs", "i8"),
+    ("hourly_off", "f8", 24),
+    ("weekday_off", "f8", 7),
+    ("report_count", "i8"),
+])
+
+
+def save_models(path, models):
+    """
+    Writes {city: CityModel} to a .npy artifact. The file is written beside the
+    target and renamed into place, so workers never map a half-written file.
+    """
+    records = np.zeros(len(models), dtype=ARTIFACT_DTYPE)
+    for row, (city, model) in enumerate(sorted(models.items())):
+        records[row] = (
+            city, model.off_durations, model.on_durations, model.off_runs, model.on_runs,
+            model.hourly_off, model.weekday_off, model.report_count,
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def load_models(path):
+    """Memory-maps an artifact. Returns ({city: row}, records); rows are views into the mapping."""
+    records = np.load(path, mmap_mode="r")
+    return {str(city): row for row, city in enumerate(records["city"])}, records
+
+
+def model_from_record(record):
+    return CityModel(
+        off_durations=record["off_durations"],
+        on_durations=record["on_durations"],
+        off_runs=int(record["off_runs"]),
+        on_runs=int(record["on_runs"]),
+        hourly_off=record["hourly_off"],
+        weekday_off=record["weekday_off"],
+        report_count=int(record["report_count"]),
+    )
+
+
+def survival(quantiles, runs, elapsed):
+    """P(run lasts longer than `elapsed` seconds), smoothed towards 1/2 for short histories."""
+    if not runs:
+        return 0.5
+    ended = 1.0 if elapsed >= quantiles[-1] else float(np.interp(elapsed, quantiles, QUANTILES, left=0.0))
+    return ((1.0 - ended) * runs + 1) / (runs + 2)
+
+
+def expected_remaining(quantiles, runs, elapsed):
+    """Mean seconds left in a run that has lasted `elapsed` so far, or None without history."""
+    if not runs:
+        return None
+    longer = quantiles[quantiles > elapsed]
+    if longer.size:
+        return float(longer.mean() - elapsed)
+    # Already longer than any run seen: expect it to end within a median run.
+    return float(np.median(quantiles))
+
+
+@dataclass
+class Forecast:
+    status: int  # PowerReport.Status predicted for now
+    confidence: float  # calibrated probability of `status`
+    next_change: object  # aware datetime of the expected next transition, or None
+
+
+def forecast(model, last_status, last_changed_at, last_reported_at, now=None, heatmap=None):
+    """
+    Forecasts the current status and next transition for a city whose latest
+    run (`last_status` since `last_changed_at`) was last confirmed at `last_reported_at`.
+    With the city's outage heatmap (agent/heatmap.py), the time-of-day prior is
+    its hour-of-week outage probability, falling back to the model's report
+    histograms for hours it has seen little of. The prior only matters once the
+    latest report has aged: one from seconds ago decides the status.
+    """
+    now = now or timezone.now()
+    quantiles, runs = model.durations(last_status)
+    elapsed = max((now - last_changed_at).total_seconds(), 0.0)
+    confirmed = max((last_reported_at - last_changed_at).total_seconds(), 0.0)
+
+    # The run is known to have lasted until the last report; condition on that.
+    p_run = survival(quantiles, runs, elapsed) / survival(quantiles, runs, confirmed)
+
+    local = timezone.localtime(now)
+    p_off = (model.hourly_off[local.hour] + model.weekday_off[local.weekday()]) / 2
+    if heatmap is not None:
+        p_off = heatmap.probability_at(now, prior=p_off)
+    p_prior = p_off if last_status == OFF else 1 - p_off
+
+    # A fresh report is the best evidence there is: it outweighs the prior until
+    # it is as old as a typical run, then run lengths and prior take over.
+    horizon = float(np.median(quantiles)) if runs else FRESH_REPORT
+    since_report = max((now - last_reported_at).total_seconds(), 0.0)
+    freshness = max(1.0 - since_report / horizon, 0.0) if horizon > 0 else 0.0
+    weight = freshness + (1 - freshness) * runs / (runs + PRIOR_STRENGTH)
+    p_same = weight * min(p_run, 1.0) + (1 - weight) * p_prior
+
+    if p_same >= 0.5:
+        status, confidence = last_status, p_same
+        remaining = expected_remaining(quantiles, runs, elapsed)
+    else:
+        # The run has most likely ended already; the next change ends the new one.
+        status, confidence = 1 - last_status, 1 - p_same
+        other, other_runs = model.durations(status)
+        remaining = expected_remaining(other, other_runs, 0.0)
+
+    next_change = now + timedelta(seconds=remaining) if remaining is not None else None
+    return Forecast(status=status, confidence=round(float(confidence), 2), next_change=next_change)
+
+
+UNFITTABLE = object()  # ModelCache's entry for a city with no reports in the hot window
+
+
+class ModelCache:
+    """
+    Per-city CityModels for forecasting.
+
+    Models come from the trained artifact at ARTIFACT when it exists. Its mtime
+    is checked at most every RELOAD_INTERVAL seconds and a newer file is mapped
+    in place of the old one, so retraining needs no worker restart. Cities not
+    in the artifact are fitted on demand and kept for REFIT_INTERVAL seconds;
+    duration and time-of-day distributions move slowly, and the current run
+    always comes from CityPowerState instead. Cities with nothing to fit are
+    remembered for as long, so they don't cost a query on every cache miss.
+    """
+
+    def __init__(self, refit_interval=900, artifact=None, reload_interval=5):
+        self.refit_interval = refit_interval
+        self.artifact = artifact
+        self.reload_interval = reload_interval
+        self._models = {}  # city -> (fitted_at, CityModel or UNFITTABLE)
+        self._trained = {}  # city -> row in self._records
+        self._records = None
+        self._artifact_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_FORECAST", {})
+        return cls(
+            refit_interval=config.get("REFIT_INTERVAL", 900),
+            artifact=config.get("ARTIFACT"),
+            reload_interval=config.get("RELOAD_INTERVAL", 5),
+        )
+
+    def load_artifact(self):
+        """Maps the artifact if it changed since the last check. Returns True when it is loaded."""
+        if not self.artifact:
+            return False
+        try:
+            mtime = os.stat(self.artifact).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if mtime == self._artifact_mtime:
+                return self._records is not None
+            if mtime is None:
+                self._trained, self._records = {}, None
+            else:
+                self._trained, self._records = load_models(self.artifact)
+            self._artifact_mtime = mtime
+            return self._records is not None
+
+    def _maybe_reload(self):
+        if self.artifact and (self._checked_at is None or self._checked_at + self.reload_interval <= time.monotonic()):
+            self.load_artifact()
+
+    def _cached(self, location):
+        """The city's CityModel, UNFITTABLE when it was just found to have none, or None if not cached."""
+        with self._lock:
+            row = self._trained.get(location)
+            if row is not None:
+                return model_from_record(self._records[row])
+            entry = self._models.get(location)
+        if entry and entry[0] + self.refit_interval > time.monotonic():
+            return entry[1]
+        return None
+
+    def get(self, location):
+        self._maybe_reload()
+        model = self._cached(location)
+        if model is not None:
+            return None if model is UNFITTABLE else model
+
+        with stage("fit"):
+            model = fit_city(location)
+        with self._lock:
+            self._models[location] = (time.monotonic(), UNFITTABLE if model is None else model)
+        return model
+
+    def get_many(self, locations):
+        """Returns {city: CityModel}, fitting every city not already cached in one query."""
+        self._maybe_reload()
+        models = {location: self._cached(location) for location in locations}
+        missing = [location for location, model in models.items() if model is None]
+        if missing:
+            fitted_at = time.monotonic()
+            with stage("fit"):
+                models.update(fit_all(locations=missing))
+            with self._lock:
+                for location in missing:
+                    self._models[location] = (fitted_at, UNFITTABLE if models[location] is None else models[location])
+        return {location: model for location, model in models.items() if model is not None and model is not UNFITTABLE}
+
+    def invalidate(self, location=None):
+        with self._lock:
+            if location is None:
+                self._models.clear()
+            else:
+                self._models.pop(location, None)
+
+
+model_cache = ModelCache.from_settings()
@@ -0,0 +1,138 @@
+"""
+Ingest guard for single Telex reports: per-sender rate limiting and duplicate
+suppression, checked before a report reaches the database.
+
+- A sender repeating their last accepted status for a city within DEDUP_WINDOW
+  seconds is a duplicate. It gets the normal "got it" reply but nothing is
+  written, and every repeat pushes the window further out, so a bot looping one
+  message stays collapsed for as long as it keeps sending. A different status
+  is a real switch and replaces it, so OFF, ON, OFF within minutes saves all three.
+- Every sender has a token bucket of BURST reports refilled at RATE_PER_MINUTE.
+  Reports beyond it are refused with a "slow down" reply.
+
+The sender is the Telex user (message metadata) or, failing that, the A2A
+conversation id; reports without either pass through unguarded rather than
+sharing one bucket, since every Telex request arrives from the same servers.
+
+State lives in this process by default: a few dict operations under a lock,
+microseconds next to the transaction they can save. Set ALIAS to a CACHES alias
+to share it between workers; that path uses a fixed-window counter (atomic
+incr) in place of the bucket, and cache.add() for a sender's last status.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import count_guard
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+LIMITED = "limited"
+
+
+class ReportGuard:
+    def __init__(self, enabled=True, rate_per_minute=4, burst=6, dedup_window=600, alias=None, max_entries=10000):
+        self.enabled = enabled
+        self.rate = rate_per_minute / 60  # tokens per second
+        self.burst = burst
+        self.dedup_window = dedup_window
+        self.alias = alias
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()  # sender -> [tokens, updated_at]
+        self._recent = OrderedDict()  # (sender, city) -> (last accepted status, expires_at)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_REPORT_GUARD", {})
+        return cls(
+            enabled=config.get("ENABLED", True),
+            rate_per_minute=config.get("RATE_PER_MINUTE", 4),
+            burst=config.get("BURST", 6),
+            dedup_window=config.get("DEDUP_WINDOW", 600),
+            alias=config.get("ALIAS"),
+            max_entries=config.get("MAX_ENTRIES", 10000),
+        )
+
+    def check(self, sender, city, power_status):
+        """Returns ACCEPTED, DUPLICATE or LIMITED for a report about to be saved."""
+        if not self.enabled or not sender:
+            return ACCEPTED
+        if self.alias:
+            verdict = self._check_shared(sender, city, power_status)
+        else:
+            verdict = self._check_local(sender, city, power_status, time.monotonic())
+        count_guard(verdict)
+        return verdict
+
+    def _check_local(self, sender, city, power_status, now):
+        key = (sender, city)
+        with self._lock:
+            last_status, expires_at = self._recent.get(key, (None, 0))
+            if last_status == power_status and expires_at > now:
+                self._recent[key] = (power_status, now + self.dedup_window)
+                self._recent.move_to_end(key)
+                return DUPLICATE
+
+            tokens, updated_at = self._buckets.get(sender) or (self.burst, now)
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets[sender] = [tokens, now]
+                return LIMITED
+            self._buckets[sender] = [tokens - 1, now]
+            self._buckets.move_to_end(sender)
+            self._recent[key] = (power_status, now + self.dedup_window)
+            self._recent.move_to_end(key)
+
+            # Forgetting the oldest sender only hands it a full bucket again.
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+        return ACCEPTED
+
+    def _check_shared(self, sender, city, power_status):
+        cache = caches[self.alias]
+        recent_key = self._key("recent", sender, city)
+        previous = None
+        if not cache.add(recent_key, power_status, timeout=self.dedup_window):
+            previous = cache.get(recent_key)
+            if previous == power_status:
+                cache.touch(recent_key, timeout=self.dedup_window)
+                return DUPLICATE
+            cache.set(recent_key, power_status, timeout=self.dedup_window)
+
+        period = self.burst / self.rate
+        window_key = self._key("rate", sender, int(time.time() // period))
+        cache.add(window_key, 0, timeout=int(period) + 1)
+        try:
+            count = cache.incr(window_key)
+        except ValueError:  # expired between add() and incr()
+            count = 1
+            cache.set(window_key, count, timeout=int(period) + 1)
+        if count > self.burst:
+            # A refused report isn't the sender's last status, so it can't make the same report a duplicate later.
+            if previous is None:
+                cache.delete(recent_key)
+            else:
+                cache.set(recent_key, previous, timeout=self.dedup_window)
+            return LIMITED
+        return ACCEPTED
+
+    def _key(self, kind, *parts):
+        # Sender ids and city names can hold characters memcached keys can't.
+        digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+        return f"lightpadi:guard:{kind}:{digest}"
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._recent.clear()
+
+
+report_guard = ReportGuard.from_settings()
@@ -0,0 +1,333 @@
+"""
+Per-city outage heatmaps: how likely power is to be OFF at each local hour of
+the week, plus the share of each recent day it was ON. "When does Enugu usually
+lose light?" and the /history endpoint are answered from them, and forecasts
+use the current hour's probability as their time-of-day prior.
+
+They are built from the debounced OutageIntervals rather than raw reports,
+so a burst of reports during one outage doesn't count more than a quiet outage
+of the same length. Every interval is split at hour boundaries and its seconds
+are added to its (weekday, hour) slot and its day. A slot's outage probability
+is its OFF seconds over its observed seconds.
+
+record_heatmaps() keeps them current from save_reports(), in the same
+transaction, from the intervals its reports touched. An open interval is only
+counted up to its last confirming report, so nothing counted ever has to be
+taken back when the interval ends. Reports older than a city's latest rewrite
+its intervals, and the city is then rebuilt instead. rebuild_heatmaps()
+recomputes any set of cities in one vectorized pass over their intervals;
+`manage.py build_heatmaps` runs it for every city.
+"""
+
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.utils import timezone
+
+from .forecast import utc_offset
+from .models import OutageHeatmap, OutageInterval, PowerReport, _bulk_update
+
+HOURS_PER_WEEK = 7 * 24
+DAYS = OutageHeatmap.DAYS
+PRIOR_SECONDS = 3600  # a slot's first observed hour weighs as much as its prior
+MIN_OBSERVED_SECONDS = 2 * 3600  # slots seen for less are left out of "usually"
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+EPOCH = date(1970, 1, 1)
+
+OFF = int(PowerReport.Status.OFF)
+ARRAY_FIELDS = ("week_off", "week_observed", "days_on", "days_observed")
+
+
+def hour_pieces(starts, ends):
+    """
+    Splits [start, end) spans of local epoch seconds at hour boundaries.
+    Returns (span index, local epoch hour, seconds) for every piece.
+    """
+    first = (starts // 3600).astype(np.int64)
+    counts = np.ceil(ends / 3600).astype(np.int64) - first
+    span = np.repeat(np.arange(starts.size), counts)
+    offsets = np.arange(span.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    hour = first[span] + offsets
+    seconds = np.minimum(ends[span], (hour + 1) * 3600.0) - np.maximum(starts[span], hour * 3600.0)
+    return span, hour, seconds
+
+
+def week_slot(hour):
+    """Local epoch hour to its hour of the week, Monday 00:00 first (1970-01-01 was a Thursday)."""
+    return (hour + 3 * 24) % HOURS_PER_WEEK
+
+
+def accumulate(groups, codes, starts, ends, statuses, last_days=None):
+    """
+    Sums [start, end) spans of UTC epoch seconds into `groups` heatmaps at once;
+    codes[i] is the group of span i. Each group's daily window ends on its
+    last_days entry (a local epoch day), or on the last day its spans reach.
+    Returns (week_off, week_observed, days_on, days_observed, last_days).
+    """
+    offset = utc_offset()
+    span, hour, seconds = hour_pieces(starts + offset, ends + offset)
+    group, off, day = codes[span], statuses[span] == OFF, hour // 24
+
+    index = group * HOURS_PER_WEEK + week_slot(hour)
+    size = groups * HOURS_PER_WEEK
+    week_off = np.bincount(index[off], weights=seconds[off], minlength=size).reshape(groups, -1)
+    week_observed = np.bincount(index, weights=seconds, minlength=size).reshape(groups, -1)
+
+    if last_days is None:
+        last_days = np.full(groups, np.iinfo(np.int64).min)
+        np.maximum.at(last_days, group, day)
+    position = day - (last_days[group] - DAYS + 1)
+    kept = position >= 0
+    index, on = group[kept] * DAYS + position[kept], ~off[kept]
+    size = groups * DAYS
+    days_on = np.bincount(index[on], weights=seconds[kept][on], minlength=size).reshape(groups, -1)
+    days_observed = np.bincount(index, weights=seconds[kept], minlength=size).reshape(groups, -1)
+    return week_off, week_observed, days_on, days_observed, last_days
+
+
+class Heatmap:
+    """One city's OutageHeatmap row as NumPy arrays."""
+
+    def __init__(self, location, week_off=None, week_observed=None, days_on=None, days_observed=None,
+                 last_day=None, counted_until=None):
+        self.location = location
+        self.week_off = np.zeros(HOURS_PER_WEEK) if week_off is None else week_off
+        self.week_observed = np.zeros(HOURS_PER_WEEK) if week_observed is None else week_observed
+        self.days_on = np.zeros(DAYS) if days_on is None else days_on
+        self.days_observed = np.zeros(DAYS) if days_observed is None else days_observed
+        self.last_day = last_day  # local epoch day of days_*[-1]
+        self.counted_until = counted_until  # aware datetime
+
+    @classmethod
+    def from_row(cls, row):
+        arrays = {field: np.frombuffer(bytes(getattr(row, field)), dtype=np.float64).copy() for field in ARRAY_FIELDS}
+        last_day = (row.last_day - EPOCH).days if row.last_day else None
+        return cls(row.location, last_day=last_day, counted_until=row.counted_until, **arrays)
+
+    def to_row(self, row=None):
+        row = row or OutageHeatmap(location=self.location)
+        for field in ARRAY_FIELDS:
+            setattr(row, field, getattr(self, field).astype(np.float64).tobytes())
+        row.last_day = EPOCH + timedelta(days=int(self.last_day)) if self.last_day is not None else None
+        row.counted_until = self.counted_until
+        return row
+
+    def add(self, starts, ends, statuses):
+        """Counts [start, end) spans of UTC epoch seconds with their PowerReport statuses."""
+        if not len(starts):
+            return
+        last_day = int(np.ceil((np.max(ends) + utc_offset()) / 86400)) - 1  # the day of the final second
+        if self.last_day is not None and last_day > self.last_day:
+            shift = min(last_day - self.last_day, DAYS)
+            self.days_on = np.r_[self.days_on[shift:], np.zeros(shift)]
+            self.days_observed = np.r_[self.days_observed[shift:], np.zeros(shift)]
+        self.last_day = last_day if self.last_day is None else max(last_day, self.last_day)
+
+        week_off, week_observed, days_on, days_observed, _ = accumulate(
+            1, np.zeros(len(starts), dtype=np.intp), np.asarray(starts), np.asarray(ends), np.asarray(statuses),
+            last_days=np.array([self.last_day]),
+        )
+        self.week_off += week_off[0]
+        self.week_observed += week_observed[0]
+        self.days_on += days_on[0]
+        self.days_observed += days_observed[0]
+
+    def fold(self, intervals):
+        """Counts (status, started_at, ended_at, last_confirmed_at) intervals past counted_until."""
+        starts, ends, statuses = [], [], []
+        for interval_status, started_at, ended_at, last_confirmed_at in intervals:
+            start = max(started_at, self.counted_until) if self.counted_until else started_at
+            end = ended_at or last_confirmed_at  # open intervals: only as far as confirmed
+            if end > start:
+                starts.append(start.timestamp())
+                ends.append(end.timestamp())
+                statuses.append(interval_status)
+                self.counted_until = end
+        if starts:
+            self.add(np.array(starts), np.array(ends), np.array(statuses))
+
+    # ---- reading ----
+
+    def outage_probability(self, prior=0.5):
+        """P(OFF) per (weekday, hour) as a 7×24 array, each slot shrunk towards `prior` while little seen."""
+        probability = (self.week_off + PRIOR_SECONDS * prior) / (self.week_observed + PRIOR_SECONDS)
+        return probability.reshape(7, 24)
+
+    def probability_at(self, moment, prior=0.5):
+        """P(OFF) for the hour of the week containing `moment`."""
+        local = timezone.localtime(moment)
+        slot = local.weekday() * 24 + local.hour
+        return float((self.week_off[slot] + PRIOR_SECONDS * prior) / (self.week_observed[slot] + PRIOR_SECONDS))
+
+    def hourly_probability(self):
+        """P(OFF) per local hour of day, every weekday pooled; NaN for hours never observed."""
+        off = self.week_off.reshape(7, 24).sum(axis=0)
+        observed = self.week_observed.reshape(7, 24).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(observed >= MIN_OBSERVED_SECONDS, off / observed, np.nan)
+
+    def weekday_probability(self):
+        off = self.week_off.reshape(7, 24).sum(axis=1)
+        observed = self.week_observed.reshape(7, 24).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(observed >= MIN_OBSERVED_SECONDS, off / observed, np.nan)
+
+    def worst_hours(self, count=3):
+        """The `count` local hours of day most often without power: [(hour, probability)], worst first."""
+        hourly = self.hourly_probability()
+        seen = np.flatnonzero(~np.isnan(hourly))
+        worst = seen[np.argsort(-hourly[seen], kind="stable")][:count]
+        return [(int(hour), float(hourly[hour])) for hour in worst]
+
+    def worst_weekday(self):
+        """(weekday, probability) of the day most often without power (Monday=0), or None."""
+        weekdays = self.weekday_probability()
+        if np.isnan(weekdays).all():
+            return None
+        day = int(np.nanargmax(weekdays))
+        return day, float(weekdays[day])
+
+    def daily_uptime(self, days=30):
+        """[(date, share of the observed time power was ON or None, observed hours)] for the last `days` days."""
+        if self.last_day is None:
+            return []
+        days = min(days, DAYS)
+        on, observed = self.days_on[-days:], self.days_observed[-days:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            uptime = np.round(on / observed, 3).tolist()
+        first = EPOCH + timedelta(days=int(self.last_day) - days + 1)
+        return [
+            (first + timedelta(days=index), share if seconds else None, hours)
+            for index, (share, seconds, hours) in enumerate(
+                zip(uptime, observed.tolist(), np.round(observed / 3600, 2).tolist())
+            )
+        ]
+
+    def uptime(self, days=30):
+        """Share of the last `days` days' observed time power was ON, or None."""
+        observed = self.days_observed[-min(days, DAYS):].sum()
+        return float(self.days_on[-min(days, DAYS):].sum() / observed) if observed else None
+
+    @property
+    def observed(self):
+        return bool(self.week_observed.any())
+
+
+def get_heatmap(location):
+    """The city's Heatmap, or None before its first interval. One primary-key read."""
+    row = OutageHeatmap.objects.filter(pk=location).first()
+    return Heatmap.from_row(row) if row is not None else None
+
+
+async def aget_heatmap(location):
+    row = await OutageHeatmap.objects.filter(pk=location).afirst()
+    return Heatmap.from_row(row) if row is not None else None
+
+
+def get_heatmaps(locations):
+    return {location: Heatmap.from_row(row) for location, row in OutageHeatmap.objects.in_bulk(locations).items()}
+
+
+def history(heatmap, days=30):
+    """The /history body for a city's Heatmap. Slots and hours never observed are None."""
+    observed = heatmap.week_observed.reshape(7, 24)
+    grid = np.where(observed > 0, np.round(heatmap.outage_probability(), 3), np.nan)
+    hourly = np.round(heatmap.hourly_probability(), 3)
+    return {
+        "location": heatmap.location,
+        "updated_through": heatmap.counted_until,
+        "heatmap": {
+            "weekdays": list(WEEKDAYS),
+            "outage_probability": [[_or_none(p) for p in row] for row in grid.tolist()],
+            "observed_hours": np.round(observed / 3600, 1).tolist(),
+        },
+        "hourly_outage_probability": [_or_none(p) for p in hourly.tolist()],
+        "daily_uptime": [
+            {"date": day.isoformat(), "uptime": uptime, "observed_hours": hours}
+            for day, uptime, hours in heatmap.daily_uptime(days)
+        ],
+    }
+
+
+def _or_none(value):
+    return None if value != value else value  # NaN
+
+
+# ---------------------- ✍️ UPDATES ----------------------
+
+def record_heatmaps(reports, intervals):
+    """
+    Folds the intervals OutageInterval.record_many() returned for saved reports
+    into their cities' heatmaps: one read and one write. Call inside
+    transaction.atomic(), right after it.
+    """
+    by_city = {report.location: [] for report in reports}
+    for interval in sorted(intervals, key=lambda interval: interval.started_at):
+        by_city[interval.location].append(
+            (interval.status, interval.started_at, interval.ended_at, interval.last_confirmed_at)
+        )
+
+    rows = OutageHeatmap.objects.select_for_update().in_bulk(list(by_city))
+    # New cities are built from scratch, as are cities sent a report older than
+    # their latest: OutageInterval.record_many() rewrote their intervals instead.
+    stale = [location for location, city_intervals in by_city.items() if location not in rows or not city_intervals]
+    heatmaps = []
+    for location, row in rows.items():
+        if location not in stale:
+            heatmap = Heatmap.from_row(row)
+            heatmap.fold(by_city[location])
+            heatmaps.append(heatmap.to_row(row))
+
+    _bulk_update(heatmaps, [*ARRAY_FIELDS, "last_day", "counted_until"])
+    if stale:
+        rebuild_heatmaps(stale)
+
+
+def rebuild_heatmaps(locations=None, chunk_size=5000):
+    """
+    Recomputes the heatmaps of `locations` (every city with intervals by default)
+    from their OutageIntervals, all in one vectorized pass. Returns the cities written.
+    """
+    intervals = OutageInterval.objects.all()
+    if locations is not None:
+        intervals = intervals.filter(location__in=list(locations))
+    rows = intervals.order_by("location", "started_at").values_list(
+        "location", "status", "started_at", "ended_at", "last_confirmed_at",
+    )
+    cities, codes, statuses, starts, ends = [], [], [], [], []
+    for location, interval_status, started_at, ended_at, last_confirmed_at in rows.iterator(chunk_size=chunk_size):
+        if not cities or cities[-1] != location:
+            cities.append(location)
+        codes.append(len(cities) - 1)
+        statuses.append(interval_status)
+        starts.append(started_at.timestamp())
+        ends.append((ended_at or last_confirmed_at).timestamp())
+
+    heatmaps = []
+    if cities:
+        codes, statuses = np.array(codes, dtype=np.intp), np.array(statuses)
+        starts, ends = np.array(starts), np.array(ends)
+        counted = ends > starts
+        week_off, week_observed, days_on, days_observed, last_days = accumulate(
+            len(cities), codes[counted], starts[counted], ends[counted], statuses[counted],
+        )
+        counted_until = np.full(len(cities), -np.inf)
+        np.maximum.at(counted_until, codes, ends)
+        for code, location in enumerate(cities):
+            heatmaps.append(Heatmap(
+                location, week_off[code], week_observed[code], days_on[code], days_observed[code],
+                last_day=int(last_days[code]) if week_observed[code].any() else None,
+                counted_until=datetime.fromtimestamp(counted_until[code], tz=dt_timezone.utc),
+            ))
+
+    dropped = OutageHeatmap.objects.exclude(location__in=cities)
+    if locations is not None:
+        dropped = dropped.filter(location__in=list(locations))
+    dropped.delete()  # cities whose intervals are gone
+    OutageHeatmap.objects.bulk_create(
+        [heatmap.to_row() for heatmap in heatmaps],
+        update_conflicts=True,
+        unique_fields=["location"],
+        update_fields=[*ARRAY_FIELDS, "last_day", "counted_until"],
+    )
+    return cities
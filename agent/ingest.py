@@ -0,0 +1,271 @@
+"""
+Report ingestion: validating, batching and persisting PowerReports.
+
+Every write path (single Telex reports, the bulk endpoint and the optional
+write buffer) goes through save_reports(), so the report rows, the per-city
+CityPowerState, the open OutageInterval and the outage heatmap are always
+updated in the same transaction. Once it commits, the updated states go out to
+live status streams and cities whose power switched are handed to the alert
+dispatcher.
+"""
+
+import atexit
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ai_engine import prediction_cache
+from .alerts import alert_dispatcher
+from .db import retry_on_lock
+from .heatmap import record_heatmaps
+from .live import status_hub
+from .metrics import stage
+from .models import CityPowerState, OutageInterval, PowerReport
+from .spatial import neighbor_inference
+from .utils import canonical_city_name, parse_telex_payload
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_REPORTS = 1000
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+STATUS_VALUES = {
+    "on": PowerReport.Status.ON, "1": PowerReport.Status.ON, "true": PowerReport.Status.ON,
+    "off": PowerReport.Status.OFF, "0": PowerReport.Status.OFF, "false": PowerReport.Status.OFF,
+}
+
+
+def save_reports(records):
+    """
+    Persists (city, status, observed_at) records in a single transaction with one
+    bulk INSERT, then folds them into CityPowerState. `status` is a PowerReport.Status
+    and `observed_at` may be None for "now". Returns the saved reports.
+    """
+    if not records:
+        return []
+    # Retried as a whole if another worker holds SQLite's write lock.
+    return retry_on_lock(_save_reports, records, timezone.now())
+
+
+def _save_reports(records, now):
+    reports = [
+        PowerReport(location=city, status=power_status, timestamp=observed_at or now)
+        for city, power_status, observed_at in records
+    ]
+    with stage("db_write"), transaction.atomic():
+        PowerReport.objects.bulk_create(reports)
+        states = CityPowerState.record_many(reports)
+        intervals, switched = OutageInterval.record_many(reports)
+        record_heatmaps(reports, intervals)
+        transaction.on_commit(lambda: _after_commit(reports, states, switched))
+
+    return reports
+
+
+def _after_commit(reports, states, switched):
+    # Neighbouring cities may be predicted from these reports too.
+    neighbor_inference.note(reports)
+    for city in neighbor_inference.affected({report.location for report in reports}):
+        prediction_cache.invalidate(city)
+    status_hub.publish(states, switched=[interval.location for interval in switched])
+    alert_dispatcher.enqueue(switched)
+
+
+def record_report(city, power_status, observed_at=None):
+    """Saves one report immediately."""
+    return save_reports([(city, power_status, observed_at)])[0]
+
+
+def submit_report(city, power_status):
+    """
+    Saves a report from the request path. When the write buffer is enabled the
+    report is queued and persisted with the next batched flush instead.
+    """
+    if report_buffer.enabled:
+        report_buffer.add(city, power_status)
+    else:
+        record_report(city, power_status)
+
+
+def parse_bulk_reports(payload):
+    """
+    Validates a bulk-report body in one pass. Accepts either
+      {"reports": [{"city": "Lagos", "status": "off", "observed_at": "2025-11-03T21:15:00Z"}, ...]}
+    or
+      {"messages": [<Telex message>, ...]}.
+    Returns (records, errors) where errors is a list of {"index", "error"}.
+    """
+    if not isinstance(payload, dict):
+        return [], [{"index": None, "error": "Expected a JSON object with 'reports' or 'messages'."}]
+
+    items = payload.get("reports")
+    is_telex = items is None
+    if is_telex:
+        items = payload.get("messages")
+    if not isinstance(items, list):
+        return [], [{"index": None, "error": "Expected a 'reports' or 'messages' array."}]
+    if len(items) > MAX_BULK_REPORTS:
+        return [], [{"index": None, "error": f"At most {MAX_BULK_REPORTS} reports per request."}]
+
+    latest_allowed = timezone.now() + MAX_CLOCK_SKEW
+    records, errors = [], []
+    for index, item in enumerate(items):
+        if is_telex:
+            parsed = parse_telex_payload({"message": item})
+            city = parsed.city
+            power_status = STATUS_VALUES.get(parsed.status or "")
+            observed_at = None
+        elif isinstance(item, dict):
+            city = canonical_city_name(item.get("city"))
+            power_status = STATUS_VALUES.get(str(item.get("status", "")).strip().lower())
+            observed_at = item.get("observed_at")
+        else:
+            errors.append({"index": index, "error": "Each report must be an object."})
+            continue
+
+        record, error = validate_record(city, power_status, observed_at, latest_allowed)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            records.append(record)
+
+    return records, errors
+
+
+def validate_record(city, power_status, observed_at, latest_allowed):
+    """
+    Checks one report whose city is already canonical (or None) and whose status is
+    a PowerReport.Status (or None). `observed_at` may be a datetime, an ISO 8601
+    string or None. Returns ((city, status, observed_at), None) or (None, error).
+    """
+    if not city:
+        return None, "Unsupported or missing city."
+    if power_status is None:
+        return None, "Status must be 'on' or 'off'."
+
+    if observed_at is not None:
+        if not isinstance(observed_at, datetime):
+            observed_at = parse_datetime(str(observed_at))
+            if observed_at is None:
+                return None, "observed_at must be an ISO 8601 datetime."
+        if timezone.is_naive(observed_at):
+            observed_at = timezone.make_aware(observed_at)
+        if observed_at > latest_allowed:
+            return None, "observed_at is in the future."
+
+    return (city, power_status, observed_at), None
+
+
+class ReportWriteBuffer:
+    """
+    Coalesces single reports into periodic batched writes.
+
+    Reports are queued in memory and flushed by a background thread every
+    FLUSH_INTERVAL seconds, or as soon as MAX_SIZE reports are waiting. During
+    a grid collapse this turns thousands of one-row transactions into a few
+    bulk inserts. Queued reports are flushed at interpreter exit; a hard crash
+    can lose at most one interval's worth.
+
+    A batch that still can't be written once retry_on_lock gives up goes back
+    to the head of the queue for the next flush. Beyond MAX_PENDING queued
+    reports, the oldest are appended to SPILL_PATH in the export's NDJSON format
+    instead, to be replayed with `manage.py import_reports`.
+    """
+
+    def __init__(self, enabled=False, flush_interval=1.0, max_size=500, max_pending=10000, spill_path=None):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_REPORT_BUFFER", {})
+        return cls(
+            enabled=config.get("ENABLED", False),
+            flush_interval=config.get("FLUSH_INTERVAL", 1.0),
+            max_size=config.get("MAX_SIZE", 500),
+            max_pending=config.get("MAX_PENDING", 10000),
+            spill_path=config.get("SPILL_PATH"),
+        )
+
+    def add(self, city, power_status, observed_at=None):
+        with self._lock:
+            self._pending.append((city, power_status, observed_at or timezone.now()))
+            full = len(self._pending) >= self.max_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lightpadi-report-buffer", daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_at_exit)
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Writes every queued report in one transaction. Returns how many were saved.
+        If the write fails the reports are queued again and the error propagates.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            save_reports(pending)
+        except Exception:
+            self._requeue(pending)
+            raise
+        return len(pending)
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._pending[:0] = batch
+            overflow = max(len(self._pending) - self.max_pending, 0)
+            spilled, self._pending = self._pending[:overflow], self._pending[overflow:]
+        if spilled:
+            self.spill(spilled)
+
+    def spill(self, records):
+        """Appends (city, status, observed_at) records to SPILL_PATH as NDJSON."""
+        if not self.spill_path:
+            logger.error("report_buffer.dropped", extra={"reports": len(records)})
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for city, power_status, observed_at in records:
+                row = {"city": city, "status": PowerReport.Status(power_status).label,
+                       "observed_at": observed_at.isoformat()}
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        logger.warning("report_buffer.spilled", extra={"reports": len(records), "path": self.spill_path})
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("report_buffer.flush_failed")
+            with self._lock:
+                pending, self._pending = self._pending, []
+            self.spill(pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("report_buffer.flush_failed")
+            finally:
+                close_old_connections()
+
+
+report_buffer = ReportWriteBuffer.from_settings()
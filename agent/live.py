@@ -0,0 +1,204 @@
+"""
+Live city status over Server-Sent Events: GET /status/stream?city=Lagos&city=Enugu
+(or no ?city= for every city), served by AsyncStatusStreamView under ASGI.
+
+Every write path already folds its reports into CityPowerState inside
+save_reports(); once that transaction commits, the updated states are published
+to the in-process StatusHub. The hub keeps each city's latest event and fans new
+ones out to the open streams on the event loop. It hands each loop a batch with
+one call_soon_threadsafe, and only streams following a city see its events. A
+report costs the same handful of dict operations per stream however many are
+open, and streams never query the database after their first snapshot.
+
+Each stream's queue holds at most one event per city: an update arriving before
+the previous one went out replaces it (counted as "coalesced"). A client that
+reads slowly stalls only its own generator (uvicorn stops pulling from it while
+the socket is backed up), then gets the current state of every city that changed
+meanwhile, never an unbounded backlog. Idle streams get a comment line every
+HEARTBEAT seconds, so proxies keep them open. A client that reconnects gets
+the latest event of every city again, so Last-Event-ID needs no replay.
+
+Like the alert dispatcher, the hub is per process: with several ASGI workers a
+stream only hears about reports saved by its own worker, so serve streams from
+one worker (or route /status/stream to one).
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+
+from .metrics import count_live
+from .models import CityPowerState, PowerReport
+
+
+def state_event(state, switched=False):
+    """A status event for one CityPowerState, with the fields /status returns."""
+    return {
+        "location": state.location,
+        "status": "on" if state.on_count >= state.off_count else "off",
+        "last_status": PowerReport.Status(state.last_status).label if state.last_status is not None else None,
+        "on_count": state.on_count,
+        "off_count": state.off_count,
+        "last_changed_at": state.last_changed_at.isoformat() if state.last_changed_at else None,
+        "last_reported_at": state.last_reported_at.isoformat() if state.last_reported_at else None,
+        "report_count": state.report_count,
+        "switched": switched,  # its debounced OutageInterval just switched
+    }
+
+
+def format_event(event):
+    data = json.dumps({key: value for key, value in event.items() if key != "id"}, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: status\ndata: {data}\n\n"
+
+
+class StatusStream:
+    """One open stream: the events waiting to be sent, at most one per city."""
+
+    def __init__(self, cities):
+        self.cities = cities  # frozenset of canonical names, or None for every city
+        self.pending = {}  # location -> event, oldest first
+        self.sent = {}  # location -> id of the last event sent
+        self.ready = asyncio.Event()
+
+    def offer(self, event):
+        """Queues an event on the stream's loop. Returns True if it replaced an unsent one."""
+        location = event["location"]
+        if event["id"] <= self.sent.get(location, 0):
+            return False
+        replaced = self.pending.pop(location, None) is not None
+        self.pending[location] = event
+        self.ready.set()
+        return replaced
+
+    def take(self):
+        events, self.pending = list(self.pending.values()), {}
+        self.ready.clear()
+        for event in events:
+            self.sent[event["location"]] = event["id"]
+        return events
+
+
+class StatusHub:
+    def __init__(self, enabled=True, heartbeat=15.0, retry=3000, max_clients=10000):
+        self.enabled = enabled
+        self.heartbeat = heartbeat
+        self.retry = retry  # ms clients wait before reconnecting
+        self.max_clients = max_clients
+        self._latest = {}  # location -> latest event
+        self._loaded = False
+        self._followers = {}  # loop -> {location or None: {StatusStream}}
+        self._clients = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_LIVE", {})
+        return cls(
+            enabled=config.get("ENABLED", True),
+            heartbeat=config.get("HEARTBEAT", 15.0),
+            retry=config.get("RETRY", 3000),
+            max_clients=config.get("MAX_CLIENTS", 10000),
+        )
+
+    @property
+    def full(self):
+        return self._clients >= self.max_clients
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def stats(self):
+        return {"clients": self._clients, "cities": len(self._latest)}
+
+    # ---- publishing (any thread) ----
+
+    def publish(self, states, switched=()):
+        """Publishes updated CityPowerStates; `switched` names the cities whose power switched."""
+        if not self.enabled or not states:
+            return
+        switched = set(switched)
+        with self._lock:
+            events = []
+            for state in states:
+                event = state_event(state, state.location in switched)
+                event["id"] = next(self._ids)
+                self._latest[state.location] = event
+                events.append(event)
+            loops = [loop for loop, followers in self._followers.items() if followers]
+        count_live("published", len(events))
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, loop, events)
+            except RuntimeError:
+                pass  # the loop closed; its streams went with it
+
+    def _fan_out(self, loop, events):
+        followers = self._followers.get(loop, {})
+        everyone = followers.get(None, ())
+        coalesced = 0
+        for event in events:
+            for stream in (*everyone, *followers.get(event["location"], ())):
+                coalesced += stream.offer(event)
+        if coalesced:
+            count_live("coalesced", coalesced)
+
+    # ---- streaming (on the event loop) ----
+
+    def load(self):
+        """Seeds the latest events from CityPowerState, once per process. Sync: one query."""
+        if self._loaded:
+            return
+        states = list(CityPowerState.objects.all())
+        with self._lock:
+            for state in states:
+                if state.location not in self._latest:  # a publish beat us to it
+                    event = state_event(state)
+                    event["id"] = next(self._ids)
+                    self._latest[state.location] = event
+            self._loaded = True
+
+    def subscribe(self, cities=None):
+        stream = StatusStream(frozenset(cities) if cities else None)
+        keys = stream.cities or (None,)
+        with self._lock:
+            followers = self._followers.setdefault(asyncio.get_running_loop(), {})
+            for key in keys:
+                followers.setdefault(key, set()).add(stream)
+            self._clients += 1
+            if stream.cities:
+                latest = [self._latest[key] for key in keys if key in self._latest]
+            else:
+                latest = list(self._latest.values())
+        for event in sorted(latest, key=lambda event: event["id"]):
+            stream.offer(event)
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._lock:
+            followers = self._followers.get(asyncio.get_running_loop(), {})
+            for key in stream.cities or (None,):
+                followers.get(key, set()).discard(stream)
+            self._clients -= 1
+
+    async def stream(self, cities=None):
+        """Yields a stream's SSE text: the latest event per city, then updates and heartbeats."""
+        stream = self.subscribe(cities)
+        try:
+            yield f"retry: {self.retry}\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(stream.ready.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield "".join(format_event(event) for event in stream.take())
+        finally:
+            self.unsubscribe(stream)
+
+
+status_hub = StatusHub.from_settings()
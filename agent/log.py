@@ -0,0 +1,99 @@
+"""
+Structured logging for LightPadi.
+
+Log calls only put the record on an in-memory queue; a QueueListener thread
+formats it as one JSON object per line and writes it out, so stdout I/O never
+blocks a request. Messages use lazy %-style arguments, which are merged on the
+writer thread too. Fields passed with ``extra=`` become top-level JSON keys:
+
+    logger.info("report.saved", extra={"city": city, "status": "off"})
+
+Handlers and per-module levels are configured in LOGGING in settings.py.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON event."""
+
+    def format(self, record):
+        event = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class QueuedJsonHandler(QueueHandler):
+    """
+    Hands records to a background QueueListener that writes JSON lines to `stream`.
+    Use it as a handler "class" in LOGGING.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare(), leave msg % args for the writer thread.
+        # Only the traceback has to be rendered now, while it still exists.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # drop rather than block a request when the writer falls behind
+
+
+class Truncated:
+    """Lazy log argument: renders `data` as JSON cut to `limit` characters, only if emitted."""
+
+    def __init__(self, data, limit):
+        self.data = data
+        self.limit = limit
+
+    def __str__(self):
+        text = json.dumps(self.data, ensure_ascii=False, default=str)
+        return text if len(text) <= self.limit else f"{text[:self.limit]}… ({len(text)} chars)"
+
+
+def log_payload(logger, label, data):
+    """
+    Logs a request payload at DEBUG for a sampled fraction of requests,
+    truncated to LIGHTPADI_LOGGING["PAYLOAD_MAX_CHARS"].
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    config = getattr(settings, "LIGHTPADI_LOGGING", {})
+    if random.random() >= config.get("PAYLOAD_SAMPLE_RATE", 0.01):
+        return
+    logger.debug(label, extra={"payload": Truncated(data, config.get("PAYLOAD_MAX_CHARS", 500))})
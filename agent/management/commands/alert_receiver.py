@@ -0,0 +1,50 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a stub webhook that prints the push alerts LightPadi sends it, for trying alerts locally. "
+        "Subscribe with pushNotificationConfig.url set to http://127.0.0.1:<port>/, with "
+        "LIGHTPADI_ALERT_HOSTS=127.0.0.1 and LIGHTPADI_ALERT_ALLOW_PRIVATE=true so LightPadi may post to it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--status", type=int, default=200,
+            help="HTTP status to answer with, e.g. 503 to watch the dispatcher retry or 410 to drop subscriptions.",
+        )
+
+    def handle(self, *args, **options):
+        command, answer = self, options["status"]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    alerts = json.loads(body).get("metadata", {}).get("alerts", [])
+                except (ValueError, AttributeError):
+                    alerts = []
+                token = self.headers.get("X-A2A-Notification-Token") or "-"
+                command.stdout.write(f"📨 {self.path} token={token} alerts={len(alerts)} → {answer}")
+                for alert in alerts:
+                    command.stdout.write(f"   {alert.get('subscriber')}: {alert.get('text')}")
+                self.send_response(answer)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass  # the lines above say more
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(f"🔔 Listening for alerts on http://{options['host']}:{options['port']}/ (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,72 @@
+from importlib import import_module
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from agent.benchmarks import DEFAULT_ROWS, SUITES
+from agent.benchmarks.baseline import compare, load_baseline, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs LightPadi micro-benchmarks, e.g. `python manage.py benchmark cities`. "
+        "With --compare, exits non-zero when a row regressed against a saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="*", help=f"Suites to run: {', '.join(SUITES)} (default: all).")
+        parser.add_argument("--number", type=int, default=2000, help="Calls per timing round.")
+        parser.add_argument(
+            "--rows",
+            help=f"Comma-separated table sizes for database suites (default: {DEFAULT_ROWS}; 1e4,1e6,1e7 for api).",
+        )
+        parser.add_argument("--save-baseline", metavar="PATH", help="Write this run's results to a JSON baseline.")
+        parser.add_argument("--compare", metavar="PATH", help="Fail if this run regressed against a JSON baseline.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed throughput loss with --compare, as a fraction (default: 0.25; p99 gets twice this).",
+        )
+
+    def handle(self, *args, **options):
+        suites = options["suites"] or list(SUITES)
+        unknown = [name for name in suites if name not in SUITES]
+        if unknown:
+            raise CommandError(f"Unknown benchmark suite(s): {', '.join(unknown)}")
+        # Read the baseline first, so a bad path fails before a long run.
+        baseline = load_baseline(options["compare"]) if options["compare"] else None
+
+        modules = {name: import_module(SUITES[name]) for name in suites}
+
+        # Database suites always run against a throwaway test database, never db.sqlite3.
+        needs_database = any(getattr(module, "USES_DATABASE", False) for module in modules.values())
+        old_name = connection.creation.create_test_db(verbosity=0, serialize=False) if needs_database else None
+        results = {}
+        try:
+            for name, module in modules.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(f"⏱️  {name}"))
+                results[name] = module.run(options)
+                for row in results[name]:
+                    self.write_row(row)
+        finally:
+            if needs_database:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["save_baseline"]:
+            saved = save_baseline(options["save_baseline"], results)
+            self.stdout.write(self.style.SUCCESS(f"💾 Saved {saved} rows to {options['save_baseline']}"))
+        if baseline is not None:
+            compared, regressions = compare(results, baseline, options["tolerance"])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f"  📉 {regression}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS(f"✅ No regressions in {compared} rows against {options['compare']}"))
+
+    def write_row(self, row):
+        if "ops_per_sec" not in row:
+            self.stdout.write(f"  {row['name']}")
+            return
+        line = f"  {row['name']:<40} {row['ops_per_sec']:>12,.1f} ops/s  {row['usec_per_op']:>10.3f} µs/op"
+        if "p50_usec" in row:
+            line += f"  p50 {row['p50_usec']:>10.1f}  p99 {row['p99_usec']:>10.1f} µs  {row['queries_per_op']:>5} q/op"
+        self.stdout.write(line)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agent.heatmap import get_heatmaps, rebuild_heatmaps
+from agent.utils import canonical_city_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds cities' hourly outage heatmaps and daily uptime from their outage intervals in one "
+        "vectorized pass, e.g. after deploying heatmaps. New reports update them as they arrive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--city", action="append", help="Only this city (repeatable). Default: every city with intervals.",
+        )
+
+    def handle(self, *args, **options):
+        cities = options["city"]
+        if cities:
+            unknown = [city for city in cities if not canonical_city_name(city)]
+            if unknown:
+                raise CommandError(f"Unsupported city: {', '.join(unknown)}")
+            cities = [canonical_city_name(city) for city in cities]
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            built = rebuild_heatmaps(cities)
+        elapsed = time.perf_counter() - start
+
+        for city, heatmap in sorted(get_heatmaps(built).items()):
+            uptime = heatmap.uptime(30)
+            worst = ", ".join(f"{hour:02d}:00 {p:.0%}" for hour, p in heatmap.worst_hours())
+            uptime = f"{uptime:.0%}" if uptime is not None else "-"
+            self.stdout.write(f"  {city:<16} 30-day uptime {uptime:>4}  worst hours: {worst or '-'}")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt {len(built)} outage heatmaps in {elapsed:.2f}s"))
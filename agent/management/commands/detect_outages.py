@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agent.heatmap import rebuild_heatmaps
+from agent.models import OutageInterval, PowerReport
+from agent.utils import canonical_city_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-derives cities' ON/OFF outage intervals from their stored reports, e.g. after "
+        "deploying interval detection or changing its rules. New reports update them as they arrive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--city", action="append", help="Only this city (repeatable). Default: every city with reports.",
+        )
+
+    def handle(self, *args, **options):
+        cities = options["city"]
+        if cities:
+            unknown = [city for city in cities if not canonical_city_name(city)]
+            if unknown:
+                raise CommandError(f"Unsupported city: {', '.join(unknown)}")
+            cities = [canonical_city_name(city) for city in cities]
+        else:
+            cities = PowerReport.objects.values_list("location", flat=True).distinct().order_by("location")
+
+        start = time.perf_counter()
+        for city in cities:
+            with transaction.atomic():
+                OutageInterval.rebuild(city)
+            intervals = OutageInterval.objects.filter(location=city)
+            outages = intervals.filter(status=PowerReport.Status.OFF).count()
+            self.stdout.write(f"  {city:<16} {intervals.count():>8,} intervals  {outages:>8,} outages")
+
+        with transaction.atomic():
+            rebuild_heatmaps(cities)  # heatmaps are folded from the intervals
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt outage intervals in {time.perf_counter() - start:.2f}s"))
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.transfer import CONTENT_TYPES, TransferError, export_reports, guess_format, parse_bound, report_rows
+from agent.utils import canonical_city_name
+
+
+class Command(BaseCommand):
+    help = "Streams the report history to a CSV, NDJSON or Parquet file (or stdout) with flat memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", help="File to write (default: stdout). Its extension sets the format.")
+        parser.add_argument(
+            "--format", choices=list(CONTENT_TYPES), help="Output format (default: from --output, else csv).",
+        )
+        parser.add_argument("--city", help="Only this city's reports.")
+        parser.add_argument("--since", help="Reports observed at or after this date/datetime.")
+        parser.add_argument("--until", help="Reports observed before this date/datetime.")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["format"] or (guess_format(output) if output else "csv")
+        city = options["city"]
+        if city and canonical_city_name(city) is None:
+            raise CommandError(f"'{city}' isn't a supported city.")
+
+        start = time.perf_counter()
+        try:
+            since = parse_bound(options["since"], "--since")
+            until = parse_bound(options["until"], "--until")
+            chunks = export_reports(fmt, report_rows(canonical_city_name(city) if city else None, since, until))
+        except TransferError as e:
+            raise CommandError(str(e))
+
+        written = 0
+        target = open(output, "wb") if output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if output:
+                target.close()
+            else:
+                target.flush()
+
+        if output:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Exported {written / 1e6:,.1f} MB of {fmt} in {time.perf_counter() - start:.2f}s → {output}"
+            ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.transfer import CHUNK_ROWS, CONTENT_TYPES, TransferError, guess_format, import_reports, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-loads historical power reports from a CSV, NDJSON or Parquet file with columns "
+        "city, status (on/off) and observed_at, skipping reports that are already stored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import. Its extension sets the format.")
+        parser.add_argument("--format", choices=list(CONTENT_TYPES), help="Input format (default: from the extension).")
+        parser.add_argument("--batch-size", type=int, default=CHUNK_ROWS, help="Reports inserted per transaction.")
+        parser.add_argument("--no-dedup", action="store_true", help="Insert every valid row, even if already stored.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        start = time.perf_counter()
+        try:
+            if fmt == "parquet":
+                result = self.load(read_rows(fmt, path), options)
+            else:
+                with open(path, newline="", encoding="utf-8-sig") as source:
+                    result = self.load(read_rows(fmt, source), options)
+        except (OSError, TransferError) as e:
+            raise CommandError(str(e))
+
+        for error in result["errors"]:
+            self.stderr.write(f"  row {error['index']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Imported {result['imported']:,} of {result['read']:,} reports in {time.perf_counter() - start:.2f}s "
+            f"({result['duplicates']:,} duplicates, {result['invalid']:,} invalid)"
+        ))
+
+    def load(self, rows, options):
+        return import_reports(rows, batch_size=options["batch_size"], dedup=not options["no_dedup"])
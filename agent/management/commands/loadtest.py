@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.benchmarks.loadtest import MESSAGES, SERVERS, run_load, running_server
+
+
+class Command(BaseCommand):
+    help = "Load-tests the Telex endpoints under WSGI (gunicorn) and ASGI (uvicorn), e.g. `python manage.py loadtest`."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=[*SERVERS, "both"], default="both", help="Server(s) to start.")
+        parser.add_argument("--url", help="Load an already running server (host:port) instead of starting one.")
+        parser.add_argument("--endpoint", choices=list(MESSAGES), action="append",
+                            help="Endpoint(s) to load (default: predict and report).")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Concurrent client connections.")
+        parser.add_argument("--workers", type=int, default=2, help="Server worker processes.")
+        parser.add_argument("--port", type=int, default=8765, help="Port for started servers.")
+
+    def handle(self, *args, **options):
+        endpoints = options["endpoint"] or ["predict", "report"]
+
+        if options["url"]:
+            host, _, port = options["url"].rpartition(":")
+            if not host or not port.isdigit():
+                raise CommandError("--url must look like 127.0.0.1:8000")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"🚦 {options['url']}"))
+            self.run_endpoints(host, int(port), endpoints, options)
+            return
+
+        kinds = list(SERVERS) if options["server"] == "both" else [options["server"]]
+        for kind in kinds:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"🚦 {kind} ({options['workers']} workers)"))
+            try:
+                with running_server(kind, options["port"], options["workers"]):
+                    self.run_endpoints("127.0.0.1", options["port"], endpoints, options)
+            except (OSError, RuntimeError) as e:
+                raise CommandError(f"Could not run the {kind} server: {e}")
+
+    def run_endpoints(self, host, port, endpoints, options):
+        for endpoint in endpoints:
+            row = run_load(host, port, endpoint, options["requests"], options["concurrency"])
+            self.stdout.write(
+                f"  {row['name']:<40} {row['requests_per_sec']:>10,.1f} req/s  "
+                f"p50 {row['p50_ms']:>8} ms  p99 {row['p99_ms']:>8} ms  errors {row['errors']}"
+            )
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agent.models import CityPowerState
+from agent.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacts power reports older than the retention window into hourly per-city counts "
+        "and, on PostgreSQL, creates upcoming monthly partitions. Run it daily (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        config = getattr(settings, "LIGHTPADI_STORAGE", {})
+        parser.add_argument(
+            "--older-than-days", type=int, default=config.get("RETENTION_DAYS", 180),
+            help="Compact reports older than this (default: LIGHTPADI_STORAGE['RETENTION_DAYS']).",
+        )
+        parser.add_argument(
+            "--batch-hours", type=int, default=24 * 7, help="Hours of reports compacted per transaction.",
+        )
+        parser.add_argument(
+            "--months-ahead", type=int, default=config.get("PARTITION_MONTHS_AHEAD", 3),
+            help="Monthly partitions to keep created in advance (PostgreSQL only).",
+        )
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        start = time.perf_counter()
+
+        for name in storage.ensure_partitions(options["months_ahead"]):
+            self.stdout.write(f"  created partition {name}")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+        compacted = storage.rollup(cutoff, batch_hours=options["batch_hours"])
+
+        # Counts carry over through HourlyCityReport, but a run that began before the
+        # cutoff now starts at its oldest remaining report.
+        if compacted:
+            for location in CityPowerState.objects.values_list("location", flat=True):
+                CityPowerState.rebuild(location)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Compacted {compacted:,} reports older than {cutoff:%Y-%m-%d %H:00} "
+            f"on {storage.vendor} in {time.perf_counter() - start:.2f}s"
+        ))
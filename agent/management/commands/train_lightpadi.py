@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from agent.forecast import fit_all, save_models
+
+
+class Command(BaseCommand):
+    help = "Fits every city's forecasting model from the report history and writes the model artifact."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", default=getattr(settings, "LIGHTPADI_FORECAST", {}).get("ARTIFACT"),
+            help="Artifact path (default: LIGHTPADI_FORECAST['ARTIFACT']).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Reports fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if not output:
+            raise CommandError("No artifact path: pass --output or set LIGHTPADI_FORECAST['ARTIFACT'].")
+
+        start = time.perf_counter()
+        models = {}
+        for city, model in fit_all(chunk_size=options["chunk_size"]):
+            models[city] = model
+            self.stdout.write(
+                f"  {city:<16} {model.report_count:>10,} reports  "
+                f"{model.off_runs:>6,} outages  {model.on_runs:>6,} on-runs"
+            )
+
+        saved = save_models(output, models)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Trained {saved} cities in {time.perf_counter() - start:.2f}s → {output}"
+        ))
@@ -0,0 +1,299 @@
+"""
+Request and stage latency metrics, exposed in Prometheus text format on /metrics.
+
+Every process records into its own fixed-layout float64 array, memory-mapped
+from a file in LIGHTPADI_METRICS["DIR"]. Recording is a couple of in-place adds
+on that array: no locks, no I/O on the request path. /metrics sums the files of
+every gunicorn worker, so any worker can answer for all of them. As in
+Prometheus' multiprocess mode, the files outlive their workers: collecting
+deletes those whose process is gone (a counter reset to Prometheus), and a new
+process whose PID was reused starts its file over.
+"""
+
+import os
+import time
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import numpy as np
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+ENDPOINTS = (
+    "ping", "router", "report", "report-bulk", "report-export", "predict", "predict-bulk", "status", "outages",
+    "status-stream", "alerts", "history", "metrics", "other",
+)
+STAGES = ("extract", "city_match", "db_read", "db_write", "fit", "render")
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+GUARD_OUTCOMES = ("accepted", "duplicate", "limited")
+ALERT_OUTCOMES = ("sent", "failed", "gone")
+LIVE_OUTCOMES = ("published", "coalesced")
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # seconds
+
+
+def _build_layout():
+    """Assigns every series a fixed offset; histograms get len(BUCKETS) + 1 buckets, a sum and a count."""
+    offsets, size = {}, 0
+    series = (
+        [("request_seconds", endpoint) for endpoint in ENDPOINTS]
+        + [("stage_seconds", stage) for stage in STAGES]
+    )
+    for key in series:
+        offsets[key] = size
+        size += len(BUCKETS) + 3
+    for endpoint in ENDPOINTS:
+        for status_class in STATUS_CLASSES:
+            offsets[("requests", endpoint, status_class)] = size
+            size += 1
+        offsets[("db_queries", endpoint)] = size
+        size += 1
+    for outcome in ("hit", "miss"):
+        offsets[("prediction_cache", outcome)] = size
+        size += 1
+    for outcome in GUARD_OUTCOMES:
+        offsets[("report_guard", outcome)] = size
+        size += 1
+    for outcome in ALERT_OUTCOMES:
+        offsets[("alerts", outcome)] = size
+        size += 1
+    for outcome in LIVE_OUTCOMES:
+        offsets[("live_events", outcome)] = size
+        size += 1
+    return offsets, size
+
+
+OFFSETS, SIZE = _build_layout()
+# Files written with a different layout (an older deploy) are ignored when aggregating.
+LAYOUT_ID = f"{zlib.crc32(repr(sorted(OFFSETS.items())).encode()):08x}"
+
+# The running request's endpoint and query counter, visible to sync_to_async threads too.
+_current_request = ContextVar("lightpadi_metrics_request", default=None)
+
+
+class MetricsStore:
+    """This process's metric values, memory-mapped from `<dir>/<pid>-<layout>.bin` when a dir is set."""
+
+    def __init__(self, directory=None):
+        self.configure(directory)
+
+    def configure(self, directory):
+        """Points the store at another directory; this process starts a new file there on its next write."""
+        self.directory = Path(directory) if directory else None
+        self._pid = None
+        self._values = None
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_METRICS", {})
+        return cls(directory=config.get("DIR"))
+
+    @property
+    def values(self):
+        # Re-open after fork so each gunicorn worker writes its own file.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = self._open()
+        return self._values
+
+    def _open(self):
+        if self.directory is None:
+            return np.zeros(SIZE)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Always truncated: a file already named after this PID is a dead process's.
+        return np.memmap(self.directory / f"{self._pid}-{LAYOUT_ID}.bin", dtype=np.float64, mode="w+", shape=(SIZE,))
+
+    def observe(self, family, label, seconds):
+        base = OFFSETS[(family, label)]
+        values = self.values
+        values[base + bisect_left(BUCKETS, seconds)] += 1
+        values[base + len(BUCKETS) + 1] += seconds
+        values[base + len(BUCKETS) + 2] += 1
+
+    def increment(self, key, amount=1):
+        self.values[OFFSETS[key]] += amount
+
+    def collect(self):
+        """Sums this process's values with every live worker's file, deleting the files of dead ones."""
+        if self.directory is None:
+            return np.array(self.values)
+        total = np.zeros(SIZE)
+        self.values  # make sure this process has a file
+        for path in self.directory.glob("*-*.bin"):
+            pid, _, layout = path.stem.partition("-")
+            if pid.isdigit() and not _is_running(int(pid)):
+                path.unlink(missing_ok=True)
+                continue
+            if layout != LAYOUT_ID:
+                continue
+            try:
+                total += np.fromfile(path, dtype=np.float64, count=SIZE)
+            except (OSError, ValueError):
+                continue  # a worker's file vanished or is still being created
+        return total
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+store = MetricsStore.from_settings()
+
+
+@receiver(setting_changed)
+def _reconfigure(setting, value, **kwargs):
+    # override_settings(LIGHTPADI_METRICS=...) in tests.
+    if setting == "LIGHTPADI_METRICS":
+        store.configure((value or {}).get("DIR"))
+
+
+@contextmanager
+def stage(name):
+    """Times a block of the request path, e.g. `with stage("db_read"): ...`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        store.observe("stage_seconds", name, time.perf_counter() - start)
+
+
+def count_cache(hit):
+    store.increment(("prediction_cache", "hit" if hit else "miss"))
+
+
+def count_guard(outcome):
+    store.increment(("report_guard", outcome))
+
+
+def count_alerts(outcome, amount=1):
+    store.increment(("alerts", outcome), amount)
+
+
+def count_live(outcome, amount=1):
+    store.increment(("live_events", outcome), amount)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Connection execute_wrapper: counts queries against the request that ran them."""
+    request = _current_request.get()
+    if request is not None:
+        request["queries"] += 1
+    return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Records latency, status class and query count for every request, sync or async."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start, counters, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self._finish(request, response, start, counters)
+        return response
+
+    async def __acall__(self, request):
+        start, counters, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self._finish(request, response, start, counters)
+        return response
+
+    def _start(self):
+        counters = {"queries": 0}
+        return time.perf_counter(), counters, _current_request.set(counters)
+
+    def _finish(self, request, response, start, counters):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        endpoint = match.url_name if match and match.url_name in ENDPOINTS else "other"
+        store.observe("request_seconds", endpoint, elapsed)
+        store.increment(("requests", endpoint, f"{response.status_code // 100}xx"))
+        store.increment(("db_queries", endpoint), counters["queries"])
+
+
+def render():
+    """Formats every series in the Prometheus text exposition format."""
+    values = store.collect()
+    lines = []
+
+    def histogram(family, label_name, labels, help_text):
+        name = f"lightpadi_{family}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for label in labels:
+            base = OFFSETS[(family, label)]
+            cumulative = 0
+            for index, bound in enumerate((*BUCKETS, "+Inf")):
+                cumulative += values[base + index]
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {int(cumulative)}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"}} {values[base + len(BUCKETS) + 1]:.6f}')
+            lines.append(f'{name}_count{{{label_name}="{label}"}} {int(values[base + len(BUCKETS) + 2])}')
+
+    histogram("request_seconds", "endpoint", ENDPOINTS, "Request latency by endpoint.")
+    histogram("stage_seconds", "stage", STAGES, "Latency of request stages (parsing, database, rendering).")
+
+    lines.append("# HELP lightpadi_requests_total Requests by endpoint and status class.")
+    lines.append("# TYPE lightpadi_requests_total counter")
+    for endpoint in ENDPOINTS:
+        for status_class in STATUS_CLASSES:
+            count = int(values[OFFSETS[("requests", endpoint, status_class)]])
+            lines.append(f'lightpadi_requests_total{{endpoint="{endpoint}",status="{status_class}"}} {count}')
+
+    lines.append("# HELP lightpadi_db_queries_total Database queries run while serving each endpoint.")
+    lines.append("# TYPE lightpadi_db_queries_total counter")
+    for endpoint in ENDPOINTS:
+        lines.append(f'lightpadi_db_queries_total{{endpoint="{endpoint}"}} {int(values[OFFSETS[("db_queries", endpoint)]])}')
+
+    hits = values[OFFSETS[("prediction_cache", "hit")]]
+    misses = values[OFFSETS[("prediction_cache", "miss")]]
+    lines.append("# HELP lightpadi_prediction_cache_lookups_total Prediction cache lookups by outcome.")
+    lines.append("# TYPE lightpadi_prediction_cache_lookups_total counter")
+    lines.append(f'lightpadi_prediction_cache_lookups_total{{outcome="hit"}} {int(hits)}')
+    lines.append(f'lightpadi_prediction_cache_lookups_total{{outcome="miss"}} {int(misses)}')
+    lines.append("# HELP lightpadi_prediction_cache_hit_ratio Share of prediction lookups served from cache.")
+    lines.append("# TYPE lightpadi_prediction_cache_hit_ratio gauge")
+    lines.append(f"lightpadi_prediction_cache_hit_ratio {hits / (hits + misses) if hits + misses else 0.0:.4f}")
+
+    lines.append("# HELP lightpadi_report_guard_total Single reports checked by the ingest guard, by outcome.")
+    lines.append("# TYPE lightpadi_report_guard_total counter")
+    for outcome in GUARD_OUTCOMES:
+        count = int(values[OFFSETS[("report_guard", outcome)]])
+        lines.append(f'lightpadi_report_guard_total{{outcome="{outcome}"}} {count}')
+
+    lines.append("# HELP lightpadi_alerts_total Push alerts for power switches, by delivery outcome.")
+    lines.append("# TYPE lightpadi_alerts_total counter")
+    for outcome in ALERT_OUTCOMES:
+        lines.append(f'lightpadi_alerts_total{{outcome="{outcome}"}} {int(values[OFFSETS[("alerts", outcome)]])}')
+
+    lines.append("# HELP lightpadi_live_events_total Status events published to live streams, and those superseded "
+                 "in a stream's queue before it could send them.")
+    lines.append("# TYPE lightpadi_live_events_total counter")
+    for outcome in LIVE_OUTCOMES:
+        count = int(values[OFFSETS[("live_events", outcome)]])
+        lines.append(f'lightpadi_live_events_total{{outcome="{outcome}"}} {count}')
+
+    return "\n".join(lines) + "\n"
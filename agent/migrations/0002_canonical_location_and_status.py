@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+
+def canonicalize_reports(apps, schema_editor):
+    """Stores locations as canonical city names and statuses as 0 (off) / 1 (on)."""
+    PowerReport = apps.get_model("agent", "PowerReport")
+    for report in PowerReport.objects.all().iterator():
+        report.location = " ".join(report.location.split()).title()
+        report.status_code = 1 if report.status.strip().lower() == "on" else 0
+        report.save(update_fields=["location", "status_code"])
+
+
+def restore_text_status(apps, schema_editor):
+    PowerReport = apps.get_model("agent", "PowerReport")
+    PowerReport.objects.filter(status_code=1).update(status="on")
+    PowerReport.objects.filter(status_code=0).update(status="off")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='powerreport',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='powerreport',
+            name='status',
+            field=models.CharField(max_length=10, null=True),
+        ),
+        migrations.RunPython(canonicalize_reports, restore_text_status),
+        migrations.RemoveField(
+            model_name='powerreport',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='powerreport',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='powerreport',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'off'), (1, 'on')]),
+        ),
+        migrations.AddIndex(
+            model_name='powerreport',
+            index=models.Index(fields=['location', '-timestamp'], name='agent_report_loc_recent_idx'),
+        ),
+    ]
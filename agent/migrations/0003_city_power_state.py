@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:23
+
+from django.db import migrations, models
+
+WINDOW = 5
+
+
+def backfill_city_states(apps, schema_editor):
+    """Replays existing reports, oldest first, into one state row per city."""
+    PowerReport = apps.get_model("agent", "PowerReport")
+    CityPowerState = apps.get_model("agent", "CityPowerState")
+
+    states = {}
+    for location, status, timestamp in (
+        PowerReport.objects.order_by("timestamp").values_list("location", "status", "timestamp").iterator()
+    ):
+        state = states.setdefault(location, CityPowerState(location=location))
+        state.recent_statuses = (state.recent_statuses + str(status))[-WINDOW:]
+        state.on_count = state.recent_statuses.count("1")
+        state.off_count = len(state.recent_statuses) - state.on_count
+        if state.last_status != status:
+            state.last_changed_at = timestamp
+        state.last_status = status
+        state.first_reported_at = state.first_reported_at or timestamp
+        state.last_reported_at = timestamp
+        state.report_count += 1
+
+    CityPowerState.objects.bulk_create(states.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0002_canonical_location_and_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityPowerState',
+            fields=[
+                ('location', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('recent_statuses', models.CharField(default='', max_length=5)),
+                ('on_count', models.PositiveSmallIntegerField(default=0)),
+                ('off_count', models.PositiveSmallIntegerField(default=0)),
+                ('last_status', models.PositiveSmallIntegerField(choices=[(0, 'off'), (1, 'on')], null=True)),
+                ('last_changed_at', models.DateTimeField(null=True)),
+                ('first_reported_at', models.DateTimeField(null=True)),
+                ('last_reported_at', models.DateTimeField(null=True)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_city_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0003_city_power_state'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='powerreport',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:27
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+
+import agent.models
+
+TABLE = "agent_powerreport"
+MONTHS_AHEAD = 3
+
+
+def _month(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(start):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+TIME_RANGE_INDEX = agent.models.TimeRangeIndex(fields=["timestamp"], name="agent_report_time_range_idx")
+
+
+def partition_reports(apps, schema_editor):
+    """
+    On PostgreSQL, rebuilds agent_powerreport as a table range-partitioned by
+    month on `timestamp`, with the same columns, check and indexes as before. The
+    primary key has to include the partition key, so it becomes (id, timestamp);
+    ids still come from one sequence and stay unique, and Django's model state
+    keeps `id` as the primary key. Changing the type of `id` or `timestamp` later
+    needs a hand-written migration, since the partition key can't leave the key.
+    SQLite keeps the plain table.
+
+    Then adds TIME_RANGE_INDEX on every database, through the schema editor so it
+    matches the AddIndex recorded in the model state (BRIN on PostgreSQL).
+    """
+    PowerReport = apps.get_model("agent", "PowerReport")
+    if schema_editor.connection.vendor == "postgresql":
+        _partition_table(schema_editor)
+    schema_editor.add_index(PowerReport, TIME_RANGE_INDEX)
+
+
+def drop_time_range_index(apps, schema_editor):
+    """Reverse: drops the index. A partitioned table is not converted back."""
+    schema_editor.remove_index(apps.get_model("agent", "PowerReport"), TIME_RANGE_INDEX)
+
+
+def _partition_table(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(timestamp), max(id) FROM {TABLE}")
+        oldest, max_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned")
+        cursor.execute(f"ALTER TABLE {TABLE}_unpartitioned RENAME CONSTRAINT {TABLE}_pkey TO {TABLE}_unpartitioned_pkey")
+        cursor.execute("DROP INDEX IF EXISTS agent_report_loc_recent_idx")
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_partitioned_id_seq")
+        cursor.execute(f"""
+            CREATE TABLE {TABLE} (
+                id bigint NOT NULL DEFAULT nextval('{TABLE}_partitioned_id_seq'),
+                location varchar(100) NOT NULL,
+                status smallint NOT NULL CHECK (status >= 0),
+                timestamp timestamp with time zone NOT NULL,
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        """)
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        now = datetime.now(timezone.utc)
+        start, last = _month(oldest or now), _month(now)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        while start <= last:
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{start:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [start, _next_month(start)],
+            )
+            start = _next_month(start)
+
+        cursor.execute(
+            f"INSERT INTO {TABLE} (id, location, status, timestamp) "
+            f"SELECT id, location, status, timestamp FROM {TABLE}_unpartitioned"
+        )
+        cursor.execute(f"DROP TABLE {TABLE}_unpartitioned")
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_partitioned_id_seq RENAME TO {TABLE}_id_seq")
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        if max_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [max_id])
+
+        cursor.execute(f"CREATE INDEX agent_report_loc_recent_idx ON {TABLE} (location, timestamp DESC)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0004_report_observed_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyCityReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=100)),
+                ('hour', models.DateTimeField()),
+                ('on_count', models.PositiveIntegerField(default=0)),
+                ('off_count', models.PositiveIntegerField(default=0)),
+                ('last_status', models.PositiveSmallIntegerField(choices=[(0, 'off'), (1, 'on')])),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'hour'), name='agent_hourly_city_hour_uniq')],
+            },
+        ),
+        # The table is rebuilt in raw SQL on PostgreSQL; the model state records
+        # the one thing that changes for Django, the new timestamp index.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(partition_reports, drop_time_range_index)],
+            state_operations=[migrations.AddIndex(model_name="powerreport", index=TIME_RANGE_INDEX)],
+        ),
+    ]
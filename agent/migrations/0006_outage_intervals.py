@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0005_hourly_rollup_and_report_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutageInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=100)),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'off'), (1, 'on')])),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(null=True)),
+                ('last_confirmed_at', models.DateTimeField()),
+                ('last_reported_at', models.DateTimeField()),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('contrary_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveSmallIntegerField(default=0)),
+                ('pending_since', models.DateTimeField(null=True)),
+                ('confidence', models.FloatField(default=0.5)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', '-started_at'], name='agent_interval_loc_recent_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('location',), name='agent_interval_one_open')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0007_alert_subscriptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutageHeatmap',
+            fields=[
+                ('location', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('week_off', models.BinaryField()),
+                ('week_observed', models.BinaryField()),
+                ('days_on', models.BinaryField()),
+                ('days_observed', models.BinaryField()),
+                ('last_day', models.DateField(null=True)),
+                ('counted_until', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
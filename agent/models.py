@@ -1,11 +1,405 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
 
 from django.db import models
+from django.db.models import Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from .cities import registry
+
+
+def _bulk_update(objects, fields):
+    """
+    bulk_update() that skips its CASE WHEN per field when only one row changed,
+    as for every single Telex report; building that statement costs milliseconds.
+    """
+    if len(objects) == 1:
+        objects[0].save(update_fields=fields)
+    elif objects:
+        type(objects[0]).objects.bulk_update(objects, fields)
+
+
+class TimeRangeIndex(models.Index):
+    """
+    An index on a timestamp that rows arrive in order of: BRIN on PostgreSQL, a few
+    pages per partition however many reports it holds, and a B-tree elsewhere.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor == "postgresql":
+            using = " USING brin"
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
 
 class PowerReport(models.Model):
+    class Status(models.IntegerChoices):
+        OFF = 0, "off"
+        ON = 1, "on"
+
+    location = models.CharField(max_length=100)  # canonical city name, e.g. "Port Harcourt"
+    status = models.PositiveSmallIntegerField(choices=Status.choices)
+    timestamp = models.DateTimeField(default=timezone.now)  # when the status was observed
+
+    class Meta:
+        indexes = [
+            # Serves "latest reports for a city" as a single index seek.
+            models.Index(fields=["location", "-timestamp"], name="agent_report_loc_recent_idx"),
+            # Time-bounded scans: the hot window and the rollup job.
+            TimeRangeIndex(fields=["timestamp"], name="agent_report_time_range_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.location} - {self.get_status_display()} ({self.timestamp})"
+
+    @property
+    def city(self):
+        """The registry record for `location` (see agent/cities.py)."""
+        return registry.get(self.location)
+
+
+class HourlyCityReport(models.Model):
+    """
+    Raw PowerReports older than the retention window, compacted to per-city hourly
+    counts by `manage.py rollup_reports` (see agent/storage.py).
+    """
+    location = models.CharField(max_length=100)
+    hour = models.DateTimeField()  # start of the hour, UTC
+    on_count = models.PositiveIntegerField(default=0)
+    off_count = models.PositiveIntegerField(default=0)
+    last_status = models.PositiveSmallIntegerField(choices=PowerReport.Status.choices)  # latest report in the hour
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["location", "hour"], name="agent_hourly_city_hour_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.location} @ {self.hour}: {self.on_count} on / {self.off_count} off"
+
+
+class CityPowerState(models.Model):
+    """
+    Rolling per-city summary, updated in the same transaction as every PowerReport
+    so predictions read one row by primary key instead of re-scanning reports.
+    """
+    WINDOW = 5  # number of recent reports kept for the majority vote
+
+    location = models.CharField(max_length=100, primary_key=True)
+    recent_statuses = models.CharField(max_length=WINDOW, default="")  # last WINDOW statuses as "0"/"1", oldest first
+    on_count = models.PositiveSmallIntegerField(default=0)  # ON reports within the window
+    off_count = models.PositiveSmallIntegerField(default=0)  # OFF reports within the window
+    last_status = models.PositiveSmallIntegerField(choices=PowerReport.Status.choices, null=True)
+    last_changed_at = models.DateTimeField(null=True)
+    first_reported_at = models.DateTimeField(null=True)
+    last_reported_at = models.DateTimeField(null=True)
+    report_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.location} - {self.recent_statuses} ({self.report_count} reports)"
+
+    @property
+    def city(self):
+        return registry.get(self.location)
+
+    @property
+    def report_rate(self):
+        """Average reports per hour since the city's first report."""
+        if not self.first_reported_at or self.report_count < 2:
+            return 0.0
+        hours = (self.last_reported_at - self.first_reported_at).total_seconds() / 3600
+        return round(self.report_count / hours, 2) if hours else float(self.report_count)
+
+    def push(self, status, timestamp):
+        """Slides one report into the window and updates the rolling counters."""
+        window = (self.recent_statuses + str(int(status)))[-self.WINDOW:]
+        self.recent_statuses = window
+        self.on_count = window.count("1")
+        self.off_count = len(window) - self.on_count
+
+        if self.last_status is None or self.last_status != status:
+            self.last_changed_at = timestamp
+        self.last_status = status
+
+        self.first_reported_at = self.first_reported_at or timestamp
+        self.last_reported_at = timestamp
+        self.report_count += 1
+
+    @classmethod
+    def record_many(cls, reports):
+        """
+        Folds saved PowerReports into their cities' states with one read and one write.
+        Call inside transaction.atomic(). Cities receiving reports older than their
+        latest one are rebuilt from the table instead, so the window stays ordered.
+        Returns the updated states.
+        """
+        by_city = defaultdict(list)
+        for report in reports:
+            by_city[report.location].append(report)
+
+        states = cls.objects.select_for_update().in_bulk(list(by_city))
+        created, updated, backdated = [], [], []
+        for location, city_reports in by_city.items():
+            city_reports.sort(key=lambda report: report.timestamp)
+            state = states.get(location)
+            if state is None:
+                state = cls(location=location)
+                created.append(state)
+            elif state.last_reported_at and city_reports[0].timestamp < state.last_reported_at:
+                backdated.append(location)
+                continue
+            else:
+                updated.append(state)
+            for report in city_reports:
+                state.push(report.status, report.timestamp)
+
+        cls.objects.bulk_create(created)
+        _bulk_update(updated, [
+            "recent_statuses", "on_count", "off_count", "last_status", "last_changed_at",
+            "first_reported_at", "last_reported_at", "report_count",
+        ])
+        rebuilt = [cls.rebuild(location) for location in backdated]
+        return created + updated + [state for state in rebuilt if state is not None]
+
+    @classmethod
+    def rebuild(cls, location):
+        """
+        Recomputes a city's state from its stored reports, e.g. after a bulk load.
+        Once every report has been rolled up, its hourly counts stand in for them,
+        each hour as one report of its last status.
+        """
+        reports = PowerReport.objects.filter(location=location)
+        summary = reports.aggregate(count=Count("id"), first=Min("timestamp"))
+        # Reports compacted by the rollup job still count towards the city's history.
+        hours = HourlyCityReport.objects.filter(location=location)
+        rolled_up = hours.aggregate(count=Sum(F("on_count") + F("off_count")), first=Min("hour"))
+        if not summary["count"] and not rolled_up["count"]:
+            cls.objects.filter(location=location).delete()
+            return None
+
+        rows, status_field, time_field = (
+            (reports, "status", "timestamp") if summary["count"] else (hours, "last_status", "hour")
+        )
+        state = cls(location=location)
+        # Reports saved in one batch share a timestamp; the last inserted is the latest.
+        recent = rows.order_by(f"-{time_field}", "-id").values_list(status_field, time_field)[:cls.WINDOW]
+        for report_status, timestamp in reversed(recent):
+            state.push(report_status, timestamp)
+
+        # The current run started with the first report after the last opposite one.
+        last_opposite = rows.exclude(**{status_field: state.last_status}).aggregate(at=Max(time_field))["at"]
+        current_run = rows.filter(**{f"{time_field}__gt": last_opposite}) if last_opposite else rows
+        # Nothing after it when the switch happened within one batch: the run began at that instant.
+        state.last_changed_at = current_run.aggregate(at=Min(time_field))["at"] or last_opposite
+        state.first_reported_at = min(filter(None, [summary["first"], rolled_up["first"]]))
+        state.report_count = summary["count"] + (rolled_up["count"] or 0)
+        state.save()
+        return state
+
+
+class OutageInterval(models.Model):
+    """
+    A stretch of time a city's power was ON or OFF, folded incrementally from its
+    reports (OFF intervals are the outages). Every city has at most one open
+    interval (ended_at is NULL); each new report updates it in O(1).
+
+    The switch is debounced: a report contradicting the open interval only ends it
+    once SWITCH_REPORTS contrary reports arrive in a row, or when nobody has
+    confirmed the interval for DEBOUNCE. Contrary reports that are outvoted count
+    as noise and lower the interval's confidence.
+    """
+    SWITCH_REPORTS = 2
+    DEBOUNCE = timedelta(minutes=15)
+
     location = models.CharField(max_length=100)
-    status = models.CharField(max_length=10)  # "on" or "off"
-    timestamp = models.DateTimeField(auto_now_add=True)
+    status = models.PositiveSmallIntegerField(choices=PowerReport.Status.choices)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True)  # NULL while the interval is still open
+    last_confirmed_at = models.DateTimeField()  # latest report agreeing with `status`
+    last_reported_at = models.DateTimeField()  # latest report of either status
+    report_count = models.PositiveIntegerField(default=0)  # reports agreeing with `status`
+    contrary_count = models.PositiveIntegerField(default=0)  # outvoted reports of the other status
+    pending_count = models.PositiveSmallIntegerField(default=0)  # current run of contrary reports
+    pending_since = models.DateTimeField(null=True)
+    confidence = models.FloatField(default=0.5)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["location", "-started_at"], name="agent_interval_loc_recent_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location"], condition=models.Q(ended_at__isnull=True), name="agent_interval_one_open",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.location} {self.get_status_display()} {self.started_at} → {self.ended_at or 'now'}"
+
+    @classmethod
+    def open(cls, location, status, timestamp, report_count=1):
+        interval = cls(
+            location=location, status=status, started_at=timestamp,
+            last_confirmed_at=timestamp, last_reported_at=timestamp, report_count=report_count,
+        )
+        interval.update_confidence()
+        return interval
+
+    def update_confidence(self):
+        # Laplace-smoothed share of the interval's reports that agree with it.
+        self.confidence = round((self.report_count + 1) / (self.report_count + self.contrary_count + 2), 3)
+
+    def absorb(self, status, timestamp):
+        """
+        Folds one report (no older than last_reported_at) into this open interval.
+        Returns the interval it switched to, or None if this one stays open.
+        """
+        self.last_reported_at = timestamp
+        if status == self.status:
+            self.report_count += 1
+            self.last_confirmed_at = timestamp
+            self.contrary_count += self.pending_count  # the contrary run was noise
+            self.pending_count, self.pending_since = 0, None
+            self.update_confidence()
+            return None
+
+        self.pending_count += 1
+        self.pending_since = self.pending_since or timestamp
+        if self.pending_count < self.SWITCH_REPORTS and timestamp - self.last_confirmed_at < self.DEBOUNCE:
+            return None
+
+        successor = self.open(self.location, status, self.pending_since, report_count=self.pending_count)
+        successor.last_reported_at = timestamp
+        successor.last_confirmed_at = timestamp
+        self.ended_at = self.pending_since
+        self.pending_count, self.pending_since = 0, None
+        self.update_confidence()
+        return successor
+
+    @classmethod
+    def record_many(cls, reports):
+        """
+        Folds saved PowerReports into their cities' open intervals. Call inside
+        transaction.atomic(), like CityPowerState.record_many. Cities receiving a
+        report older than their latest one are re-derived from that point instead.
+        Returns (touched, switched): every interval the reports updated or opened,
+        bar those of re-derived cities, and the ones among them that replaced an
+        open interval, i.e. the cities whose power switched.
+        """
+        by_city = defaultdict(list)
+        for report in reports:
+            by_city[report.location].append(report)
+
+        open_intervals = {
+            interval.location: interval
+            for interval in cls.objects.select_for_update().filter(location__in=list(by_city), ended_at__isnull=True)
+        }
+        changed, created, switched, backdated = [], [], [], {}
+        for location, city_reports in by_city.items():
+            city_reports.sort(key=lambda report: report.timestamp)
+            interval = open_intervals.get(location)
+            if interval is not None and city_reports[0].timestamp < interval.last_reported_at:
+                backdated[location] = city_reports[0].timestamp
+                continue
+
+            reports_left = iter(city_reports)
+            if interval is None:
+                first = next(reports_left)
+                interval = cls.open(location, first.status, first.timestamp)
+                created.append(interval)
+            else:
+                changed.append(interval)
+            for report in reports_left:
+                successor = interval.absorb(report.status, report.timestamp)
+                if successor is not None:
+                    created.append(successor)
+                    switched.append(successor)
+                    interval = successor
+
+        _bulk_update(changed, [
+            "ended_at", "last_confirmed_at", "last_reported_at", "report_count", "contrary_count",
+            "pending_count", "pending_since", "confidence",
+        ])
+        # Created after the update, which closes the interval they replace.
+        cls.objects.bulk_create(created)
+        for location, since in backdated.items():
+            cls.rebuild(location, since)
+        return changed + created, switched
+
+    @classmethod
+    def rebuild(cls, location, since=None, chunk_size=5000):
+        """
+        Re-derives a city's intervals from its stored reports, from the interval
+        covering `since` onwards (from its earliest stored report by default).
+        Intervals that ended before then are kept, so history older than the
+        reports left after a rollup survives.
+        """
+        reports = PowerReport.objects.filter(location=location)
+        if since is None:
+            since = reports.aggregate(first=Min("timestamp"))["first"]
+            if since is None:
+                return
+        covering = cls.objects.filter(
+            models.Q(ended_at__isnull=True) | models.Q(ended_at__gt=since), location=location, started_at__lte=since,
+        ).order_by("started_at").first()
+        replay_from = min(since, covering.started_at) if covering else since
+        cls.objects.filter(
+            models.Q(ended_at__isnull=True) | models.Q(ended_at__gt=replay_from), location=location,
+        ).delete()
+
+        interval, pending = None, []
+        history = reports.filter(timestamp__gte=replay_from).order_by("timestamp", "id")
+        for report_status, timestamp in history.values_list("status", "timestamp").iterator(chunk_size=chunk_size):
+            if interval is None:
+                interval = cls.open(location, report_status, timestamp)
+                continue
+            successor = interval.absorb(report_status, timestamp)
+            if successor is not None:
+                pending.append(interval)
+                interval = successor
+                if len(pending) >= chunk_size:
+                    cls.objects.bulk_create(pending)
+                    pending = []
+        if interval is not None:
+            pending.append(interval)
+        cls.objects.bulk_create(pending)
+
+
+class OutageHeatmap(models.Model):
+    """
+    A city's OutageIntervals folded into seconds per local (weekday, hour) and per
+    day, so /history and predictions read one row instead of the whole history.
+    The arrays are float64 buffers kept by agent/heatmap.py.
+    """
+    DAYS = 90  # days of daily uptime kept
+
+    location = models.CharField(max_length=100, primary_key=True)
+    week_off = models.BinaryField()  # [168] seconds OFF per hour of the week, Monday 00:00 first
+    week_observed = models.BinaryField()  # [168] seconds covered by intervals of either status
+    days_on = models.BinaryField()  # [DAYS] seconds ON per local day, oldest first, ending on last_day
+    days_observed = models.BinaryField()  # [DAYS]
+    last_day = models.DateField(null=True)
+    counted_until = models.DateTimeField(null=True)  # intervals are folded in up to here
+
+    def __str__(self):
+        return f"{self.location} heatmap (through {self.counted_until})"
+
+
+class AlertSubscription(models.Model):
+    """
+    A Telex user asking to be told when a city's power switches. Alerts are POSTed
+    to the A2A push notification URL (and token) Telex sent with the request.
+    """
+    subscriber = models.CharField(max_length=255)  # ParsedMessage.sender
+    location = models.CharField(max_length=100)
+    url = models.URLField(max_length=500)
+    token = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index the dispatcher reads a city's subscribers through.
+            models.UniqueConstraint(fields=["location", "subscriber"], name="agent_alert_city_subscriber"),
+        ]
 
     def __str__(self):
-        return f"{self.location} - {self.status} ({self.timestamp})"
+        return f"{self.subscriber} → {self.location}"
@@ -0,0 +1,47 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import stage
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module is used instead
+    orjson = None
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """DRF's JSONRenderer, timed as the "render" stage in /metrics."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage("render"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSON via orjson when it's installed, skipping DRF's indent/encoder
+    negotiation. Used by the "api" settings profile.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage("render"):
+            if data is None:
+                return b""
+            if orjson is not None:
+                return orjson.dumps(data, default=str)
+            return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+
+
+class FastJSONParser(JSONParser):
+    """Parses request bodies with orjson when it's installed."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,213 @@
+"""
+Neighbour inference for cities with no recent reports of their own.
+
+Outages follow the distribution network: when Ibadan DisCo sheds load, Ibadan,
+Abeokuta and Oshogbo tend to go dark together. For a city with no reports, or
+only stale ones, the latest reports from its nearest cities are the best
+evidence there is.
+
+At import, the registry's coordinates become a great-circle distance matrix and
+a k-nearest-neighbour table: for every city, the indices of its NEIGHBORS
+nearest cities within MAX_DISTANCE_KM and a fixed spatial weight for each,
+exp(-distance / DISTANCE_SCALE_KM), scaled by OTHER_DISCO_WEIGHT for cities on
+a different DisCo. Every city's latest status and report time are held in two
+arrays indexed like the registry, refreshed from CityPowerState (one query for
+every city) at most every REFRESH_INTERVAL seconds and updated in place as this
+process saves reports. An inference is one row lookup in the table and a
+weighted vote over at most NEIGHBORS entries, with each neighbour's spatial
+weight halved for every HALF_LIFE seconds since its last report.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .cities import registry
+from .metrics import stage
+from .models import CityPowerState, PowerReport
+
+EARTH_RADIUS_KM = 6371.0
+
+ON = int(PowerReport.Status.ON)
+OFF = int(PowerReport.Status.OFF)
+
+
+def distance_matrix(latitudes, longitudes):
+    """Great-circle (haversine) distances in km between every pair of points."""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def neighbor_table(cities, k, max_distance_km, distance_scale_km, other_disco_weight):
+    """
+    Returns (indices, weights, distances), each shaped (len(cities), k). Row i
+    holds city i's nearest other cities, closest first. Slots beyond the cities
+    within max_distance_km point back at i with weight 0, so rows stay rectangular.
+    """
+    distances = distance_matrix([city.latitude for city in cities], [city.longitude for city in cities])
+    discos = np.array([city.disco for city in cities])
+    np.fill_diagonal(distances, np.inf)
+
+    k = min(k, len(cities) - 1)
+    indices = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    nearest = np.take_along_axis(distances, indices, axis=1)
+    weights = np.exp(-nearest / distance_scale_km)
+    weights[discos[indices] != discos[:, None]] *= other_disco_weight
+
+    out_of_range = nearest > max_distance_km
+    weights[out_of_range] = 0.0
+    indices[out_of_range] = np.broadcast_to(np.arange(len(cities))[:, None], indices.shape)[out_of_range]
+    return indices, weights, np.where(out_of_range, np.inf, nearest)
+
+
+@dataclass
+class Inference:
+    status: int  # PowerReport.Status most neighbours point to
+    confidence: float  # probability of `status`, discounted for thin evidence
+    sources: list  # neighbouring cities whose latest report agrees, strongest first
+
+
+def nearby_cities(sources, limit=3):
+    """The strongest `sources` for a reply: "nearby Lagos", "nearby Lagos and Abeokuta", ..."""
+    names = list(sources[:limit])
+    if len(names) > 1:
+        return f"nearby {', '.join(names[:-1])} and {names[-1]}"
+    return f"nearby {names[0]}" if names else "nearby cities"
+
+
+class NeighborInference:
+    def __init__(self, cities=registry, enabled=True, neighbors=6, max_distance_km=300, distance_scale_km=150,
+                 other_disco_weight=0.5, half_life=3 * 3600, max_age=12 * 3600, stale_after=6 * 3600,
+                 min_weight=0.2, max_confidence=0.8, refresh_interval=30):
+        self.cities = cities
+        self.enabled = enabled
+        self.half_life = half_life
+        self.max_age = max_age
+        self.stale_after = stale_after
+        self.min_weight = min_weight
+        self.max_confidence = max_confidence
+        self.refresh_interval = refresh_interval
+        self.indices, self.weights, self.distances = neighbor_table(
+            list(cities), neighbors, max_distance_km, distance_scale_km, other_disco_weight
+        )
+        # City j's dependents: the cities that have j among their weighted neighbours.
+        self.dependents = [[] for _ in range(len(cities))]
+        for i, j in zip(*np.nonzero(self.weights)):
+            self.dependents[self.indices[i, j]].append(cities.names[i])
+
+        # Latest status (ON/OFF) and report time (epoch seconds) per city. A city that never
+        # reported has time -inf, so it gets no weight whatever its status slot holds.
+        # Writers swap in new arrays, so readers never see a half-applied update.
+        self._state = (np.zeros(len(cities)), np.full(len(cities), -np.inf))
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, "LIGHTPADI_SPATIAL", {})
+        return cls(
+            enabled=config.get("ENABLED", True),
+            neighbors=config.get("NEIGHBORS", 6),
+            max_distance_km=config.get("MAX_DISTANCE_KM", 300),
+            distance_scale_km=config.get("DISTANCE_SCALE_KM", 150),
+            other_disco_weight=config.get("OTHER_DISCO_WEIGHT", 0.5),
+            half_life=config.get("HALF_LIFE", 3 * 3600),
+            max_age=config.get("MAX_AGE", 12 * 3600),
+            stale_after=config.get("STALE_AFTER", 6 * 3600),
+            min_weight=config.get("MIN_WEIGHT", 0.2),
+            max_confidence=config.get("MAX_CONFIDENCE", 0.8),
+            refresh_interval=config.get("REFRESH_INTERVAL", 30),
+        )
+
+    def refresh(self):
+        """Reloads every city's latest status and report time with one query."""
+        statuses, reported = np.zeros(len(self.cities)), np.full(len(self.cities), -np.inf)
+        with stage("db_read"):
+            rows = list(CityPowerState.objects.filter(report_count__gt=0).values_list(
+                "location", "last_status", "last_reported_at"
+            ))
+        for location, last_status, last_reported_at in rows:
+            city = self.cities.get(location)
+            if city is not None and last_reported_at is not None:
+                index = self.cities.index(city.name)
+                statuses[index], reported[index] = last_status, last_reported_at.timestamp()
+        with self._lock:
+            self._state = (statuses, reported)
+            self._loaded_at = time.monotonic()
+
+    def needs_refresh(self):
+        return self._loaded_at is None or self._loaded_at + self.refresh_interval <= time.monotonic()
+
+    def note(self, reports):
+        """Folds just-saved PowerReports into the arrays without waiting for the next refresh."""
+        with self._lock:
+            statuses, reported = (array.copy() for array in self._state)
+            for report in reports:
+                city = self.cities.get(report.location)
+                if city is None:
+                    continue
+                index = self.cities.index(city.name)
+                timestamp = report.timestamp.timestamp()
+                if timestamp >= reported[index]:
+                    statuses[index], reported[index] = int(report.status), timestamp
+            self._state = (statuses, reported)
+
+    def invalidate(self):
+        """Forces a refresh on the next inference, e.g. after a bulk import rewrote CityPowerState."""
+        with self._lock:
+            self._loaded_at = None
+
+    def affected(self, locations):
+        """`locations` plus every city whose inference leans on one of them."""
+        cities = set(locations)
+        for location in locations:
+            city = self.cities.get(location)
+            if city is not None:
+                cities.update(self.dependents[self.cities.index(city.name)])
+        return cities
+
+    def is_stale(self, last_reported_at, now=None):
+        """True when a city's own latest report is too old to trust over its neighbours."""
+        if last_reported_at is None:
+            return True
+        return ((now or timezone.now()) - last_reported_at).total_seconds() > self.stale_after
+
+    def infer(self, location, now=None):
+        """
+        Votes on `location`'s current status from its neighbours' latest reports.
+        Returns an Inference, or None when the neighbours have too little recent evidence.
+        """
+        if not self.enabled:
+            return None
+        if self.needs_refresh():
+            self.refresh()
+        row = self.cities.index(location)
+        now = (now or timezone.now()).timestamp()
+
+        statuses, reported = self._state
+        neighbors = self.indices[row]
+        age = now - reported[neighbors]
+        recency = np.where(age <= self.max_age, np.exp2(-np.maximum(age, 0.0) / self.half_life), 0.0)
+        weights = self.weights[row] * recency
+        total = float(weights.sum())
+        if total < self.min_weight:
+            return None
+
+        on = statuses[neighbors]
+        # A coin-flip prior worth one unit of weight keeps thin evidence near 0.5.
+        p_on = (float(weights @ on) + 0.5) / (total + 1.0)
+        status, confidence = (ON, p_on) if p_on >= 0.5 else (OFF, 1 - p_on)
+        agreeing = (weights > 0) & (on == status)
+        sources = [self.cities.names[neighbors[i]] for i in np.argsort(-weights) if agreeing[i]]
+        return Inference(status=status, confidence=round(min(confidence, self.max_confidence), 2), sources=sources)
+
+
+neighbor_inference = NeighborInference.from_settings()
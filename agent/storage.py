@@ -0,0 +1,221 @@
+"""
+Report storage backends.
+
+The same code runs on SQLite (local, PythonAnywhere) and PostgreSQL (production).
+get_storage() picks the backend for the default database:
+
+- ReportStorage (SQLite) keeps agent_powerreport as one table.
+- PostgresStorage keeps it as a table range-partitioned by month on `timestamp`
+  (set up by migration 0005), with a BRIN index on `timestamp`. Queries bounded
+  by time only scan the partitions they need. Reports for a month without a
+  partition go to the default partition, and move out when it is created.
+
+Both support the retention job (`manage.py rollup_reports`). It compacts raw
+reports older than LIGHTPADI_STORAGE["RETENTION_DAYS"] into per-city
+HourlyCityReport rows and removes them from the hot table. On Postgres, months
+that are entirely past the cutoff are aggregated and then dropped as whole
+partitions.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import HourlyCityReport, PowerReport
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = f"{PowerReport._meta.db_table}_p"  # agent_powerreport_p202510
+
+
+def _config():
+    return getattr(settings, "LIGHTPADI_STORAGE", {})
+
+
+def hot_since(now=None):
+    """Start of the hot window that forecasting fits read."""
+    return (now or timezone.now()) - timedelta(days=_config().get("HOT_DAYS", 90))
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+class ReportStorage:
+    """SQLite (and any other backend): one plain table, nothing to partition."""
+
+    vendor = "sqlite"
+
+    def hot_reports(self, location=None, now=None):
+        """Reports inside the hot window, optionally for one city."""
+        reports = PowerReport.objects.filter(timestamp__gte=hot_since(now))
+        return reports.filter(location=location) if location else reports
+
+    def ensure_partitions(self, months_ahead=None):
+        """Creates upcoming partitions where the backend has them. Returns the names created."""
+        return []
+
+    def rollup(self, cutoff, batch_hours=24 * 7):
+        """
+        Compacts raw reports older than `cutoff` (rounded down to the hour) into
+        HourlyCityReport rows, `batch_hours` at a time, and deletes them.
+        Returns the number of raw reports compacted.
+        """
+        cutoff = cutoff.replace(minute=0, second=0, microsecond=0)
+        compacted = 0
+        oldest = PowerReport.objects.filter(timestamp__lt=cutoff).order_by("timestamp").values_list(
+            "timestamp", flat=True
+        ).first()
+        if oldest is None:
+            return 0
+
+        start = oldest.replace(minute=0, second=0, microsecond=0)
+        while start < cutoff:
+            end = min(start + timedelta(hours=batch_hours), cutoff)
+            with transaction.atomic():
+                compacted += self.aggregate_range(start, end)
+                PowerReport.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+            start = end
+        return compacted
+
+    def aggregate_range(self, start, end):
+        """Adds reports in [start, end) to HourlyCityReport. Returns how many were aggregated."""
+        reports = PowerReport.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        buckets = (
+            reports.annotate(hour=TruncHour("timestamp", tzinfo=dt_timezone.utc))
+            .values("location", "hour")
+            .annotate(
+                on=Count("id", filter=Q(status=PowerReport.Status.ON)),
+                off=Count("id", filter=Q(status=PowerReport.Status.OFF)),
+                latest=Max("timestamp"),
+            )
+        )
+        buckets = {(bucket["location"], bucket["hour"]): bucket for bucket in buckets}
+        if not buckets:
+            return 0
+
+        last_statuses = dict(
+            ((location, timestamp), report_status)
+            for location, timestamp, report_status in reports.filter(
+                timestamp__in={bucket["latest"] for bucket in buckets.values()}
+            ).values_list("location", "timestamp", "status")
+        )
+
+        # Late reports can land in hours that were already rolled up; add to those rows.
+        existing = {
+            (row.location, row.hour): row
+            for row in HourlyCityReport.objects.select_for_update().filter(hour__gte=start, hour__lt=end)
+        }
+        created, updated = [], []
+        for key, bucket in buckets.items():
+            last_status = last_statuses.get((bucket["location"], bucket["latest"]), PowerReport.Status.OFF)
+            row = existing.get(key)
+            if row is None:
+                created.append(HourlyCityReport(
+                    location=bucket["location"], hour=bucket["hour"],
+                    on_count=bucket["on"], off_count=bucket["off"], last_status=last_status,
+                ))
+            else:
+                row.on_count += bucket["on"]
+                row.off_count += bucket["off"]
+                row.last_status = last_status
+                updated.append(row)
+
+        HourlyCityReport.objects.bulk_create(created)
+        HourlyCityReport.objects.bulk_update(updated, ["on_count", "off_count", "last_status"])
+        return sum(bucket["on"] + bucket["off"] for bucket in buckets.values())
+
+
+class PostgresStorage(ReportStorage):
+    """PostgreSQL: agent_powerreport is range-partitioned by calendar month (UTC)."""
+
+    vendor = "postgresql"
+
+    def partitions(self):
+        """Monthly partitions as {month_start: name}, from the catalog."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+                JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+                WHERE parent.relname = %s AND child.relname LIKE %s
+                """,
+                [PowerReport._meta.db_table, f"{PARTITION_PREFIX}%"],
+            )
+            names = [row[0] for row in cursor.fetchall()]
+        return {
+            datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").replace(tzinfo=dt_timezone.utc): name
+            for name in names
+        }
+
+    def ensure_partitions(self, months_ahead=None):
+        months_ahead = _config().get("PARTITION_MONTHS_AHEAD", 3) if months_ahead is None else months_ahead
+        existing = self.partitions()
+        start = month_start(timezone.now())
+        created = []
+        for _ in range(months_ahead + 1):
+            if start not in existing:
+                created.append(self.create_partition(start))
+            start = next_month(start)
+        return created
+
+    def create_partition(self, start):
+        """
+        Adds the partition for the month starting at `start`. Reports for that month
+        written while it was missing sit in the default partition, and PostgreSQL
+        won't attach a range the default still holds rows for, so they are moved
+        into the new table first. The default partition is locked throughout, so
+        no report can land there in between.
+        """
+        name = f"{PARTITION_PREFIX}{start:%Y%m}"
+        table = PowerReport._meta.db_table
+        end = next_month(start)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{table}_default" IN EXCLUSIVE MODE')
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{table}_default" WHERE timestamp >= %s AND timestamp < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                [start, end],
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end],
+            )
+        logger.info("storage.partition_created", extra={"partition": name, "moved_reports": moved})
+        return name
+
+    def rollup(self, cutoff, batch_hours=24 * 7):
+        """
+        Months entirely before `cutoff` are aggregated and dropped as whole
+        partitions, with no row-by-row DELETE. The rest of the window (the
+        partial month and the default partition) goes through the generic path.
+        """
+        compacted = 0
+        table = PowerReport._meta.db_table
+        for start, name in sorted(self.partitions().items()):
+            end = next_month(start)
+            if end > cutoff:
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Block late writes to this month until it is gone.
+                cursor.execute(f'LOCK TABLE "{name}" IN EXCLUSIVE MODE')
+                compacted += self.aggregate_range(start, end)
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                cursor.execute(f'DROP TABLE "{name}"')
+            logger.info("storage.partition_dropped", extra={"partition": name})
+        return compacted + super().rollup(cutoff, batch_hours)
+
+
+def get_storage():
+    return PostgresStorage() if connection.vendor == "postgresql" else ReportStorage()
@@ -1,3 +1,872 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import random
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+from .ai_engine import PredictionCache, predict_light_status, predict_many, prediction_cache
+from .alerts import FAILED, AlertDispatcher, check_webhook
+from .async_views import AsyncReportStatusView
+from .db import retry_on_lock
+from .forecast import FRESH_REPORT, QUANTILES, CityModel, ModelCache, fit_all, fit_city, forecast
+from .guard import ACCEPTED, DUPLICATE, LIMITED, ReportGuard, report_guard
+from .heatmap import get_heatmap, get_heatmaps, rebuild_heatmaps
+from .ingest import ReportWriteBuffer, report_buffer, save_reports
+from .live import StatusHub
+from .metrics import LAYOUT_ID, OFFSETS, SIZE, MetricsStore, store
+from .models import CityPowerState, OutageInterval, PowerReport
+from .spatial import nearby_cities, neighbor_inference
+from .storage import PostgresStorage, month_start, next_month
+from .transfer import export_reports, import_reports, read_rows, report_rows
+from .utils import (
+    _FUZZY_CITY_BY_KEY, FUZZY_MIN_LENGTH, FUZZY_STOPWORDS, edit_distance, fuzzy_city, parse_telex_payload,
+)
+from .views import prediction_text
+
+
+def setUpModule():
+    # Keep the suite's requests out of the real /metrics files.
+    metrics_dir = tempfile.TemporaryDirectory()
+    metrics_settings = override_settings(LIGHTPADI_METRICS={"DIR": metrics_dir.name})
+    metrics_settings.enable()
+    unittest.addModuleCleanup(metrics_dir.cleanup)
+    unittest.addModuleCleanup(metrics_settings.disable)
+
+
+def telex_payload(*texts):
+    """A Telex A2A body whose history ends with `texts`, the last one being the new message."""
+    return {"message": {"parts": [
+        {"kind": "text", "text": f"<p>{texts[-1]}</p>"},
+        {"kind": "data", "data": [{"kind": "text", "text": f"<p>{text}</p>"} for text in texts]},
+    ]}}
+
+
+class ParseTelexPayloadTests(SimpleTestCase):
+    # (message, intent, city, status)
+    CASES = [
+        # The router's original phrasings.
+        ("There is light in Lagos", "report", "Lagos", "on"),
+        ("No light in Ibadan since morning", "report", "Ibadan", "off"),
+        ("Light is on in Kano", "report", "Kano", "on"),
+        ("Light is off in Enugu", "report", "Enugu", "off"),
+        ("predict light in Enugu", "predict", "Enugu", None),
+        ("What's the light situation in Lagos", "predict", "Lagos", None),
+        # Status phrases the router learned later.
+        ("NEPA take light for Port Harcourt again", "report", "Port Harcourt", "off"),
+        ("Blackout for Abuja right now", "report", "Abuja", "off"),
+        ("light dey for fct since 6pm", "report", "Abuja", "on"),
+        ("There is no light in Lagos", "report", "Lagos", "off"),
+        # Questions mentioning a status are still questions.
+        ("Is there a power outage in Lagos?", "predict", "Lagos", None),
+        ("Will there be blackout in Abuja tonight?", "predict", "Abuja", None),
+        ("Will there be light in Kano tonight", "predict", "Kano", None),
+        ("Is there light in Benin?", "predict", "Benin City", None),
+        ("Predict if there is light in Enugu", "predict", "Enugu", None),
+        ("", "predict", None, None),
+        # Alert requests need an explicit alert verb.
+        ("Alert me when light comes back in Lagos", "subscribe", "Lagos", None),
+        ("notify me about power in PH", "subscribe", "Port Harcourt", None),
+        ("Stop alerts for Enugu", "unsubscribe", "Enugu", None),
+        ("Tell me when light will come back in Enugu", "predict", "Enugu", None),
+        ("Let me know when there is light in Kano", "predict", "Kano", None),
+        # Outage-pattern questions, unless the message reports a status.
+        ("When does Enugu usually lose light?", "history", "Enugu", None),
+        ("How often is there no light in Kano", "history", "Kano", None),
+        ("When is there usually no light in Ibadan?", "history", "Ibadan", None),
+        ("Normally there is light in Lagos but now no light", "report", "Lagos", "off"),
+        ("Light is usually on in Abuja by now, but NEPA take light", "report", "Abuja", "off"),
+    ]
+
+    def test_routes_intent_city_and_status(self):
+        for text, intent, city, status in self.CASES:
+            with self.subTest(text=text):
+                parsed = parse_telex_payload(telex_payload(text))
+                self.assertEqual((parsed.intent, parsed.city, parsed.status), (intent, city, status))
+
+    def test_only_the_new_message_decides_a_question(self):
+        parsed = parse_telex_payload(telex_payload("Will there be light in Lagos tonight?", "No light in Lagos now"))
+        self.assertEqual((parsed.intent, parsed.status), ("report", "off"))
+
+        parsed = parse_telex_payload(telex_payload("No light in Lagos now", "Is there light in Lagos?"))
+        self.assertEqual((parsed.intent, parsed.status), ("predict", None))
+
+    def test_ignores_malformed_payloads(self):
+        for payload in (None, [], {"message": "no light in Lagos"}, {"message": {"parts": None}}):
+            with self.subTest(payload=payload):
+                self.assertEqual(parse_telex_payload(payload).intent, "predict")
+
+
+class CityPowerStateTests(TestCase):
+    OFF, ON = PowerReport.Status.OFF, PowerReport.Status.ON
+    FIELDS = (
+        "recent_statuses", "on_count", "off_count", "last_status", "last_changed_at",
+        "first_reported_at", "last_reported_at", "report_count",
+    )
+
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=1)
+
+    def at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def state(self, city="Lagos"):
+        return CityPowerState.objects.filter(pk=city).values_list(*self.FIELDS).get()
+
+    def test_push_keeps_the_window_and_dates_the_switch(self):
+        state = CityPowerState(location="Lagos")
+        statuses = [self.ON, self.ON, self.OFF, self.ON, self.OFF, self.OFF, self.OFF]
+        for minutes, status in enumerate(statuses):
+            state.push(status, self.at(minutes))
+        self.assertEqual((state.recent_statuses, state.on_count, state.off_count), ("01000", 1, 4))
+        self.assertEqual((state.last_status, state.last_changed_at), (self.OFF, self.at(4)))
+        self.assertEqual(state.report_count, 7)
+        self.assertEqual((state.first_reported_at, state.last_reported_at), (self.at(0), self.at(6)))
+
+    def test_a_backdated_report_rebuilds_the_city(self):
+        save_reports([("Lagos", self.ON, self.at(minutes)) for minutes in (0, 10, 20)])
+        with mock.patch.object(CityPowerState, "rebuild", wraps=CityPowerState.rebuild) as rebuild:
+            save_reports([("Lagos", self.OFF, self.at(5))])
+        rebuild.assert_called_once_with("Lagos")
+        self.assertEqual(self.state()[:5], ("1011", 3, 1, self.ON, self.at(10)))
+
+    def test_record_many_matches_a_rebuild(self):
+        rng = random.Random(3)
+        minutes = 0
+        for _ in range(200):
+            batch = [("Lagos", rng.choice([self.OFF, self.ON]), self.at(minutes + offset))
+                     for offset in range(rng.randint(1, 4))]
+            save_reports(batch)
+            minutes += rng.randint(4, 30)
+        incremental = self.state()
+        CityPowerState.rebuild("Lagos")
+        self.assertEqual(self.state(), incremental)
+
+    def test_rebuild_dates_a_switch_inside_one_batch(self):
+        at = timezone.now() - timedelta(hours=1)
+        save_reports([("Lagos", self.ON, at), ("Lagos", self.OFF, at)])  # one batch, one timestamp
+        state = CityPowerState.rebuild("Lagos")
+        self.assertEqual((state.recent_statuses, state.last_status, state.last_changed_at), ("10", self.OFF, at))
+
+    def test_rollup_keeps_a_city_whose_reports_are_all_compacted(self):
+        hour = (timezone.now() - timedelta(days=200)).replace(minute=0, second=0, microsecond=0)
+        save_reports([
+            ("Kano", status, hour + timedelta(hours=hours, minutes=10))
+            for status, hours in [(self.ON, 0), (self.OFF, 1), (self.OFF, 1), (self.ON, 2), (self.ON, 3)]
+        ])
+        call_command("rollup_reports", older_than_days=180, stdout=io.StringIO())
+
+        self.assertFalse(PowerReport.objects.filter(location="Kano").exists())
+        state = CityPowerState.objects.get(pk="Kano")
+        self.assertEqual((state.recent_statuses, state.report_count, state.first_reported_at), ("1011", 5, hour))
+        self.assertEqual((state.last_status, state.last_changed_at), (self.ON, hour + timedelta(hours=2)))
+
+
+class PredictionCacheTests(TestCase):
+    PREDICTION = {"location": "Lagos", "prediction": "on", "confidence": 0.8}
+
+    def test_evicts_the_least_recently_used_city(self):
+        cache = PredictionCache(max_entries=2)
+        cache.set("Lagos", self.PREDICTION)
+        cache.set("Kano", self.PREDICTION)
+        cache.get("Lagos")
+        cache.set("Enugu", self.PREDICTION)
+        self.assertEqual([city for city in ("Lagos", "Kano", "Enugu") if cache.get(city)], ["Lagos", "Enugu"])
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = PredictionCache(ttl=60)
+        with mock.patch("agent.ai_engine.time.monotonic", return_value=1000.0):
+            cache.set("Lagos", self.PREDICTION)
+        with mock.patch("agent.ai_engine.time.monotonic", return_value=1059.0):
+            self.assertEqual(cache.get("Lagos"), self.PREDICTION)
+        with mock.patch("agent.ai_engine.time.monotonic", return_value=1060.0):
+            self.assertIsNone(cache.get("Lagos"))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"], cache.stats()["size"]), (1, 1, 0))
+
+    @override_settings(CACHES={"predictions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_an_alias_stores_entries_in_that_cache(self):
+        cache = PredictionCache(ttl=60, alias="predictions")
+        with mock.patch.object(caches["predictions"], "set", wraps=caches["predictions"].set) as cache_set:
+            cache.set("Lagos", self.PREDICTION)
+        cache_set.assert_called_once_with("lightpadi:prediction:Lagos", self.PREDICTION, timeout=60)
+        cache.get("Lagos")["confidence"] = 0.0  # callers get a copy
+        self.assertEqual(cache.get("Lagos"), self.PREDICTION)
+        cache.invalidate("Lagos")
+        self.assertIsNone(caches["predictions"].get("lightpadi:prediction:Lagos"))
+
+    def test_saving_a_report_invalidates_its_city_once_committed(self):
+        prediction_cache.set("Lagos", self.PREDICTION)
+        with mock.patch("agent.ingest.alert_dispatcher"), self.captureOnCommitCallbacks() as callbacks:
+            save_reports([("Lagos", PowerReport.Status.OFF, None)])
+            self.assertEqual(prediction_cache.get("Lagos"), self.PREDICTION)  # not before the commit
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(prediction_cache.get("Lagos"))
+
+
+class PredictManyTests(TestCase):
+    CITIES = ("Lagos", "Kano", "Enugu")
+
+    def setUp(self):
+        now = timezone.now()
+        save_reports([
+            (city, PowerReport.Status((minutes // 60 + offset) % 2), now - timedelta(minutes=300 - minutes))
+            for offset, city in enumerate(("Lagos", "Kano")) for minutes in range(0, 300, 15)
+        ])
+        for city in self.CITIES:
+            prediction_cache.invalidate(city)
+            self.addCleanup(prediction_cache.invalidate, city)
+        patcher = mock.patch("agent.ai_engine.model_cache", ModelCache(refit_interval=900))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        neighbor_inference.refresh()  # loaded up front, so only the predictions' own queries are counted
+
+    def test_predicts_each_city_once_in_the_order_requested(self):
+        with mock.patch("agent.ai_engine.timezone.now", return_value=timezone.now()):
+            predictions = predict_many(["lagos", " Atlantis ", "Lagos", "Kano", "Enugu"])
+            self.assertEqual(list(predictions), ["Lagos", "Atlantis", "Kano", "Enugu"])
+            self.assertEqual(predictions["Atlantis"]["prediction"], "unsupported")
+            for city in ("Lagos", "Kano"):
+                prediction_cache.invalidate(city)
+                self.assertEqual(predictions[city], predict_light_status(city))
+
+    def test_misses_are_read_together_and_cached(self):
+        with self.assertNumQueries(3):  # states, heatmaps, and one fit of both cities
+            predict_many(self.CITIES)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(predict_many(self.CITIES)), list(self.CITIES))
+
+
+class ReportWriteBufferTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.spill_path = tempfile.mkstemp(suffix=".ndjson")
+        os.close(handle)
+        self.addCleanup(os.remove, self.spill_path)
+        self.buffer = ReportWriteBuffer(enabled=True, max_pending=3, spill_path=self.spill_path)
+        self.now = timezone.now()
+
+    def queue(self, *cities):
+        for offset, city in enumerate(cities):
+            self.buffer._pending.append((city, PowerReport.Status.OFF, self.now + timedelta(seconds=offset)))
+
+    def test_failed_batch_goes_back_to_the_head_of_the_queue(self):
+        self.queue("Lagos", "Enugu")
+        with mock.patch("agent.ingest.save_reports", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.queue("Kano")
+        self.assertEqual([city for city, _, _ in self.buffer._pending], ["Lagos", "Enugu", "Kano"])
+
+        with mock.patch("agent.ingest.save_reports") as save_reports:
+            self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual([city for city, _, _ in save_reports.call_args.args[0]], ["Lagos", "Enugu", "Kano"])
+
+    def test_reports_beyond_max_pending_are_spilled_oldest_first(self):
+        self.queue("Lagos", "Enugu", "Kano", "Abuja")
+        with mock.patch("agent.ingest.save_reports", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError), self.assertLogs("agent.ingest", "WARNING"):
+                self.buffer.flush()
+        self.assertEqual([city for city, _, _ in self.buffer._pending], ["Enugu", "Kano", "Abuja"])
+
+        with open(self.spill_path) as f:
+            spilled = [json.loads(line) for line in f]
+        self.assertEqual(spilled, [{"city": "Lagos", "status": "off", "observed_at": self.now.isoformat()}])
+
+
+class ForecastTests(SimpleTestCase):
+    def model(self, runs=0):
+        """A city that is OFF 90% of the time at every hour, with `runs` completed runs of about 3 hours."""
+        durations = np.full(len(QUANTILES), 3 * 3600.0) if runs else np.zeros(len(QUANTILES))
+        return CityModel(
+            off_durations=durations, on_durations=durations, off_runs=runs, on_runs=runs,
+            hourly_off=np.full(24, 0.9), weekday_off=np.full(7, 0.9), report_count=3 + 2 * runs,
+        )
+
+    def test_fresh_report_outweighs_the_time_of_day_prior(self):
+        now = timezone.now()
+        for runs in (0, 2, 20):
+            with self.subTest(runs=runs):
+                result = forecast(self.model(runs=runs), PowerReport.Status.ON, now - timedelta(seconds=5),
+                                  now - timedelta(seconds=5), now=now)
+                self.assertEqual(result.status, PowerReport.Status.ON)
+                self.assertGreater(result.confidence, 0.9)
+
+    def test_prior_takes_over_once_the_report_is_old(self):
+        now = timezone.now()
+        reported = now - timedelta(seconds=FRESH_REPORT * 2)
+        result = forecast(self.model(), PowerReport.Status.ON, reported, reported, now=now)
+        self.assertEqual((result.status, result.confidence), (PowerReport.Status.OFF, 0.9))
+
+
+class ModelCacheTests(TestCase):
+    def setUp(self):
+        self.cache = ModelCache(refit_interval=900)
+        now = timezone.now()
+        save_reports([
+            ("Lagos", PowerReport.Status(minutes // 60 % 2), now - timedelta(minutes=300 - minutes))
+            for minutes in range(0, 300, 15)
+        ])
+
+    def test_a_city_with_nothing_to_fit_is_remembered_until_the_refit(self):
+        with mock.patch("agent.forecast.fit_city", wraps=fit_city) as fit:
+            self.assertIsNone(self.cache.get("Kano"))
+            self.assertIsNone(self.cache.get("Kano"))
+            self.assertEqual(fit.call_count, 1)
+            later = time.monotonic() + 901
+            with mock.patch("agent.forecast.time.monotonic", return_value=later):
+                self.assertIsNone(self.cache.get("Kano"))
+            self.assertEqual(fit.call_count, 2)
+
+    def test_get_many_fits_missing_cities_once(self):
+        with mock.patch("agent.forecast.fit_all", wraps=fit_all) as fit:
+            self.assertEqual(list(self.cache.get_many(["Lagos", "Kano"])), ["Lagos"])
+            self.assertEqual(list(self.cache.get_many(["Lagos", "Kano"])), ["Lagos"])
+            self.assertIsNone(self.cache.get("Kano"))
+        fit.assert_called_once_with(locations=["Lagos", "Kano"])
+
+
+def async_urlconf():
+    """A copy of agent/urls.py loaded with LIGHTPADI_ASYNC_VIEWS on, for ROOT_URLCONF."""
+    spec = importlib.util.spec_from_file_location("agent.async_urls", Path(__file__).with_name("urls.py"))
+    module = importlib.util.module_from_spec(spec)
+    with override_settings(LIGHTPADI_ASYNC_VIEWS=True):
+        spec.loader.exec_module(module)
+    return module
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(
+            ROOT_URLCONF=async_urlconf(),
+            CACHES={"shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ))
+
+    def setUp(self):
+        report_guard.reset()
+        self.addCleanup(report_guard.reset)
+        prediction_cache.invalidate("Lagos")
+
+    def off_the_loop(self, func):
+        """Wraps `func` to fail the test when it's called on the event loop's thread."""
+        def wrapper(*args, **kwargs):
+            with self.assertRaises(RuntimeError, msg=f"{func.__name__} blocked the event loop"):
+                asyncio.get_running_loop()
+            return func(*args, **kwargs)
+        return wrapper
+
+    async def post(self, path, text, sender="user-1"):
+        payload = telex_payload(text)
+        payload["message"]["metadata"] = {"telex_user_id": sender}
+        response = await self.async_client.post(path, payload, content_type="application/json")
+        return response.status_code, response.json()["message"]["parts"][0]["text"]
+
+    async def test_report_saves_once_and_answers_duplicates_alike(self):
+        self.assertIs(resolve("/report").func.view_class, AsyncReportStatusView)
+        shared_guard = mock.patch.object(report_guard, "_check_shared", self.off_the_loop(report_guard._check_shared))
+        with mock.patch.object(report_guard, "alias", "shared"), shared_guard:
+            first = await self.post("/report", "No light in Lagos")
+            second = await self.post("/report", "No light in Lagos")
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], 200)
+        self.assertIn("OFF in Lagos", first[1])
+        self.assertEqual(await PowerReport.objects.filter(location="Lagos").acount(), 1)
+
+    async def test_report_goes_through_the_write_buffer_when_enabled(self):
+        with mock.patch.object(report_buffer, "enabled", True), mock.patch.object(report_buffer, "add") as add:
+            status_code, _ = await self.post("/report", "There is light in Kano")
+        self.assertEqual(status_code, 200)
+        add.assert_called_once_with("Kano", PowerReport.Status.ON)
+        self.assertFalse(await PowerReport.objects.filter(location="Kano").aexists())
+
+    async def test_predict_fills_and_reads_a_shared_prediction_cache(self):
+        await sync_to_async(save_reports)([("Lagos", PowerReport.Status.OFF, None)])
+        cache = caches["shared"]
+        with mock.patch.object(prediction_cache, "alias", "shared"), \
+                mock.patch.object(cache, "get", self.off_the_loop(cache.get)), \
+                mock.patch.object(cache, "set", self.off_the_loop(cache.set)):
+            first = await self.post("/predict", "predict light in Lagos")
+            self.assertIsNotNone(await caches["shared"].aget("lightpadi:prediction:Lagos"))
+            with mock.patch("agent.ai_engine.CityPowerState") as states:
+                second = await self.post("/predict", "predict light in Lagos")
+            states.objects.filter.assert_not_called()  # served from the cache
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], 200)
+
+    def save_and_commit(self, records):
+        """save_reports() on the test's database thread, then its on-commit callbacks, as if it committed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            save_reports(records)
+
+    async def test_status_stream_sends_a_report_once_committed(self):
+        hub = StatusHub(heartbeat=5)
+        with mock.patch("agent.async_views.status_hub", hub), mock.patch("agent.ingest.status_hub", hub), \
+                mock.patch("agent.ingest.alert_dispatcher"):
+            response = await self.async_client.get("/status/stream", {"city": "Lagos"})
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            chunks = response.streaming_content
+            self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+
+            await sync_to_async(self.save_and_commit)([("Kano", PowerReport.Status.ON, None)])
+            await sync_to_async(self.save_and_commit)([("Lagos", PowerReport.Status.OFF, None)])
+            frame = (await asyncio.wait_for(anext(chunks), timeout=5)).decode()
+            await chunks.aclose()
+
+        event_id, event, data = frame.rstrip("\n").split("\n")
+        self.assertEqual((event_id, event), ("id: 2", "event: status"))  # Kano's event isn't followed
+        self.assertEqual(json.loads(data.removeprefix("data: "))["last_status"], "off")
+
+
+class MetricsStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.store = MetricsStore(self.directory)
+
+    def worker_file(self, pid, requests):
+        values = np.zeros(SIZE)
+        values[OFFSETS[("requests", "report", "2xx")]] = requests
+        path = self.directory / f"{pid}-{LAYOUT_ID}.bin"
+        values.tofile(path)
+        return path
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        return process.pid
+
+    def test_collect_sums_live_workers_and_deletes_dead_ones(self):
+        self.store.increment(("requests", "report", "2xx"))
+        self.worker_file(os.getppid(), 2)
+        dead = self.worker_file(self.dead_pid(), 40)
+        old_layout = self.directory / f"{self.dead_pid()}-00000000.bin"
+        old_layout.write_bytes(b"")
+
+        self.assertEqual(self.store.collect()[OFFSETS[("requests", "report", "2xx")]], 3)
+        self.assertFalse(dead.exists())
+        self.assertFalse(old_layout.exists())
+
+    def test_a_reused_pid_starts_its_file_over(self):
+        self.worker_file(os.getpid(), 40)
+        self.store.increment(("requests", "report", "2xx"))
+        self.assertEqual(self.store.collect()[OFFSETS[("requests", "report", "2xx")]], 1)
+
+    def test_override_settings_moves_the_process_store(self):
+        self.assertFalse(store.directory.is_relative_to(settings.BASE_DIR))  # the suite's temporary directory
+        with override_settings(LIGHTPADI_METRICS={"DIR": str(self.directory)}):
+            self.assertEqual(store.directory, self.directory)
+
+
+class MetricsEndpointTests(TestCase):
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return dict(line.rsplit(" ", 1) for line in response.content.decode().splitlines() if not line.startswith("#"))
+
+    def test_requests_are_counted_by_endpoint(self):
+        before = self.scrape()
+        with mock.patch("agent.ingest.alert_dispatcher"):
+            self.client.post("/report", telex_payload("No light in Lagos"), content_type="application/json")
+        after = self.scrape()
+
+        def added(series):
+            return float(after[series]) - float(before[series])
+
+        self.assertEqual(added('lightpadi_requests_total{endpoint="report",status="2xx"}'), 1)
+        self.assertEqual(added('lightpadi_request_seconds_count{endpoint="report"}'), 1)
+        self.assertEqual(added('lightpadi_request_seconds_bucket{endpoint="report",le="+Inf"}'), 1)
+        self.assertGreater(added('lightpadi_db_queries_total{endpoint="report"}'), 0)
+        self.assertEqual(added('lightpadi_requests_total{endpoint="metrics",status="2xx"}'), 1)  # the first scrape
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.client.get("/ping")
+        buckets = [
+            int(value) for series, value in self.scrape().items()
+            if series.startswith('lightpadi_request_seconds_bucket{endpoint="ping",')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertGreaterEqual(buckets[-1], 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "reports are only partitioned on PostgreSQL")
+class PostgresPartitionTests(TestCase):
+    def test_new_partition_takes_its_month_out_of_the_default_partition(self):
+        storage = PostgresStorage()
+        month = month_start(timezone.now())
+        for _ in range(12):  # well past the months created in advance
+            month = next_month(month)
+        PowerReport.objects.create(location="Lagos", status=PowerReport.Status.OFF, timestamp=month + timedelta(days=3))
+
+        name = storage.create_partition(month)
+
+        self.assertEqual(storage.partitions()[month], name)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{name}"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute(f'SELECT count(*) FROM "{PowerReport._meta.db_table}_default"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(PowerReport.objects.filter(timestamp__gte=month).count(), 1)
+
+
+class TransferTests(TestCase):
+    FIELDS = ("recent_statuses", "last_status", "last_changed_at", "first_reported_at", "report_count")
+
+    def setUp(self):
+        start = timezone.now() - timedelta(days=2)
+        save_reports([
+            (city, PowerReport.Status(minutes // 30 % 2), start + timedelta(minutes=minutes))
+            for city in ("Lagos", "Kano") for minutes in range(0, 300, 20)
+        ])
+        self.states = self.city_states()
+
+    def city_states(self):
+        return list(CityPowerState.objects.order_by("location").values_list("location", *self.FIELDS))
+
+    def test_an_export_loads_back_skipping_stored_reports(self):
+        for fmt in ("csv", "ndjson"):
+            with self.subTest(fmt=fmt):
+                exported = b"".join(export_reports(fmt, report_rows())).decode()
+                PowerReport.objects.filter(location="Lagos").delete()
+                CityPowerState.rebuild("Lagos")
+
+                rows = read_rows(fmt, io.StringIO(exported, newline=""))
+                result = import_reports(rows, batch_size=7)
+                self.assertEqual((result["read"], result["imported"], result["duplicates"], result["invalid"]),
+                                 (30, 15, 15, 0))
+                self.assertEqual(self.city_states(), self.states)
+
+    def test_repeated_rows_are_imported_once(self):
+        rows = [{"city": "Enugu", "status": "off", "observed_at": "2025-01-01T10:00:00Z"}] * 3
+        result = import_reports(rows)
+        self.assertEqual((result["imported"], result["duplicates"]), (1, 2))
+        self.assertEqual(CityPowerState.objects.get(pk="Enugu").report_count, 1)
+
+    def test_a_failed_rebuild_leaves_the_city_consistent(self):
+        rows = [{"city": "Lagos", "status": "on", "observed_at": "2025-01-01T10:00:00Z"}]
+        with mock.patch.object(OutageInterval, "rebuild", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                import_reports(rows)
+        self.assertEqual(self.city_states(), self.states)  # the state's rebuild was rolled back too
+
+
+@override_settings(LIGHTPADI_SQLITE={"TUNED": True, "WRITE_RETRIES": 2, "RETRY_BACKOFF": 0.05})
+class RetryOnLockTests(TransactionTestCase):  # not TestCase: its own atomic block would rule out retries
+    def setUp(self):
+        patcher = mock.patch("agent.db.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_a_locked_write_is_retried_with_backoff(self):
+        write = mock.Mock(side_effect=[OperationalError("database is locked")] * 2 + ["saved"])
+        with self.assertLogs("agent.db", "WARNING") as logs:
+            self.assertEqual(retry_on_lock(write, "Lagos"), "saved")
+        self.assertEqual(write.call_args_list, [mock.call("Lagos")] * 3)
+        self.assertEqual(len(logs.records), 2)
+        first, second = (call.args[0] for call in self.sleep.call_args_list)
+        self.assertTrue(0.025 <= first <= 0.075 and 0.05 <= second <= 0.15)
+
+    def test_gives_up_after_the_configured_retries(self):
+        write = mock.Mock(side_effect=OperationalError("database is locked"))
+        with self.assertLogs("agent.db", "WARNING"), self.assertRaises(OperationalError):
+            retry_on_lock(write)
+        self.assertEqual(write.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        write = mock.Mock(side_effect=OperationalError("no such table: agent_powerreport"))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(write)
+        self.assertEqual(write.call_count, 1)
+
+    def test_a_lock_inside_an_outer_transaction_is_raised_at_once(self):
+        write = mock.Mock(side_effect=[OperationalError("database is locked"), "saved"])
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            retry_on_lock(write)
+        self.assertEqual(write.call_count, 1)
+        self.sleep.assert_not_called()
+
+
+class ReportGuardTests(SimpleTestCase):
+    OFF, ON = PowerReport.Status.OFF, PowerReport.Status.ON
+
+    def guard(self, **kwargs):
+        return ReportGuard(**{"rate_per_minute": 4, "burst": 3, "dedup_window": 600, **kwargs})
+
+    def test_repeat_within_the_window_is_a_duplicate(self):
+        guard = self.guard()
+        self.assertEqual(guard._check_local("u1", "Lagos", self.OFF, 0), ACCEPTED)
+        self.assertEqual(guard._check_local("u1", "Lagos", self.OFF, 300), DUPLICATE)
+        self.assertEqual(guard._check_local("u1", "Lagos", self.OFF, 800), DUPLICATE)  # the repeat extended it
+        self.assertEqual(guard._check_local("u1", "Lagos", self.OFF, 1500), ACCEPTED)
+        self.assertEqual(guard._check_local("u2", "Lagos", self.OFF, 1500), ACCEPTED)
+        self.assertEqual(guard._check_local("u1", "Enugu", self.OFF, 1500), ACCEPTED)
+
+    def test_flip_back_within_the_window_is_accepted(self):
+        guard = self.guard()
+        verdicts = [guard._check_local("u1", "Lagos", status, at) for status, at in
+                    [(self.OFF, 0), (self.ON, 180), (self.OFF, 360), (self.OFF, 400)]]
+        self.assertEqual(verdicts, [ACCEPTED, ACCEPTED, ACCEPTED, DUPLICATE])
+
+    def test_senders_beyond_their_burst_are_limited_until_refilled(self):
+        guard = self.guard()
+        cities = ["Lagos", "Enugu", "Kano", "Abuja"]
+        self.assertEqual([guard._check_local("u1", city, self.OFF, 0) for city in cities],
+                         [ACCEPTED, ACCEPTED, ACCEPTED, LIMITED])
+        self.assertEqual(guard._check_local("u1", "Abuja", self.OFF, 15), ACCEPTED)  # one token every 15s
+        self.assertEqual(guard._check_local("u2", "Abuja", self.OFF, 15), ACCEPTED)
+
+    @override_settings(CACHES={"guard": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    @mock.patch("time.time", return_value=1_000_000.0)  # one fixed rate window
+    def test_shared_state_dedups_and_accepts_flip_backs(self, _):
+        guard = self.guard(alias="guard")
+        verdicts = [guard.check("u1", "Lagos", status) for status in (self.OFF, self.OFF, self.ON, self.OFF)]
+        self.assertEqual(verdicts, [ACCEPTED, DUPLICATE, ACCEPTED, ACCEPTED])
+        self.assertEqual(guard.check("u1", "Enugu", self.ON), LIMITED)
+        self.assertEqual(guard.check("u1", "Lagos", self.OFF), DUPLICATE)  # the refused report didn't replace it
+
+
+class OutageIntervalTests(TestCase):
+    OFF, ON = PowerReport.Status.OFF, PowerReport.Status.ON
+    FIELDS = (
+        "status", "started_at", "ended_at", "last_confirmed_at", "last_reported_at",
+        "report_count", "contrary_count", "pending_count", "pending_since", "confidence",
+    )
+
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=30)
+
+    def report(self, status, minutes, city="Lagos"):
+        save_reports([(city, status, self.start + timedelta(minutes=minutes))])
+
+    def intervals(self, city="Lagos"):
+        return list(OutageInterval.objects.filter(location=city).order_by("started_at").values_list(*self.FIELDS))
+
+    def test_one_contrary_report_is_noise(self):
+        for status, minutes in [(self.ON, 0), (self.OFF, 1), (self.ON, 2)]:
+            self.report(status, minutes)
+        [interval] = OutageInterval.objects.filter(location="Lagos")
+        self.assertEqual((interval.status, interval.ended_at), (self.ON, None))
+        self.assertEqual((interval.report_count, interval.contrary_count, interval.confidence), (2, 1, 0.6))
+
+    def test_switch_reports_in_a_row_switch_from_the_first_of_them(self):
+        for status, minutes in [(self.ON, 0), (self.OFF, 5), (self.OFF, 6)]:
+            self.report(status, minutes)
+        on, off = OutageInterval.objects.filter(location="Lagos").order_by("started_at")
+        self.assertEqual(on.ended_at, self.start + timedelta(minutes=5))
+        self.assertEqual((off.status, off.started_at, off.ended_at), (self.OFF, on.ended_at, None))
+        self.assertEqual(off.report_count, OutageInterval.SWITCH_REPORTS)
+
+    def test_one_report_switches_once_the_interval_went_unconfirmed(self):
+        quiet = OutageInterval.DEBOUNCE.total_seconds() / 60
+        self.report(self.ON, 0)
+        self.report(self.OFF, quiet - 1)
+        self.assertEqual(OutageInterval.objects.filter(location="Lagos").count(), 1)
+        self.report(self.OFF, 2 * quiet)
+        self.assertEqual([interval[0] for interval in self.intervals()], [self.ON, self.OFF])
+
+    def test_incremental_intervals_match_a_rebuild(self):
+        rng = random.Random(7)
+        minutes, status = 0, self.ON
+        for _ in range(300):
+            if rng.random() < 0.3:
+                status = 1 - status
+            batch = [("Lagos", status if rng.random() < 0.8 else 1 - status,
+                      self.start + timedelta(minutes=minutes + offset)) for offset in range(rng.randint(1, 3))]
+            save_reports(batch)
+            minutes += rng.randint(1, 40)
+        self.report(self.OFF, minutes / 2)  # backdated: re-derived from there on
+
+        incremental = self.intervals()
+        self.assertGreater(len(incremental), 10)
+        OutageInterval.rebuild("Lagos")
+        self.assertEqual(self.intervals(), incremental)
+
+    def test_one_changed_row_is_saved_without_bulk_update(self):
+        save_reports([("Lagos", PowerReport.Status.ON, timezone.now() - timedelta(minutes=5))])
+        with CaptureQueriesContext(connection) as queries:
+            save_reports([("Lagos", PowerReport.Status.ON, timezone.now())])
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertTrue(updates)
+        self.assertFalse([sql for sql in updates if "CASE" in sql])  # bulk_update()'s CASE WHEN per field
+
+
+class HeatmapTests(TestCase):
+    CITIES = ("Enugu", "Lagos")
+
+    def test_incremental_heatmaps_match_a_rebuild(self):
+        rng = random.Random(11)
+        start = timezone.now() - timedelta(days=120)  # long enough to roll the daily uptime window
+        minutes, status = 0, PowerReport.Status.ON
+        for _ in range(400):
+            if rng.random() < 0.3:
+                status = 1 - status
+            city = rng.choice(self.CITIES)
+            save_reports([(city, status if rng.random() < 0.8 else 1 - status,
+                           start + timedelta(minutes=minutes + offset)) for offset in range(rng.randint(1, 3))])
+            minutes += rng.randint(1, 600)
+        save_reports([("Lagos", PowerReport.Status.OFF, start + timedelta(minutes=minutes / 2))])  # backdated
+
+        incremental = {city: get_heatmap(city) for city in self.CITIES}
+        rebuild_heatmaps()
+        rebuilt = get_heatmaps(self.CITIES)
+        for city in self.CITIES:
+            with self.subTest(city=city):
+                self.assertTrue(incremental[city].observed)
+                for field in ("week_off", "week_observed", "days_on", "days_observed"):
+                    expected, actual = getattr(rebuilt[city], field), getattr(incremental[city], field)
+                    self.assertTrue(np.allclose(actual, expected), field)
+                self.assertEqual(incremental[city].last_day, rebuilt[city].last_day)
+                self.assertEqual(incremental[city].counted_until, rebuilt[city].counted_until)
+
+
+def levenshtein(a, b):
+    """Plain unbounded Levenshtein distance, the reference for the fuzzy index."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class FuzzyCityTests(SimpleTestCase):
+    def brute_force(self, token):
+        """fuzzy_city() by comparing the word against every indexed name."""
+        if len(token) < FUZZY_MIN_LENGTH or token in FUZZY_STOPWORDS:
+            return None
+        max_distance = 1 if len(token) < 8 else 2
+        distances = {key: levenshtein(token, key) for key in _FUZZY_CITY_BY_KEY}
+        closest = min(distances.values())
+        if closest > max_distance:
+            return None
+        cities = {_FUZZY_CITY_BY_KEY[key] for key, distance in distances.items() if distance == closest}
+        return cities.pop() if len(cities) == 1 else None
+
+    def typos(self, count, seed=0):
+        rng = random.Random(seed)
+        keys = sorted(_FUZZY_CITY_BY_KEY)
+        for _ in range(count):
+            word = rng.choice(keys)
+            for _ in range(rng.randint(1, 3)):
+                i = rng.randrange(len(word))
+                edit = rng.choice("isdt")
+                if edit == "i":
+                    word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+                elif edit == "s":
+                    word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+                elif edit == "d" and len(word) > 1:
+                    word = word[:i] + word[i + 1:]
+                elif edit == "t" and i + 1 < len(word):
+                    word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            yield word
+
+    def test_index_agrees_with_brute_force(self):
+        words = list(self.typos(5000)) + ["light", "tonight", "lagoss", "undo", "portharcot", "beenin"]
+        resolved = 0
+        for word in words:
+            with self.subTest(word=word):
+                self.assertEqual(fuzzy_city(word), self.brute_force(word))
+            resolved += fuzzy_city(word) is not None
+        self.assertGreater(resolved, 2000)
+
+    def test_bounded_edit_distance(self):
+        keys = sorted(_FUZZY_CITY_BY_KEY)
+        for word in self.typos(500, seed=1):
+            for key in keys:
+                expected = levenshtein(word, key)
+                for limit in (1, 2):
+                    distance = edit_distance(word, key, limit)
+                    if expected <= limit:
+                        self.assertEqual(distance, expected)
+                    else:
+                        self.assertGreater(distance, limit)
+
+    def test_known_typos(self):
+        cases = {"lagoss": "Lagos", "portharcot": "Port Harcourt", "ibadn": "Ibadan", "undo": None, "tonight": None}
+        for word, city in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(fuzzy_city(word), city)
+
+    def test_a_tie_between_a_name_and_its_alias_is_that_city(self):
+        self.assertEqual(fuzzy_city("oshgbo"), "Oshogbo")  # oshogbo and its alias osogbo, one edit each
+
+
+class NeighbourReplyTests(SimpleTestCase):
+    def test_names_the_nearby_cities(self):
+        self.assertEqual(nearby_cities(["Lagos"]), "nearby Lagos")
+        self.assertEqual(nearby_cities(["Lagos", "Abeokuta"]), "nearby Lagos and Abeokuta")
+        self.assertEqual(nearby_cities(["Lagos", "Abeokuta", "Ibadan", "Osogbo"]), "nearby Lagos, Abeokuta and Ibadan")
+
+    def test_inferred_prediction_reply(self):
+        reply = prediction_text("Ibadan", {"prediction": "on", "confidence": 0.59, "based_on": ["Lagos"]})
+        self.assertEqual(
+            reply, "📡 LightPadi: No recent reports from Ibadan, but reports from nearby Lagos suggest power is "
+                   "likely ON. (Confidence: 0.59)",
+        )
+
+
+def resolving_to(*addresses):
+    """Patches DNS so every host resolves to `addresses`."""
+    infos = [(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 443))
+             for address in addresses]
+    return mock.patch("agent.alerts.socket.getaddrinfo", return_value=infos)
+
+
+@override_settings(LIGHTPADI_ALERTS={"ALLOWED_HOSTS": [".telex.im"], "ALLOW_PRIVATE_NETWORKS": False})
+class WebhookCheckTests(SimpleTestCase):
+    WEBHOOK = "https://ping.telex.im/a2a/webhooks/abc"
+
+    def test_accepts_an_allowed_host_with_public_addresses(self):
+        with resolving_to("93.184.216.34", "2606:2800:220:1:248:1893:25c8:1946"):
+            check_webhook(self.WEBHOOK)
+
+    def test_refuses_hosts_off_the_allowlist(self):
+        urls = (
+            "https://example.com/hook", "http://127.0.0.1:8765/", "https://telex.im.evil.com/", "ftp://ping.telex.im/",
+        )
+        for url in urls:
+            with self.subTest(url=url), resolving_to("93.184.216.34"):
+                with self.assertRaises(ValidationError):
+                    check_webhook(url)
+
+    def test_refuses_allowed_hosts_resolving_to_internal_addresses(self):
+        for address in ("127.0.0.1", "10.0.0.5", "192.168.1.1", "169.254.169.254", "100.64.0.1", "::1",
+                        "fe80::1", "::ffff:127.0.0.1", "0.0.0.0"):
+            with self.subTest(address=address), resolving_to("93.184.216.34", address):
+                with self.assertRaises(ValidationError):
+                    check_webhook(self.WEBHOOK)
+
+    @override_settings(LIGHTPADI_ALERTS={"ALLOWED_HOSTS": ["127.0.0.1"], "ALLOW_PRIVATE_NETWORKS": True})
+    def test_private_networks_can_be_allowed_for_local_receivers(self):
+        check_webhook("http://127.0.0.1:8765/")
+
+    def test_dispatcher_never_posts_to_a_refused_webhook(self):
+        dispatcher = AlertDispatcher()
+        with resolving_to("169.254.169.254"), mock.patch.object(dispatcher, "_session") as session, \
+                self.assertLogs("agent.alerts", "WARNING"):
+            self.assertEqual(dispatcher.send(self.WEBHOOK, "", [{"text": "⚡"}]), FAILED)
+        session.assert_not_called()
@@ -0,0 +1,333 @@
+"""
+Streaming export and bulk import of the PowerReport history.
+
+Exports read reports with .iterator() and encode them a chunk at a time, so
+memory stays flat whatever the table size; the same generators back the
+`export_reports` command and the /report/export endpoint. Every format has the
+columns city, status ("on"/"off") and observed_at, which is also what the
+importer and the bulk endpoint accept, so an export loads back unchanged.
+
+Imports validate rows like the bulk endpoint, drop rows already stored for the
+same city and instant, and insert in chunked bulk_create batches. CityPowerState,
+the OutageIntervals and the outage heatmap are rebuilt once per affected city at
+the end rather than per batch, since historical rows land behind each city's current
+state anyway. Each city's three are rebuilt in one transaction, retried on a lock.
+
+Parquet needs pyarrow, which is optional; CSV and NDJSON use the standard library.
+"""
+
+import csv
+import io
+import json
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ai_engine import prediction_cache
+from .db import retry_on_lock
+from .forecast import model_cache
+from .heatmap import rebuild_heatmaps
+from .ingest import STATUS_VALUES, validate_record
+from .live import status_hub
+from .metrics import stage
+from .models import CityPowerState, OutageInterval, PowerReport
+from .spatial import neighbor_inference
+from .utils import canonical_city_name
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only the Parquet format needs it
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("city", "status", "observed_at")
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+STATUS_NAMES = dict(PowerReport.Status.choices)  # {0: "off", 1: "on"}
+CHUNK_ROWS = 5000
+CHUNK_BYTES = 64 * 1024
+MAX_IMPORT_ERRORS = 100
+DEDUP_LOOKUP_SIZE = 500  # stays under SQLite's bound-parameter limit
+
+
+class TransferError(ValueError):
+    """An export or import that can't run as asked, e.g. Parquet without pyarrow."""
+
+
+def check_format(fmt):
+    if fmt not in CONTENT_TYPES:
+        raise TransferError(f"Unknown format '{fmt}'. Use one of: {', '.join(CONTENT_TYPES)}.")
+    if fmt == "parquet" and pa is None:
+        raise TransferError("Parquet needs pyarrow: pip install pyarrow.")
+    return fmt
+
+
+def guess_format(path):
+    """csv, ndjson or parquet from a file name, defaulting to csv."""
+    name = str(path).lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".parquet"):
+        return "parquet"
+    return "csv"
+
+
+# ---------------------- 📤 EXPORT ----------------------
+
+def parse_bound(value, name="bound"):
+    """
+    An export bound, a date ("2025-01-01", midnight UTC) or ISO 8601 datetime,
+    as an aware datetime. Returns None when empty; raises TransferError if unparseable.
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value) or parse_datetime(f"{value}T00:00:00Z")
+    except ValueError:  # well formed, but not a real date
+        moment = None
+    if moment is None:
+        raise TransferError(f"{name} must be an ISO 8601 date or datetime.")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def report_rows(city=None, since=None, until=None, chunk_size=CHUNK_ROWS):
+    """(city, status, observed_at) tuples in insertion order, fetched chunk_size at a time."""
+    reports = PowerReport.objects.all()
+    if city:
+        reports = reports.filter(location=city)
+    if since:
+        reports = reports.filter(timestamp__gte=since)
+    if until:
+        reports = reports.filter(timestamp__lt=until)
+    # Ordering by the primary key needs no sort, however many rows match.
+    return reports.order_by("id").values_list("location", "status", "timestamp").iterator(chunk_size=chunk_size)
+
+
+def export_reports(fmt, rows):
+    """Encodes rows from report_rows() as a stream of byte chunks of about CHUNK_BYTES."""
+    check_format(fmt)
+    if fmt == "parquet":
+        return _parquet_chunks(rows)
+    lines = _csv_lines(rows) if fmt == "csv" else _ndjson_lines(rows)
+    return _chunked(lines)
+
+
+class _Echo:
+    """File-like object whose write() hands back the line csv.writer just formatted."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for location, report_status, timestamp in rows:
+        yield writer.writerow((location, STATUS_NAMES[report_status], timestamp.isoformat()))
+
+
+def _ndjson_lines(rows):
+    for location, report_status, timestamp in rows:
+        yield json.dumps(
+            {"city": location, "status": STATUS_NAMES[report_status], "observed_at": timestamp.isoformat()},
+            ensure_ascii=False,
+        ) + "\n"
+
+
+def _chunked(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that pyarrow writes into and the generator empties after each row group."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # pyarrow records row group offsets from tell(), so count what was drained too.
+        return self.position
+
+    def take(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet_chunks(rows, row_group_size=CHUNK_ROWS * 10):
+    schema = pa.schema([
+        ("city", pa.string()), ("status", pa.string()), ("observed_at", pa.timestamp("us", tz="UTC")),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    columns = ([], [], [])
+    for location, report_status, timestamp in rows:
+        columns[0].append(location)
+        columns[1].append(STATUS_NAMES[report_status])
+        columns[2].append(timestamp)
+        if len(columns[0]) >= row_group_size:
+            writer.write_table(pa.Table.from_arrays([pa.array(column) for column in columns], schema=schema))
+            columns = ([], [], [])
+            yield sink.take()
+    if columns[0]:
+        writer.write_table(pa.Table.from_arrays([pa.array(column) for column in columns], schema=schema))
+    writer.close()
+    yield sink.take()
+
+
+# ---------------------- 📥 IMPORT ----------------------
+
+def read_rows(fmt, source):
+    """
+    Yields one dict per row. `source` is a path for Parquet, and an iterable of
+    text lines (an open file) for CSV and NDJSON.
+    """
+    check_format(fmt)
+    if fmt == "csv":
+        yield from csv.DictReader(source)
+    elif fmt == "ndjson":
+        for line in source:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None  # counted as an invalid row
+    else:
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=CHUNK_ROWS):
+            yield from batch.to_pylist()
+
+
+def import_reports(rows, batch_size=CHUNK_ROWS, dedup=True):
+    """
+    Loads historical reports from read_rows(). Each row needs a city (or "location"),
+    a status and an observed_at (or "timestamp"). With `dedup`, rows for a city and
+    instant that is already stored, or repeated in the input, are skipped.
+
+    Returns {"read", "imported", "duplicates", "invalid", "errors"}, where errors
+    lists the first MAX_IMPORT_ERRORS problems as {"index", "error"}.
+    """
+    result = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    latest_allowed = timezone.now()
+    cities = {}  # city -> earliest imported observed_at
+    batch = []
+
+    for index, row in enumerate(rows):
+        result["read"] += 1
+        record, error = _import_record(row, latest_allowed)
+        if error:
+            result["invalid"] += 1
+            if len(result["errors"]) < MAX_IMPORT_ERRORS:
+                result["errors"].append({"index": index, "error": error})
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _import_batch(batch, result, dedup, cities)
+            batch = []
+    if batch:
+        _import_batch(batch, result, dedup, cities)
+
+    states = []
+    for city, earliest in cities.items():
+        states.append(retry_on_lock(_rebuild_city, city, earliest))
+        model_cache.invalidate(city)
+    status_hub.publish([state for state in states if state is not None])
+    for city in neighbor_inference.affected(cities):
+        prediction_cache.invalidate(city)
+    neighbor_inference.invalidate()
+    logger.info("reports.imported", extra={k: v for k, v in result.items() if k != "errors"})
+    return result
+
+
+def _import_record(row, latest_allowed):
+    if not isinstance(row, dict):
+        return None, "Each row must be an object."
+    observed_at = row.get("observed_at") or row.get("timestamp")
+    if not observed_at:
+        return None, "observed_at is required for historical reports."
+    return validate_record(
+        canonical_city_name(row.get("city") or row.get("location")),
+        STATUS_VALUES.get(str(row.get("status", "")).strip().lower()),
+        observed_at,
+        latest_allowed,
+    )
+
+
+def _import_batch(records, result, dedup, cities):
+    if dedup:
+        records = _drop_duplicates(records, result)
+    if records:
+        retry_on_lock(_insert_batch, records)
+        result["imported"] += len(records)
+        for city, _, observed_at in records:
+            if city not in cities or observed_at < cities[city]:
+                cities[city] = observed_at
+
+
+def _drop_duplicates(records, result):
+    """
+    Skips records whose (city, observed_at) is already stored, including by an
+    earlier batch, or repeats one earlier in this batch. Stored keys are looked up
+    per city on the (location, timestamp) index, DEDUP_LOOKUP_SIZE instants at a
+    time, so the cost doesn't depend on how the input is ordered.
+    """
+    by_city = {}
+    for city, _, observed_at in records:
+        by_city.setdefault(city, set()).add(observed_at)
+    seen = set()
+    for city, instants in by_city.items():
+        instants = sorted(instants)
+        for start in range(0, len(instants), DEDUP_LOOKUP_SIZE):
+            seen.update(PowerReport.objects.filter(
+                location=city, timestamp__in=instants[start:start + DEDUP_LOOKUP_SIZE],
+            ).values_list("location", "timestamp"))
+
+    unique = []
+    for record in records:
+        key = (record[0], record[2])
+        if key in seen:
+            result["duplicates"] += 1
+            continue
+        seen.add(key)
+        unique.append(record)
+    return unique
+
+
+def _rebuild_city(city, earliest):
+    """Rebuilds a city's state, intervals from `earliest` on, and heatmap together. Returns the state."""
+    with stage("db_write"), transaction.atomic():
+        state = CityPowerState.rebuild(city)
+        OutageInterval.rebuild(city, earliest)
+        rebuild_heatmaps([city])
+    return state
+
+
+def _insert_batch(records):
+    with stage("db_write"), transaction.atomic():
+        PowerReport.objects.bulk_create(
+            [PowerReport(location=city, status=power_status, timestamp=observed_at)
+             for city, power_status, observed_at in records],
+            batch_size=1000,
+        )
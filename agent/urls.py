@@ -1,9 +1,46 @@
+from django.conf import settings
 from django.urls import path
-from .views import PingView, RouterView, ReportStatusView, PredictView
+from django.views.decorators.csrf import csrf_exempt
+
+from .views import (
+    PingView, MetricsView, RouterView, ReportStatusView, PredictView, CityStatusView, BulkReportView, BulkPredictView,
+    ReportExportView, OutageHistoryView, AlertSubscriptionView, HistoryView,
+)
+
+if settings.LIGHTPADI_ASYNC_VIEWS:
+    from .async_views import (
+        AsyncPingView, AsyncRouterView, AsyncReportStatusView, AsyncPredictView, AsyncAlertSubscriptionView,
+        AsyncStatusStreamView,
+    )
+
+    # Like DRF's APIView, the Telex endpoints take POSTs without a CSRF token.
+    ping_view = csrf_exempt(AsyncPingView.as_view())
+    router_view = csrf_exempt(AsyncRouterView.as_view())
+    report_view = csrf_exempt(AsyncReportStatusView.as_view())
+    predict_view = csrf_exempt(AsyncPredictView.as_view())
+    alerts_view = csrf_exempt(AsyncAlertSubscriptionView.as_view())
+else:
+    ping_view = PingView.as_view()
+    router_view = RouterView.as_view()
+    report_view = ReportStatusView.as_view()
+    predict_view = PredictView.as_view()
+    alerts_view = AlertSubscriptionView.as_view()
 
 urlpatterns = [
-    path("ping", PingView.as_view(), name="ping"),
-    path("router", RouterView.as_view(), name="router"),
-    path("report", ReportStatusView.as_view(), name="report"),
-    path("predict", PredictView.as_view(), name="predict"),
+    path("ping", ping_view, name="ping"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
+    path("router", router_view, name="router"),
+    path("report", report_view, name="report"),
+    path("report/bulk", BulkReportView.as_view(), name="report-bulk"),
+    path("report/export", ReportExportView.as_view(), name="report-export"),
+    path("predict", predict_view, name="predict"),
+    path("predict/bulk", BulkPredictView.as_view(), name="predict-bulk"),
+    path("status", CityStatusView.as_view(), name="status"),
+    path("outages", OutageHistoryView.as_view(), name="outages"),
+    path("alerts", alerts_view, name="alerts"),
+    path("history", HistoryView.as_view(), name="history"),
 ]
+
+if settings.LIGHTPADI_ASYNC_VIEWS:
+    # Only under ASGI: a WSGI worker would be tied up for as long as a stream stays open.
+    urlpatterns.append(path("status/stream", AsyncStatusStreamView.as_view(), name="status-stream"))
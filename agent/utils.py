@@ -1,13 +1,44 @@
+import logging
 import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import NamedTuple
 
-# Full list of Nigerian state capitals + major cities
-NIGERIAN_CITIES = [
-    "Abakaliki", "Abeokuta", "Abuja", "Ado Ekiti", "Akure", "Asaba", "Awka", "Bauchi", "Benin City",
-    "Birnin Kebbi", "Calabar", "Damaturu", "Lagos", "Enugu", "Gombe", "Gusau", "Ibadan", "Ilorin",
-    "Jalingo", "Jos", "Kaduna", "Kano", "Katsina", "Lafia", "Lokoja", "Maiduguri", "Makurdi",
-    "Minna", "Oshogbo", "Ondo", "Owerri", "Port Harcourt", "Sokoto", "Umuahia", "Uyo", "Yenagoa",
-    "Yola", "Aba", "Onitsha", "Warri"
-]
+from .cities import registry
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Supported city names, in registry order (see agent/cities.py).
+NIGERIAN_CITIES = registry.names
+
+# Keyword tables shared by the router and the status extractor.
+# 'No light' phrases are checked first so "there is no light" never reads as ON.
+POWER_OFF_PHRASES = (
+    "no light", "light off", "light is off", "nepa take light", "power outage", "blackout",
+    "no electricity", "power gone", "light don go",
+)
+POWER_ON_PHRASES = (
+    "light is on", "light on", "there is light", "nepa bring light",
+    "power restored", "light dey", "power don come",
+)
+# Phrases match whole words, so "kano light" never reads as "no light".
+POWER_OFF_PATTERN = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, POWER_OFF_PHRASES)))
+POWER_ON_PATTERN = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, POWER_ON_PHRASES)))
+# Questions keep a status phrase from making a report: "is there a power outage in
+# Lagos?" asks about the outage, as does "tell me when there is light". Only the last
+# sentence counts, since Telex sends the previous message along with the new one.
+QUESTION_PATTERN = re.compile(r"\b(?:is there|will there|predict\w*|tell me|let me know)\b")
+SENTENCE_END = re.compile(r"[.!?\n]+")
+# Alert subscriptions. Checked before the power phrases, so "alert me when there is
+# light in Lagos" subscribes rather than reports; "unsubscribe" before "subscribe".
+# Only explicit alert verbs: "tell me when light will come back" wants a forecast.
+UNSUBSCRIBE_PHRASES = ("unsubscribe", "stop alert", "stop notif", "cancel alert", "no more alert")
+SUBSCRIBE_PHRASES = ("subscribe", "alert me", "notify me", "send me alert", "send me an alert")
+# Questions about a city's usual outage pattern, answered from its heatmap. They win
+# over a power phrase only in a question ("when is there usually no light in Enugu?"):
+# "normally there is light in Lagos but now no light" is a report.
+HISTORY_PHRASES = ("usually", "normally", "how often", "outage pattern", "outage history")
 
 
 def extract_latest_message_text(message_data):
@@ -46,31 +77,204 @@ def extract_latest_message_text(message_data):
         # Clean whitespace and lowercase for consistency
         clean_text = combined_text.strip().lower()
 
-        print(f"🧠 Extracted latest user text: {clean_text}")  # for debugging
+        logger.debug("telex.text_extracted", extra={"chars": len(clean_text)})
         return clean_text
 
-    except Exception as e:
-        print(f"⚠️ Error extracting text: {e}")
+    except Exception:
+        logger.warning("telex.text_extraction_failed", exc_info=True)
         return ""
 
 
+# City gazetteer — built once at import from the city registry.
+# A single precompiled alternation finds every city or alias mention in one pass.
+# Longer names are tried first so multi-word cities ("Port Harcourt", "Ado Ekiti")
+# are never shadowed by a shorter name, and whitespace or hyphens may separate words.
+_CITY_BY_NAME = registry.lookup_keys()
+_CITY_PATTERN = re.compile(
+    r"\b(?:"
+    + "|".join(
+        r"[\s\-]+".join(re.escape(word) for word in name.split())
+        for name in sorted(_CITY_BY_NAME, key=len, reverse=True)
+    )
+    + r")\b"
+)
+
+
+class CityMatch(NamedTuple):
+    """A city mention found in a message, with its span in the (lowercased) text."""
+    city: str
+    start: int
+    end: int
+
+
+def _scan_cities(lowered_text):
+    matches = []
+    for match in _CITY_PATTERN.finditer(lowered_text):
+        name = " ".join(match.group().replace("-", " ").split())
+        matches.append(CityMatch(_CITY_BY_NAME[name], match.start(), match.end()))
+    return matches or _fuzzy_scan_cities(lowered_text)
+
+
+# Typo tolerance ("lagoss", "portharcot"), used only when a message names no city
+# exactly. Names and aliases are indexed with their spaces removed under every
+# variant with up to FUZZY_MAX_DISTANCE letters deleted (a symmetric-deletion
+# index). A lookup deletes letters from the word the same way and probes the dict
+# with each variant, then confirms the few candidates with an exact edit distance,
+# so it never compares the word against every name.
+# Short words are never corrected: too many English words are one edit from a
+# short city name ("undo" / Ondo).
+FUZZY_MIN_LENGTH = 5
+FUZZY_MAX_DISTANCE = 2
+FUZZY_STOPWORDS = frozenset(
+    word for phrase in POWER_OFF_PHRASES + POWER_ON_PHRASES for word in phrase.split()
+) | frozenset((
+    "light", "power", "there", "check", "status", "predict", "today", "tonight", "outage", "electricity",
+    "please", "again", "since", "morning", "evening", "night", "where", "still", "about", "hello",
+    "lightpadi", "abeg", "naija", "nigeria", "state", "area", "street", "estate",
+    # Function words, so two of them are never joined into a "city" ("been in" / Benin).
+    "the", "and", "for", "but", "not", "has", "have", "been", "was", "are", "our", "you", "all", "any",
+    "can", "dey", "don", "get", "make", "with", "from", "this", "that", "here", "when", "will",
+))
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it's certain to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _deletions(word, depth):
+    """`word` and every string made by deleting up to `depth` of its letters."""
+    variants, frontier = {word}, {word}
+    for _ in range(depth):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+_FUZZY_CITY_BY_KEY = {
+    key: city
+    for key, city in (("".join(name.split()), city) for name, city in _CITY_BY_NAME.items())
+    if len(key) >= FUZZY_MIN_LENGTH
+}
+_FUZZY_INDEX = defaultdict(set)  # deletion variant -> the names it was made from
+for key in _FUZZY_CITY_BY_KEY:
+    for variant in _deletions(key, FUZZY_MAX_DISTANCE):
+        _FUZZY_INDEX[variant].add(key)
+_FUZZY_INDEX = dict(_FUZZY_INDEX)
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+@lru_cache(maxsize=4096)
+def fuzzy_city(token):
+    """The city a single misspelt word (or two joined words) most likely means, or None."""
+    if len(token) < FUZZY_MIN_LENGTH or token in FUZZY_STOPWORDS:
+        return None
+    max_distance = 1 if len(token) < 8 else 2
+    candidates = {key for variant in _deletions(token, max_distance) for key in _FUZZY_INDEX.get(variant, ())}
+    found = sorted((edit_distance(token, key, max_distance), key) for key in candidates)
+    found = [(distance, key) for distance, key in found if distance <= max_distance]
+    if not found:
+        return None
+    # Keys tied for closest may be a name and its alias ("oshgbo": oshogbo, osogbo).
+    cities = {_FUZZY_CITY_BY_KEY[key] for distance, key in found if distance == found[0][0]}
+    return cities.pop() if len(cities) == 1 else None  # None when two cities are equally close
+
+
+def _joinable(word):
+    return len(word) >= 3 and word not in FUZZY_STOPWORDS
+
+
+def _fuzzy_scan_cities(lowered_text):
+    words = list(_WORD_PATTERN.finditer(lowered_text))
+    matches, index = [], 0
+    while index < len(words):
+        word = words[index]
+        # Two adjacent words first, for split or multi-word names ("port harcot").
+        pair = words[index + 1] if index + 1 < len(words) else None
+        if pair and _joinable(word.group()) and _joinable(pair.group()):
+            city = fuzzy_city(word.group() + pair.group())
+            if city is not None:
+                matches.append(CityMatch(city, word.start(), pair.end()))
+                index += 2
+                continue
+        city = fuzzy_city(word.group())
+        if city is not None:
+            matches.append(CityMatch(city, word.start(), word.end()))
+        index += 1
+    if matches:
+        logger.debug("city.fuzzy_matched", extra={"cities": [match.city for match in matches]})
+    return matches
+
+
+def _scan_alert_intent(lowered_text):
+    if any(phrase in lowered_text for phrase in UNSUBSCRIBE_PHRASES):
+        return "unsubscribe"
+    if any(phrase in lowered_text for phrase in SUBSCRIBE_PHRASES):
+        return "subscribe"
+    return None
+
+
+def _scan_history_intent(lowered_text):
+    return "history" if any(phrase in lowered_text for phrase in HISTORY_PHRASES) else None
+
+
+def _is_question(lowered_text):
+    lowered_text = lowered_text.rstrip()
+    if lowered_text.endswith("?"):
+        return True
+    sentences = [sentence for sentence in SENTENCE_END.split(lowered_text) if sentence.strip()]
+    return bool(sentences) and QUESTION_PATTERN.search(sentences[-1]) is not None
+
+
+def _scan_power_status(lowered_text):
+    if POWER_OFF_PATTERN.search(lowered_text):
+        return "off"
+    if POWER_ON_PATTERN.search(lowered_text):
+        return "on"
+    return None
+
+
+def find_cities_in_text(text):
+    """
+    Returns every Nigerian city mentioned in the text, in order of appearance.
+    Each match carries its span so callers can resolve messages naming several cities.
+    """
+    if not text:
+        return []
+    return _scan_cities(text.lower())
+
+
 def extract_city_from_text(text):
     """
     Identifies a Nigerian city name from the text.
+    When several cities are mentioned, the first one in the text wins.
     Returns None if no known city is found.
     """
-    if not text:
+    matches = find_cities_in_text(text)
+    if not matches:
         return None
 
-    # Remove punctuation to catch cities followed by commas, etc.
-    text_clean = re.sub(r"[^\w\s]", "", text)
+    city = matches[0].city
+    logger.debug("city.detected", extra={"city": city})
+    return city
 
-    for city in NIGERIAN_CITIES:
-        pattern = rf"\b{re.escape(city.lower())}\b"
-        if re.search(pattern, text_clean.lower()):
-            print(f"🏙️ City detected: {city}")
-            return city
-    return None
+
+def canonical_city_name(name):
+    """
+    Maps a city name in any case/spacing ("port  harcourt") to its canonical form.
+    Returns None for unsupported cities.
+    """
+    return registry.canonical(name)
 
 
 def extract_power_status_from_text(text):
@@ -78,22 +282,96 @@ def extract_power_status_from_text(text):
     Extracts a user's report of 'light on' or 'light off' from text.
     Returns 'on', 'off', or None.
     """
-    text = text.lower()
+    power_status = _scan_power_status(text.lower())
+    if power_status:
+        logger.debug("status.detected", extra={"status": power_status})
+    return power_status
 
-    # 'No light' scenarios
-    if any(word in text for word in [
-        "no light", "light off", "nepa take light", "power outage", "blackout",
-        "no electricity", "power gone", "light don go"
-    ]):
-        print("💡 Power status detected: OFF")
-        return "off"
 
-    # 'Light on' scenarios
-    elif any(word in text for word in [
-        "light is on", "light on", "there is light", "nepa bring light",
-        "power restored", "light dey", "power don come"
-    ]):
-        print("💡 Power status detected: ON")
-        return "on"
+class ParsedMessage:
+    """
+    Everything LightPadi needs from one Telex message, extracted once per request:
+    the cleaned text, the routed intent ('report', 'predict', 'history', 'subscribe'
+    or 'unsubscribe'), the city, the power status, who sent it and the (url, token)
+    Telex asked pushes to go to (None when the payload doesn't say).
+    """
+    __slots__ = ("text", "intent", "city", "status", "sender", "push")
+
+    def __init__(self, text, intent, city=None, status=None, sender=None, push=None):
+        self.text = text
+        self.intent = intent
+        self.city = city
+        self.status = status
+        self.sender = sender
+        self.push = push
 
+    def __repr__(self):
+        return (
+            f"ParsedMessage(intent={self.intent!r}, city={self.city!r}, "
+            f"status={self.status!r}, sender={self.sender!r}, text={self.text!r})"
+        )
+
+
+# Where Telex A2A payloads identify the sender, most specific first.
+SENDER_METADATA_KEYS = ("telex_user_id", "user_id", "sender_id")
+
+
+def extract_sender_id(payload, message_data):
+    """
+    The Telex user behind a message, from the message metadata, falling back to
+    the A2A conversation (contextId). Returns None if neither is present.
+    """
+    metadata = message_data.get("metadata")
+    if isinstance(metadata, dict):
+        for key in SENDER_METADATA_KEYS:
+            if metadata.get(key):
+                return str(metadata[key])
+    for source in (message_data, payload):
+        if source.get("contextId"):
+            return f"context:{source['contextId']}"
     return None
+
+
+def extract_push_config(payload):
+    """
+    The (url, token) of the A2A pushNotificationConfig sent with a message, where
+    LightPadi can post alerts later. Returns None if there isn't one.
+    """
+    configuration = payload.get("configuration")
+    config = configuration.get("pushNotificationConfig") if isinstance(configuration, dict) else None
+    if isinstance(config, dict) and config.get("url"):
+        return str(config["url"]), str(config.get("token") or "")
+    return None
+
+
+def parse_telex_payload(payload):
+    """
+    Parses a Telex request body in a single pass.
+    Messages asking for alerts (or to stop them) are subscriptions, questions about
+    when a city usually loses power ask for its history, messages that carry a
+    power status are reports unless they ask a question ("is there a blackout in
+    Abuja?"), and everything else is a prediction request.
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    message_data = payload.get("message")
+    message_data = message_data if isinstance(message_data, dict) else {}
+    with stage("extract"):
+        text = extract_latest_message_text(message_data)  # already lowercased
+        sender = extract_sender_id(payload, message_data)
+
+    with stage("city_match"):
+        asking = _is_question(text)
+        power_status = None if asking else _scan_power_status(text)
+        question = _scan_alert_intent(text) or (_scan_history_intent(text) if not power_status else None)
+        power_status = None if question else power_status
+        matches = _scan_cities(text) if text else []
+        city = matches[0].city if matches else None
+
+    return ParsedMessage(
+        text=text,
+        intent=question or ("report" if power_status else "predict"),
+        city=city,
+        status=power_status,
+        sender=sender,
+        push=extract_push_config(payload) if question in ("subscribe", "unsubscribe") else None,
+    )
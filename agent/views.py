@@ -1,15 +1,146 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import PowerReport
-from .ai_engine import predict_light_status
-from .utils import (
-    extract_latest_message_text,
-    extract_city_from_text,
-    extract_power_status_from_text,
-    NIGERIAN_CITIES,
-)
+from .models import PowerReport, CityPowerState, OutageHeatmap, OutageInterval
+from .ai_engine import predict_light_status, predict_many, prediction_cache
+from .alerts import subscribe, unsubscribe
+from .cities import registry
+from .ingest import parse_bulk_reports, save_reports, submit_report
+from .guard import ACCEPTED, LIMITED, report_guard
+from .heatmap import get_heatmap, history
+from .live import status_hub
+from .log import log_payload
+from .metrics import render as render_metrics
+from .spatial import nearby_cities
+from .transfer import CONTENT_TYPES, TransferError, export_reports, parse_bound, report_rows
+from .utils import canonical_city_name, parse_telex_payload
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------- 💬 TELEX REPLIES ----------------------
+# Shared by the sync views below and the async views in async_views.py.
+
+def telex_reply(text):
+    return {"message": {"parts": [{"kind": "text", "text": text}]}}
+
+
+def report_problem(parsed):
+    """Returns the reply for a report we can't save, or None if it's complete."""
+    if not parsed.city:
+        return "🇳🇬 Please include a valid Nigerian city, e.g., Lagos, Abuja, or Enugu."
+    if not parsed.status:
+        return "🤔 I didn’t catch that. Try 'There is light in Lagos' or 'No light in Enugu'."
+    return None
+
+
+def report_saved_text(city, power_status):
+    emoji = "✅" if power_status == "on" else "❌"
+    return f"{emoji} LightPadi: Got it! Power is currently {power_status.upper()} in {city}. Thanks for the update 💡."
+
+
+def file_report(parsed):
+    """
+    Runs a complete report past the ingest guard and saves or queues it.
+    Returns the guard's verdict; duplicates get the same reply, without another row.
+    """
+    verdict = report_guard.check(parsed.sender, parsed.city, parsed.status)
+    if verdict == ACCEPTED:
+        submit_report(parsed.city, PowerReport.Status[parsed.status.upper()])
+    return verdict
+
+
+def report_limited_text(city):
+    return f"⏳ LightPadi: You’ve sent a lot of reports just now. Please wait a few minutes before reporting {city} again."
+
+
+def alert_reply(parsed):
+    """Subscribes or unsubscribes the sender of an alert request and returns the reply."""
+    if not parsed.sender:
+        return "🤔 I can’t tell who you are from this chat, so I can’t send you alerts."
+    if parsed.intent == "unsubscribe":
+        dropped = unsubscribe(parsed.sender, parsed.city)
+        if not dropped:
+            return "🔕 LightPadi: You had no alerts to stop."
+        where = parsed.city or "any city"
+        return f"🔕 LightPadi: Done. No more alerts for {where}."
+
+    if not parsed.city:
+        return "🇳🇬 Which city should I watch? Try 'Alert me when light comes back in Lagos'."
+    if not parsed.push:
+        return "📭 LightPadi: Telex didn’t give me a way to reach you later. Turn on push notifications and retry."
+    try:
+        created = subscribe(parsed.sender, parsed.city, *parsed.push)
+    except ValidationError:
+        return "📭 LightPadi: The push notification URL Telex sent isn’t one I can post to."
+    if created:
+        return f"🔔 LightPadi: Done! I’ll message you when power goes OFF or comes back ON in {parsed.city}."
+    return f"🔔 LightPadi: You’re already getting alerts for {parsed.city}."
+
+
+def history_reply(parsed):
+    """Answers “When does Enugu usually lose light?” from the city's outage heatmap."""
+    if not parsed.city:
+        return "🤔 Which city? Try 'When does Enugu usually lose light?'"
+    return history_text(parsed.city, get_heatmap(parsed.city))
+
+
+WEEKDAY_NAMES = ("Mondays", "Tuesdays", "Wednesdays", "Thursdays", "Fridays", "Saturdays", "Sundays")
+
+
+def history_text(city, heatmap):
+    worst = heatmap.worst_hours() if heatmap is not None else []
+    if not worst:
+        return (
+            f"🕯️ LightPadi: I don’t know {city}’s usual outage hours yet. "
+            "Tell me whenever light goes off or comes back 💡."
+        )
+
+    hours = [f"{hour:02d}:00" for hour, _ in sorted(worst)]
+    hours = hours[0] if len(hours) == 1 else f"{', '.join(hours[:-1])} and {hours[-1]}"
+    text = f"🕯️ LightPadi: {city} usually loses light around {hours} (off {worst[0][1]:.0%} of the time at worst)"
+    weekday = heatmap.worst_weekday()
+    if weekday is not None:
+        text += f", most often on {WEEKDAY_NAMES[weekday[0]]}"
+    text += "."
+    uptime = heatmap.uptime(30)
+    if uptime is not None:
+        text += f" Over the last 30 days, power was ON {uptime:.0%} of the time."
+    return text
+
+
+def predict_problem(parsed):
+    """Returns the reply for a prediction request we can't answer, or None."""
+    if not parsed.city:
+        return "🤔 Please mention a Nigerian city (e.g., 'Predict Lagos' or 'Check Enugu status')."
+    if parsed.city not in registry:
+        return f"🇳🇬 Sorry, '{parsed.city}' isn’t yet supported by LightPadi."
+    return None
+
+
+def prediction_text(city, prediction_data):
+    prediction = prediction_data.get("prediction", "unknown")
+    confidence = prediction_data.get("confidence", 0.0)
+
+    nearby = prediction_data.get("based_on")
+    if nearby:
+        # Inferred from neighbouring cities (agent/spatial.py)
+        state = "likely ON" if prediction == "on" else "likely OFF"
+        return (
+            f"📡 LightPadi: No recent reports from {city}, but reports from {nearby_cities(nearby)} suggest power is "
+            f"{state}. (Confidence: {confidence})"
+        )
+    if prediction == "off":
+        return f"⚡ LightPadi: {city} may experience a power outage soon. (Confidence: {confidence})"
+    elif prediction == "on":
+        return f"🔆 LightPadi: Power looks stable in {city}. (Confidence: {confidence})"
+    return f"🔆 LightPadi: No recent data for {city}. Help me learn — tell me if there’s light 💡."
 
 
 # ---------------------- 🩵 PING ----------------------
@@ -23,13 +154,26 @@ class PingView(APIView):
         return Response({
             "status": "ok",
             "app": "LightPadi running live on PythonAnywhere",
-            "version": "v2.0.0"
+            "version": "v2.0.0",
+            "prediction_cache": prediction_cache.stats(),
+            "live_streams": status_hub.stats(),
         }, status=status.HTTP_200_OK)
 
     def post(self, request):
         return self.get(request)
 
 
+# ---------------------- 📈 METRICS ----------------------
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint: request/stage latency histograms, query counts
+    and prediction cache hit ratio, summed over every worker process.
+    """
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ---------------------- 🧭 ROUTER ----------------------
 class RouterView(APIView):
     """
@@ -45,20 +189,22 @@ class RouterView(APIView):
         }, status=status.HTTP_200_OK)
 
     def post(self, request):
-        print("📩 Incoming Telex payload:", request.data)
+        log_payload(logger, "telex.payload", request.data)
         try:
-            message_data = request.data.get("message", {})
-            user_text = extract_latest_message_text(message_data).lower()
+            parsed = parse_telex_payload(request.data)
 
-            if any(word in user_text for word in ["there is light", "no light", "light is on", "light is off"]):
-                print("🔧 Routed to ReportStatusView")
-                return ReportStatusView().post(request)
+            logger.debug("telex.routed", extra={"intent": parsed.intent, "city": parsed.city})
+            if parsed.intent == "report":
+                return ReportStatusView().handle(parsed)
+            elif parsed.intent in ("subscribe", "unsubscribe"):
+                return AlertSubscriptionView().handle(parsed)
+            elif parsed.intent == "history":
+                return HistoryView().handle(parsed)
             else:
-                print("🔧 Routed to PredictView")
-                return PredictView().post(request)
+                return PredictView().handle(parsed)
 
         except Exception as e:
-            print("⚠️ Router error:", e)
+            logger.exception("router.failed")
             return Response({
                 "message": {"parts": [
                     {"kind": "text", "text": f"⚠️ LightPadi router error: {str(e)}"}
@@ -81,37 +227,23 @@ class ReportStatusView(APIView):
         }, status=status.HTTP_200_OK)
 
     def post(self, request):
+        return self.handle(parse_telex_payload(request.data))
+
+    def handle(self, parsed):
+        """Saves a report from an already-parsed Telex message."""
         try:
-            message_data = request.data.get("message", {})
-            user_text = extract_latest_message_text(message_data)
-            city = extract_city_from_text(user_text)
-            power_status = extract_power_status_from_text(user_text)
-
-            if not city:
-                return Response({
-                    "message": {"parts": [
-                        {"kind": "text", "text": "🇳🇬 Please include a valid Nigerian city, e.g., Lagos, Abuja, or Enugu."}
-                    ]}
-                }, status=status.HTTP_200_OK)
-
-            if not power_status:
-                return Response({
-                    "message": {"parts": [
-                        {"kind": "text", "text": "🤔 I didn’t catch that. Try 'There is light in Lagos' or 'No light in Enugu'."}
-                    ]}
-                }, status=status.HTTP_200_OK)
-
-            PowerReport.objects.create(location=city, status=power_status)
-
-            emoji = "✅" if power_status == "on" else "❌"
-            response_text = f"{emoji} LightPadi: Got it! Power is currently {power_status.upper()} in {city}. Thanks for the update 💡."
+            problem = report_problem(parsed)
+            if problem:
+                return Response(telex_reply(problem), status=status.HTTP_200_OK)
 
-            return Response({
-                "message": {"parts": [{"kind": "text", "text": response_text}]}
-            }, status=status.HTTP_200_OK)
+            if file_report(parsed) == LIMITED:
+                return Response(
+                    telex_reply(report_limited_text(parsed.city)), status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
+            return Response(telex_reply(report_saved_text(parsed.city, parsed.status)), status=status.HTTP_200_OK)
 
         except Exception as e:
-            print("⚠️ Report error:", e)
+            logger.exception("report.failed", extra={"city": parsed.city})
             return Response({
                 "message": {"parts": [
                     {"kind": "text", "text": f"⚠️ LightPadi ran into an error while saving your report: {str(e)}"}
@@ -119,6 +251,98 @@ class ReportStatusView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# ---------------------- 🔔 ALERTS ----------------------
+class AlertSubscriptionView(APIView):
+    """
+    Subscribes Telex users to power alerts for a city (“Alert me when light comes
+    back in Lagos”) or stops them (“Stop alerts for Lagos”). Alerts go to the
+    pushNotificationConfig URL sent with the request; see agent/alerts.py.
+    """
+
+    def get(self, request):
+        return Response(telex_reply(
+            "🔔 Send a POST like 'Alert me about light in Lagos' to get a message whenever power goes OFF "
+            "or comes back."
+        ), status=status.HTTP_200_OK)
+
+    def post(self, request):
+        return self.handle(parse_telex_payload(request.data))
+
+    def handle(self, parsed):
+        try:
+            return Response(telex_reply(alert_reply(parsed)), status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.exception("alerts.subscription_failed", extra={"city": parsed.city})
+            return Response(
+                telex_reply(f"⚠️ LightPadi couldn’t update your alerts: {str(e)}"),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+# ---------------------- 📦 BULK REPORTS ----------------------
+class BulkReportView(APIView):
+    """
+    Saves many reports at once, e.g. replayed Telex messages during a grid collapse.
+    Valid reports are written with one bulk INSERT in a single transaction;
+    invalid ones are skipped and listed under "errors" by their index.
+    """
+
+    def get(self, request):
+        return Response({
+            "message": {"parts": [
+                {"kind": "text", "text": "📦 POST {\"reports\": [{\"city\", \"status\", \"observed_at\"}]} or {\"messages\": [...]} to save reports in bulk."}
+            ]}
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        records, errors = parse_bulk_reports(request.data)
+        if not records:
+            return Response({"saved": 0, "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            saved = save_reports(records)
+        except Exception as e:
+            logger.exception("bulk_report.failed", extra={"reports": len(records)})
+            return Response({
+                "saved": 0,
+                "errors": [{"index": None, "error": f"LightPadi could not save the reports: {str(e)}"}],
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({"saved": len(saved), "errors": errors}, status=status.HTTP_200_OK)
+
+
+# ---------------------- 📤 REPORT EXPORT ----------------------
+class ReportExportView(View):
+    """
+    Streams the report history, e.g. GET /report/export?format=ndjson&city=Lagos&since=2025-01-01.
+    Rows are read and encoded a chunk at a time, so memory stays flat however large the table is.
+    A plain Django view: DRF would treat ?format= as a renderer override.
+    """
+
+    def get(self, request):
+        fmt = request.GET.get("format", "csv")
+        try:
+            city = self.parse_city(request.GET.get("city"))
+            since = parse_bound(request.GET.get("since"), "since")
+            until = parse_bound(request.GET.get("until"), "until")
+            chunks = export_reports(fmt, report_rows(city, since, until))
+        except TransferError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+        response["Content-Disposition"] = f'attachment; filename="lightpadi-reports.{fmt}"'
+        return response
+
+    @staticmethod
+    def parse_city(value):
+        if not value:
+            return None
+        city = canonical_city_name(value)
+        if city is None:
+            raise TransferError(f"'{value}' isn’t a supported city.")
+        return city
+
+
 # ---------------------- ⚡ PREDICT STATUS ----------------------
 class PredictView(APIView):
     """
@@ -133,44 +357,159 @@ class PredictView(APIView):
         }, status=status.HTTP_200_OK)
 
     def post(self, request):
+        return self.handle(parse_telex_payload(request.data))
+
+    def handle(self, parsed):
+        """Answers a prediction request from an already-parsed Telex message."""
         try:
-            message_data = request.data.get("message", {})
-            user_text = extract_latest_message_text(message_data)
-            city = extract_city_from_text(user_text)
-
-            if not city:
-                return Response({
-                    "message": {"parts": [
-                        {"kind": "text", "text": "🤔 Please mention a Nigerian city (e.g., 'Predict Lagos' or 'Check Enugu status')."}
-                    ]}
-                }, status=status.HTTP_200_OK)
-
-            if city not in NIGERIAN_CITIES:
-                return Response({
-                    "message": {"parts": [
-                        {"kind": "text", "text": f"🇳🇬 Sorry, '{city}' isn’t yet supported by LightPadi."}
-                    ]}
-                }, status=status.HTTP_200_OK)
-
-            prediction_data = predict_light_status(city)
-            prediction = prediction_data.get("prediction", "unknown")
-            confidence = prediction_data.get("confidence", 0.0)
-
-            if prediction == "off":
-                message = f"⚡ LightPadi: {city} may experience a power outage soon. (Confidence: {confidence})"
-            elif prediction == "on":
-                message = f"🔆 LightPadi: Power looks stable in {city}. (Confidence: {confidence})"
-            else:
-                message = f"🔆 LightPadi: No recent data for {city}. Help me learn — tell me if there’s light 💡."
+            problem = predict_problem(parsed)
+            if problem:
+                return Response(telex_reply(problem), status=status.HTTP_200_OK)
 
-            return Response({
-                "message": {"parts": [{"kind": "text", "text": message}]}
-            }, status=status.HTTP_200_OK)
+            prediction_data = predict_light_status(parsed.city)
+            return Response(telex_reply(prediction_text(parsed.city, prediction_data)), status=status.HTTP_200_OK)
 
         except Exception as e:
-            print("⚠️ Predict error:", e)
+            logger.exception("predict.failed", extra={"city": parsed.city})
             return Response({
                 "message": {"parts": [
                     {"kind": "text", "text": f"⚠️ LightPadi encountered an error: {str(e)}"}
                 ]}
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------------- 🌍 MULTI-CITY PREDICT ----------------------
+class BulkPredictView(APIView):
+    """
+    Predictions for many cities in one call, e.g. a national dashboard.
+    GET returns every supported city; POST {"cities": [...]} returns just those.
+    """
+
+    def get(self, request):
+        return self.respond(None)
+
+    def post(self, request):
+        cities = request.data.get("cities") if isinstance(request.data, dict) else None
+        if cities is not None and (
+            not isinstance(cities, list) or not all(isinstance(city, str) for city in cities)
+        ):
+            return Response({"error": "'cities' must be a list of city names."}, status=status.HTTP_400_BAD_REQUEST)
+        return self.respond(cities)
+
+    def respond(self, cities):
+        try:
+            predictions = predict_many(cities)
+        except Exception as e:
+            logger.exception("bulk_predict.failed")
+            return Response({"error": f"LightPadi encountered an error: {str(e)}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({"predictions": list(predictions.values())}, status=status.HTTP_200_OK)
+
+
+# ---------------------- 🗺️ ALL-CITIES STATUS ----------------------
+class CityStatusView(APIView):
+    """
+    Snapshot of every city with reports, served straight from CityPowerState.
+    One query, no matter how many reports are stored.
+    """
+
+    def get(self, request):
+        open_intervals = {
+            interval.location: interval for interval in OutageInterval.objects.filter(ended_at__isnull=True)
+        }
+        cities = [
+            {
+                "location": state.location,
+                "status": "on" if state.on_count >= state.off_count else "off",
+                "on_count": state.on_count,
+                "off_count": state.off_count,
+                "last_changed_at": state.last_changed_at,
+                "last_reported_at": state.last_reported_at,
+                "report_count": state.report_count,
+                "report_rate": state.report_rate,
+                "interval": interval_data(open_intervals.get(state.location)),
+            }
+            for state in CityPowerState.objects.order_by("location")
+        ]
+        return Response({"cities": cities}, status=status.HTTP_200_OK)
+
+
+# ---------------------- 🕯️ OUTAGE HISTORY ----------------------
+def interval_data(interval):
+    if interval is None:
+        return None
+    return {
+        "status": PowerReport.Status(interval.status).label,
+        "started_at": interval.started_at,
+        "ended_at": interval.ended_at,
+        "confidence": interval.confidence,
+        "report_count": interval.report_count,
+    }
+
+
+class OutageHistoryView(APIView):
+    """
+    A city's debounced ON/OFF intervals, newest first, from OutageInterval:
+    GET /outages?city=Enugu&status=off&limit=50. One index range read, no report scan.
+    """
+    MAX_LIMIT = 500
+
+    def get(self, request):
+        city = canonical_city_name(request.query_params.get("city"))
+        if not city:
+            return Response(
+                {"error": "Pass ?city= with a supported Nigerian city."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get("limit", 100)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        intervals = OutageInterval.objects.filter(location=city).order_by("-started_at")
+        wanted = request.query_params.get("status")
+        if wanted:
+            if wanted not in ("on", "off"):
+                return Response({"error": "status must be 'on' or 'off'."}, status=status.HTTP_400_BAD_REQUEST)
+            intervals = intervals.filter(status=PowerReport.Status[wanted.upper()])
+        return Response({
+            "location": city,
+            "intervals": [interval_data(interval) for interval in intervals[:max(limit, 0)]],
+        }, status=status.HTTP_200_OK)
+
+
+# ---------------------- 🗓️ OUTAGE HEATMAP ----------------------
+class HistoryView(APIView):
+    """
+    When a city usually loses power, served from its precomputed heatmap (agent/heatmap.py):
+    GET /history?city=Enugu&days=30 returns the 7×24 outage probabilities, the hourly
+    pattern and daily uptime. POST takes a Telex message like “When does Enugu usually lose light?”.
+    """
+
+    def get(self, request):
+        city = canonical_city_name(request.query_params.get("city"))
+        if not city:
+            return Response(
+                {"error": "Pass ?city= with a supported Nigerian city."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            days = min(max(int(request.query_params.get("days", 30)), 1), OutageHeatmap.DAYS)
+        except ValueError:
+            return Response({"error": "days must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        heatmap = get_heatmap(city)
+        if heatmap is None:
+            return Response({"error": f"No outage history for {city} yet."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(history(heatmap, days), status=status.HTTP_200_OK)
+
+    def post(self, request):
+        return self.handle(parse_telex_payload(request.data))
+
+    def handle(self, parsed):
+        try:
+            return Response(telex_reply(history_reply(parsed)), status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.exception("history.failed", extra={"city": parsed.city})
+            return Response(
+                telex_reply(f"⚠️ LightPadi couldn’t look up the outage history: {str(e)}"),
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lightpadi_project.settings')
+# Under ASGI the Telex endpoints use the async views (see agent/async_views.py).
+os.environ.setdefault('LIGHTPADI_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
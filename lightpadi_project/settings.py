@@ -4,6 +4,8 @@ Django settings for LightPadi project (PythonAnywhere deployment ready)
 
 import os
 from pathlib import Path
+
+import django
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "agent.metrics.MetricsMiddleware",  # first, so it times the whole stack
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,18 +78,220 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "lightpadi_project.wsgi.application"
 
+# Serve /ping, /router, /report and /predict from the async views in
+# agent/async_views.py. asgi.py turns this on; leave it off under WSGI,
+# where every async view would need its own event loop per request.
+LIGHTPADI_ASYNC_VIEWS = os.getenv("LIGHTPADI_ASYNC_VIEWS", "False").lower() == "true"
+
 
 # ============================================================
 # DATABASE CONFIGURATION (SQLite for Free Tier)
 # ============================================================
 
+# Production tuning for SQLite, applied by agent.db.configure_sqlite on every
+# new connection. Set LIGHTPADI_SQLITE_TUNING=false for Django's defaults.
+LIGHTPADI_SQLITE = {
+    "TUNED": os.getenv("LIGHTPADI_SQLITE_TUNING", "True").lower() == "true",
+    "PRAGMAS": {
+        "journal_mode": "WAL",  # readers don't block the writer (persists in the file)
+        "synchronous": "NORMAL",  # safe with WAL; fsync at checkpoints only
+        "busy_timeout": 5000,  # ms to wait for the write lock before "database is locked"
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -20000,  # KiB (~20 MB) of page cache per connection
+        "temp_store": "MEMORY",
+    },
+    "WRITE_RETRIES": 5,  # report writes retried with backoff if still locked
+    "RETRY_BACKOFF": 0.05,  # seconds, doubled per attempt
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.getenv("LIGHTPADI_DB_PATH", BASE_DIR / "db.sqlite3"),
     }
 }
 
+# Production: set LIGHTPADI_DB_ENGINE=postgresql (needs psycopg) and the POSTGRES_* variables.
+# Reports are then stored in monthly partitions (see agent/storage.py).
+if os.getenv("LIGHTPADI_DB_ENGINE", "sqlite").lower() in ("postgres", "postgresql"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB", "lightpadi"),
+        "USER": os.getenv("POSTGRES_USER", "lightpadi"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+        "HOST": os.getenv("POSTGRES_HOST", "127.0.0.1"),
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": 0 if LIGHTPADI_ASYNC_VIEWS else 600,
+        "CONN_HEALTH_CHECKS": True,
+    }
+
+# Report retention. Forecasting fits read the last HOT_DAYS of raw reports;
+# `manage.py rollup_reports` compacts reports older than RETENTION_DAYS into
+# hourly per-city counts and, on PostgreSQL, keeps PARTITION_MONTHS_AHEAD
+# monthly partitions created in advance.
+LIGHTPADI_STORAGE = {
+    "HOT_DAYS": int(os.getenv("LIGHTPADI_HOT_DAYS", "90")),
+    "RETENTION_DAYS": int(os.getenv("LIGHTPADI_RETENTION_DAYS", "180")),
+    "PARTITION_MONTHS_AHEAD": 3,
+}
+
+if LIGHTPADI_SQLITE["TUNED"] and DATABASES["default"]["ENGINE"].endswith("sqlite3"):
+    if django.VERSION >= (5, 1):
+        # Take the write lock at BEGIN, so read-then-write transactions wait on the
+        # busy timeout instead of failing when they try to upgrade their lock.
+        DATABASES["default"]["OPTIONS"] = {"transaction_mode": "IMMEDIATE"}
+    if not LIGHTPADI_ASYNC_VIEWS:
+        # Reuse connections across requests. Django can't safely persist them
+        # under ASGI, where each request runs on a different thread.
+        DATABASES["default"]["CONN_MAX_AGE"] = 600
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+
+# ============================================================
+# CACHES (prediction cache)
+# ============================================================
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared by every gunicorn worker on the same machine
+    "predictions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("LIGHTPADI_CACHE_DIR", str(BASE_DIR / ".cache" / "predictions")),
+        "TIMEOUT": 60,
+        "OPTIONS": {"MAX_ENTRIES": 256},
+    },
+}
+
+# Per-city prediction cache. Leave ALIAS empty for an in-process LRU,
+# or set it to a CACHES alias (e.g. "predictions") to share entries across workers.
+LIGHTPADI_PREDICTION_CACHE = {
+    "ALIAS": os.getenv("LIGHTPADI_PREDICTION_CACHE_ALIAS") or None,
+    "MAX_ENTRIES": 256,
+    "TTL": int(os.getenv("LIGHTPADI_PREDICTION_CACHE_TTL", "60")),  # seconds
+}
+
+# Per-city forecasting models. `manage.py train_lightpadi` writes them to ARTIFACT,
+# which workers memory-map and reload when it changes. Cities missing from it are
+# refitted from the hot report window at most every REFIT_INTERVAL seconds.
+LIGHTPADI_FORECAST = {
+    "ARTIFACT": os.getenv("LIGHTPADI_FORECAST_ARTIFACT", str(BASE_DIR / "models" / "lightpadi_forecast.npy")),
+    "RELOAD_INTERVAL": 5,  # seconds between artifact mtime checks
+    "REFIT_INTERVAL": int(os.getenv("LIGHTPADI_FORECAST_REFIT_INTERVAL", "900")),  # seconds
+}
+
+# Optional write buffer for single /report calls. When enabled, reports are
+# queued in memory and saved in one batched transaction every FLUSH_INTERVAL
+# seconds (or once MAX_SIZE are waiting) instead of one transaction each. A batch
+# that can't be written is queued again, up to MAX_PENDING reports; older ones are
+# appended to SPILL_PATH as NDJSON, which `manage.py import_reports` loads back.
+LIGHTPADI_REPORT_BUFFER = {
+    "ENABLED": os.getenv("LIGHTPADI_REPORT_BUFFER", "False").lower() == "true",
+    "FLUSH_INTERVAL": float(os.getenv("LIGHTPADI_REPORT_BUFFER_INTERVAL", "1.0")),  # seconds
+    "MAX_SIZE": 500,
+    "MAX_PENDING": 10000,
+    "SPILL_PATH": os.getenv("LIGHTPADI_REPORT_BUFFER_SPILL", str(BASE_DIR / "report_buffer_spill.ndjson")),
+}
+
+# Ingest guard for single /report and router reports (agent/guard.py). A sender
+# repeating the same city and status within DEDUP_WINDOW seconds is answered
+# without a new row; beyond BURST reports, senders get RATE_PER_MINUTE more.
+# Set ALIAS to a CACHES alias to share the counters between workers.
+LIGHTPADI_REPORT_GUARD = {
+    "ENABLED": os.getenv("LIGHTPADI_REPORT_GUARD", "True").lower() == "true",
+    "RATE_PER_MINUTE": 4,
+    "BURST": 6,
+    "DEDUP_WINDOW": 600,  # seconds
+    "ALIAS": os.getenv("LIGHTPADI_REPORT_GUARD_ALIAS") or None,
+    "MAX_ENTRIES": 10000,
+}
+
+# Neighbour inference (agent/spatial.py) for cities with no reports, or none for
+# STALE_AFTER seconds: the latest reports of the NEIGHBORS nearest cities within
+# MAX_DISTANCE_KM vote, weighted by distance, DisCo and age (halved every HALF_LIFE).
+LIGHTPADI_SPATIAL = {
+    "ENABLED": os.getenv("LIGHTPADI_SPATIAL", "True").lower() == "true",
+    "NEIGHBORS": 6,
+    "MAX_DISTANCE_KM": 300,
+    "DISTANCE_SCALE_KM": 150,
+    "OTHER_DISCO_WEIGHT": 0.5,  # neighbours on another DisCo count half
+    "HALF_LIFE": 3 * 3600,  # seconds
+    "MAX_AGE": 12 * 3600,  # seconds; older neighbour reports are ignored
+    "STALE_AFTER": 6 * 3600,  # seconds
+    "MIN_WEIGHT": 0.2,
+    "MAX_CONFIDENCE": 0.8,
+    "REFRESH_INTERVAL": 30,  # seconds between CityPowerState reloads
+}
+
+# Push alerts (agent/alerts.py). When a city's power switches, a background thread
+# POSTs alerts to subscribers' Telex webhooks, BATCH_SIZE switches at a time, on
+# WORKERS pooled sessions; failed POSTs are retried RETRIES times with BACKOFF.
+LIGHTPADI_ALERTS = {
+    "ENABLED": os.getenv("LIGHTPADI_ALERTS", "True").lower() == "true",
+    "BATCH_SIZE": 100,
+    "WORKERS": 4,
+    "TIMEOUT": 5.0,  # seconds per POST
+    "RETRIES": 3,
+    "BACKOFF": 0.5,  # seconds; doubles on each retry
+    # Webhook hosts alerts may go to, matched like ALLOWED_HOSTS (".telex.im" covers
+    # its subdomains). Hosts resolving to private, loopback or link-local addresses
+    # are refused unless ALLOW_PRIVATE_NETWORKS is on, e.g. for `manage.py alert_receiver`
+    # with LIGHTPADI_ALERT_HOSTS=127.0.0.1.
+    "ALLOWED_HOSTS": [
+        host.strip() for host in os.getenv("LIGHTPADI_ALERT_HOSTS", ".telex.im").split(",") if host.strip()
+    ],
+    "ALLOW_PRIVATE_NETWORKS": os.getenv("LIGHTPADI_ALERT_ALLOW_PRIVATE", "False").lower() == "true",
+}
+
+# Live status streams (agent/live.py, GET /status/stream, ASGI only). Idle streams
+# get a heartbeat every HEARTBEAT seconds; clients reconnect after RETRY ms.
+# Beyond MAX_CLIENTS open streams per process, new ones are refused with a 503.
+LIGHTPADI_LIVE = {
+    "ENABLED": os.getenv("LIGHTPADI_LIVE", "True").lower() == "true",
+    "HEARTBEAT": 15.0,  # seconds
+    "RETRY": 3000,  # ms
+    "MAX_CLIENTS": 10000,
+}
+
+
+# ============================================================
+# LOGGING (JSON lines, written by a background thread)
+# ============================================================
+
+LOG_LEVEL = os.getenv("LIGHTPADI_LOG_LEVEL", "INFO").upper()
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "json": {"class": "agent.log.QueuedJsonHandler"},
+    },
+    "root": {"handlers": ["json"], "level": "WARNING"},
+    "loggers": {
+        "agent": {"handlers": ["json"], "level": LOG_LEVEL, "propagate": False},
+        # Per-message parsing details; set to DEBUG to trace city/status matching.
+        "agent.utils": {"level": os.getenv("LIGHTPADI_PARSER_LOG_LEVEL", "WARNING").upper()},
+        "django": {"handlers": ["json"], "level": "WARNING", "propagate": False},
+    },
+}
+
+# Raw Telex payloads are logged at DEBUG for only a sample of requests, truncated.
+LIGHTPADI_LOGGING = {
+    "PAYLOAD_SAMPLE_RATE": float(os.getenv("LIGHTPADI_PAYLOAD_SAMPLE_RATE", "0.01")),
+    "PAYLOAD_MAX_CHARS": 500,
+}
+
+
+# ============================================================
+# METRICS (/metrics, Prometheus text format)
+# ============================================================
+
+# Each worker process writes its counters to its own file here; /metrics sums them.
+LIGHTPADI_METRICS = {
+    "DIR": os.getenv("LIGHTPADI_METRICS_DIR", str(BASE_DIR / ".cache" / "metrics")),
+}
+
 
 # ============================================================
 # PASSWORD VALIDATION
@@ -135,7 +340,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",  # return only JSON
+        "agent.renderers.TimedJSONRenderer",  # return only JSON, timed as the "render" stage
     ],
     "DEFAULT_PARSER_CLASSES": [
         "rest_framework.parsers.JSONParser",
@@ -0,0 +1,41 @@
+"""
+Lean "api" profile for the stateless Telex A2A endpoints.
+
+Serves only agent.urls, with no sessions, auth, messages, CSRF or admin, and
+a faster JSON renderer/parser. Run it with
+
+    DJANGO_SETTINGS_MODULE=lightpadi_project.settings_api gunicorn lightpadi_project.wsgi
+    DJANGO_SETTINGS_MODULE=lightpadi_project.settings_api uvicorn lightpadi_project.asgi:application
+
+and keep the admin on a separate process using lightpadi_project.settings.
+Everything else (database, caches, logging, LIGHTPADI_*) is inherited.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "agent",
+]
+
+MIDDLEWARE = [
+    "agent.metrics.MetricsMiddleware",  # first, so it times the whole stack
+    "django.middleware.security.SecurityMiddleware",
+]
+
+ROOT_URLCONF = "lightpadi_project.urls_api"
+
+# No template-rendered pages are served from this profile.
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "agent.renderers.FastJSONRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "agent.renderers.FastJSONParser",
+    ],
+    # The endpoints are anonymous; skip DRF's session/basic auth and the auth app.
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "UNAUTHENTICATED_USER": None,
+}
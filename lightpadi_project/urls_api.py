@@ -0,0 +1,9 @@
+"""
+URL configuration for the lean "api" profile (settings_api): the agent endpoints
+only. The admin is served by a process running lightpadi_project.settings.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('', include('agent.urls')),
+]